@@ -1,8 +1,57 @@
-from src.utils import read_config, SAMPLES, run_pipeline
-from src.eval.gold_standard import gold_standard
-from src.eval.eval import eval
-from src.eval.tree import treeview
-from src.parse.parse import parse_nn, parse_pcfg, parse_malt
+"""
+Pipeline steps are resolved lazily on first access (e.g. by ``import_object_by_name``
+when running ``src.eval``), so that importing ``src`` only loads the modules of
+the steps which are actually run.
+"""
+
+import importlib
+import sys
+import types
+
+# module of every object exported by the package
+_REGISTRY = {
+    "read_config": "src.utils",
+    "SAMPLES": "src.utils",
+    "run_pipeline": "src.utils",
+    "gold_standard": "src.eval.gold_standard",
+    "eval": "src.eval.eval",
+    "treeview": "src.eval.tree",
+    "parse_pcfg": "src.parse.parse",
+    "parse_malt": "src.parse.parse",
+    "parse_nn": "src.parse.parse",
+    "parse_ensemble": "src.parse.parse",
+    "parse_routed": "src.parse.parse",
+    "benchmark": "src.benchmark",
+    "error_analysis": "src.eval.query",
+    "render": "src.eval.render",
+}
+
+
+class _Package(types.ModuleType):
+    """
+    Module type of the package, which keeps the import system from binding
+    subpackages to exported names. Importing the ``src.eval`` subpackage would
+    otherwise shadow the ``eval`` step.
+    """
+
+    def __setattr__(self, name: str, value):
+        if name in _REGISTRY and isinstance(value, types.ModuleType):
+            return
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _Package
+
+
+def __getattr__(name: str):
+    if name not in _REGISTRY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    return getattr(importlib.import_module(_REGISTRY[name]), name)
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_REGISTRY))
 
 
 __all__ = [
@@ -15,4 +64,9 @@ __all__ = [
     "parse_pcfg",
     "parse_malt",
     "parse_nn",
+    "parse_ensemble",
+    "parse_routed",
+    "benchmark",
+    "error_analysis",
+    "render",
 ]
@@ -0,0 +1,400 @@
+"""
+Token-level alignment of parser output and gold standard. Tokens are aligned by
+their forms, heads are compared as absolute token positions, so that parses can be
+scored regardless of where parser and gold standard put sentence boundaries.
+"""
+
+import difflib
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import *
+from src.treebank import Treebank, STRING_COLUMNS
+
+# PTB escapes written by the Stanford parsers, compared as the original characters
+FORM_NORMALIZATION = {
+    "-LRB-": "(",
+    "-RRB-": ")",
+    "-LSB-": "[",
+    "-RSB-": "]",
+    "-LCB-": "{",
+    "-RCB-": "}",
+    "``": '"',
+    "''": '"',
+}
+# number of equal tokens on which the streams resynchronise after a mismatch
+ANCHOR_SIZE = 3
+# initial number of tokens searched for the next anchor, doubled until one is found
+RESYNC_WINDOW = 64
+# largest gap (system tokens times gold tokens) between anchors which is diffed
+MAX_GAP_CELLS = 4096
+# initial chunk size when comparing runs of equal tokens
+RUN_CHUNK = 256
+
+
+def normalize_forms(forms: np.ndarray) -> np.ndarray:
+    """
+    Replaces the PTB escapes of ``FORM_NORMALIZATION`` in an array of forms
+    """
+    forms = np.asarray(forms, dtype=object)
+    normalized = forms.copy()
+    for escape, form in FORM_NORMALIZATION.items():
+        normalized[forms == escape] = form
+
+    return normalized
+
+
+def _token_codes(system: np.ndarray, gold: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Encodes the forms of both streams as integer codes of a shared vocabulary,
+    followed by ``ANCHOR_SIZE`` end-of-stream codes
+    """
+    codes, vocabulary = pd.factorize(np.concatenate([system, gold]))
+    end = np.full(ANCHOR_SIZE, len(vocabulary), dtype=np.int64)
+
+    return (
+        np.concatenate([codes[: len(system)], end]),
+        np.concatenate([codes[len(system) :], end]),
+    )
+
+
+def _anchor_codes(
+    system: np.ndarray, gold: np.ndarray, n_codes: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Encodes the ``ANCHOR_SIZE`` tokens starting at every position of both streams
+    (as returned by ``_token_codes``) as one integer, so that anchors are compared
+    by a single integer comparison
+    """
+    n_system, n_gold = len(system) - ANCHOR_SIZE + 1, len(gold) - ANCHOR_SIZE + 1
+    windows = np.concatenate(
+        [
+            np.lib.stride_tricks.sliding_window_view(system, ANCHOR_SIZE)[:n_system],
+            np.lib.stride_tricks.sliding_window_view(gold, ANCHOR_SIZE)[:n_gold],
+        ]
+    )
+    if n_codes**ANCHOR_SIZE < 2**63:
+        anchors = np.zeros(len(windows), dtype=np.int64)
+        for k in range(ANCHOR_SIZE):
+            anchors = anchors * n_codes + windows[:, k]
+    else:
+        anchors = np.unique(windows, axis=0, return_inverse=True)[1].reshape(-1)
+
+    return anchors[:n_system], anchors[n_system:]
+
+
+def _equal_run(system: np.ndarray, gold: np.ndarray, i: int, j: int) -> int:
+    """
+    Length of the run of equal codes starting at ``system[i]`` and ``gold[j]``,
+    compared in chunks of doubling size so that the cost is linear in the run
+    """
+    run, chunk = 0, RUN_CHUNK
+    while True:
+        s = system[i + run : i + run + chunk]
+        g = gold[j + run : j + run + chunk]
+        n = min(len(s), len(g))
+        diff = np.flatnonzero(s[:n] != g[:n])
+        if len(diff) > 0:
+            return run + int(diff[0])
+        run += n
+        if n < chunk:
+            return run
+        chunk *= 2
+
+
+def _resync(system: np.ndarray, gold: np.ndarray, i: int, j: int) -> Tuple[int, int]:
+    """
+    Finds the next anchor (``ANCHOR_SIZE`` equal tokens) after a mismatch at
+    ``system[i]`` and ``gold[j]``, minimizing the number of skipped tokens. The
+    search window starts at ``RESYNC_WINDOW`` tokens and doubles until an anchor is
+    found within it, so that the cost is linear in the skipped tokens. The end of
+    both streams is always an anchor.
+
+    Returns:
+        Tuple[int, int]: number of skipped system and gold tokens
+    """
+    window = RESYNC_WINDOW
+    while True:
+        s = system[i : i + window]
+        g = gold[j : j + window]
+        keys, first = np.unique(g, return_index=True)
+        idx = np.minimum(np.searchsorted(keys, s), len(keys) - 1)
+        hits = np.flatnonzero(keys[idx] == s)
+        if len(hits) > 0:
+            skipped = hits + first[idx[hits]]
+            best = int(np.argmin(skipped))
+            # anchors with more skipped tokens may lie just outside the window
+            if skipped[best] < window or (
+                i + window >= len(system) and j + window >= len(gold)
+            ):
+                return int(hits[best]), int(first[idx[hits[best]]])
+        window *= 2
+
+
+def align_tokens(system_forms: np.ndarray, gold_forms: np.ndarray) -> np.ndarray:
+    """
+    Aligns two token streams by their forms in time linear in the number of
+    tokens. Runs of equal tokens are matched with vectorized comparisons. After a
+    mismatch, both streams resynchronise on the nearest anchor of ``ANCHOR_SIZE``
+    equal tokens (see ``_resync``), and only the skipped gap is diffed, if it is
+    small. Tokens of replaced spans of equal length (e.g. differently escaped
+    forms) are aligned one to one, tokens of other differing spans remain
+    unaligned.
+
+    Args:
+        system_forms (np.ndarray): forms of the parsed tokens
+        gold_forms (np.ndarray): forms of the gold standard tokens
+
+    Returns:
+        np.ndarray: position of the system token aligned to every gold token, -1
+            for gold tokens without a system token
+    """
+    system, gold = normalize_forms(system_forms), normalize_forms(gold_forms)
+    gold_to_system = np.full(len(gold), -1, dtype=np.int64)
+    if len(system) == 0 or len(gold) == 0:
+        return gold_to_system
+    system_codes, gold_codes = _token_codes(system, gold)
+    system_anchors = gold_anchors = None
+
+    i = j = 0
+    while i < len(system) and j < len(gold):
+        # the end-of-stream codes are equal if both streams end after the run
+        run = min(
+            _equal_run(system_codes, gold_codes, i, j), len(system) - i, len(gold) - j
+        )
+        gold_to_system[j : j + run] = np.arange(i, i + run)
+        i, j = i + run, j + run
+        if i >= len(system) or j >= len(gold):
+            break
+
+        if system_anchors is None:
+            system_anchors, gold_anchors = _anchor_codes(
+                system_codes, gold_codes, int(system_codes[-1]) + 1
+            )
+        s_gap, g_gap = _resync(system_anchors, gold_anchors, i, j)
+        if s_gap == g_gap and (s_gap == 1 or s_gap * g_gap > MAX_GAP_CELLS):
+            gold_to_system[j : j + g_gap] = np.arange(i, i + s_gap)
+        elif 0 < s_gap * g_gap <= MAX_GAP_CELLS:
+            matcher = difflib.SequenceMatcher(
+                None,
+                list(system[i : i + s_gap]),
+                list(gold[j : j + g_gap]),
+                autojunk=False,
+            )
+            for tag, s_start, s_end, g_start, g_end in matcher.get_opcodes():
+                if tag == "equal" or (
+                    tag == "replace" and s_end - s_start == g_end - g_start
+                ):
+                    gold_to_system[j + g_start : j + g_end] = np.arange(
+                        i + s_start, i + s_end
+                    )
+        i, j = i + s_gap, j + g_gap
+
+    return gold_to_system
+
+
+def tree_heads(ids: np.ndarray, heads: np.ndarray) -> np.ndarray:
+    """
+    Computes the absolute position of the head of every token. Token ids count
+    from 1 per tree, where a tree may span several blocks if the ids continue
+    after a blank line (as in the gold standard of sample 22).
+
+    Args:
+        ids (np.ndarray): token ids
+        heads (np.ndarray): head ids, 0 for the root
+
+    Returns:
+        np.ndarray: head position of every token, -1 for roots
+    """
+    positions = np.arange(len(ids))
+
+    return np.where(heads > 0, positions - ids + heads, -1)
+
+
+def align_parse(
+    system: Dict[str, np.ndarray], gold: Dict[str, np.ndarray]
+) -> Dict[str, np.ndarray]:
+    """
+    Aligns a parse to the gold standard and determines which gold tokens got the
+    correct head and label
+
+    Args:
+        system (Dict[str, np.ndarray]): parsed columns from ``read_conll_columns``
+        gold (Dict[str, np.ndarray]): gold columns from ``read_conll_columns``
+
+    Returns:
+        Dict[str, np.ndarray]: arrays
+
+            - ``gold_to_system``: aligned system token of every gold token, or -1
+            - ``system_to_gold``: aligned gold token of every system token, or -1
+            - ``system_sentence``: gold sentence of every system token, i.e. the
+              sentence of the aligned (or last preceding aligned) gold token
+            - ``head_correct``: gold tokens whose system head is the gold head
+            - ``label_correct``: gold tokens whose system label is the gold label
+    """
+    gold_to_system = align_tokens(system["form"], gold["form"])
+    aligned = gold_to_system >= 0
+    system_to_gold = np.full(len(system["id"]), -1, dtype=np.int64)
+    system_to_gold[gold_to_system[aligned]] = np.flatnonzero(aligned)
+
+    # unaligned system tokens belong to the sentence of the last aligned token
+    last_aligned = np.maximum.accumulate(
+        np.where(system_to_gold >= 0, np.arange(len(system_to_gold)), -1)
+    )
+    system_sentence = np.where(
+        last_aligned >= 0,
+        gold["sentence"][system_to_gold[np.maximum(last_aligned, 0)]],
+        0,
+    )
+
+    # system heads of the aligned tokens as gold positions, -2 if not aligned
+    source = np.maximum(gold_to_system, 0)
+    system_heads = tree_heads(system["id"], system["head"])[source]
+    mapped_heads = np.where(
+        system_heads >= 0, system_to_gold[np.maximum(system_heads, 0)], -1
+    )
+    mapped_heads = np.where((system_heads >= 0) & (mapped_heads < 0), -2, mapped_heads)
+    gold_heads = tree_heads(gold["id"], gold["head"])
+
+    return {
+        "gold_to_system": gold_to_system,
+        "system_to_gold": system_to_gold,
+        "system_sentence": system_sentence,
+        "head_correct": aligned & (mapped_heads == gold_heads),
+        "label_correct": aligned & (system["deprel"][source] == gold["deprel"]),
+    }
+
+
+def project_samples(system: Treebank, gold: Treebank) -> np.ndarray:
+    """
+    Builds the sample index of a parse from the sample index of the gold
+    standard, so that parses whose tokenization or sentence splitting differs from
+    the gold standard can be sliced by sample. Every sample of the parse starts
+    with the sentence of the system token aligned to the first aligned gold token
+    of the sample.
+
+    Args:
+        system (Treebank): parse
+        gold (Treebank): gold standard with a sample index
+
+    Returns:
+        np.ndarray: first sentence of every sample of the parse and the number of
+            sentences, see ``Treebank.index_samples``
+    """
+    if gold.samples is None:
+        raise ValueError("Gold standard has no sample index")
+    gold_to_system = align_tokens(system.column("form"), gold.column("form"))
+    # system token of the next aligned gold token, at or after every gold token
+    next_aligned = np.minimum.accumulate(
+        np.where(gold_to_system >= 0, gold_to_system, system.n_tokens)[::-1]
+    )[::-1]
+    next_aligned = np.concatenate([next_aligned, [system.n_tokens]])
+
+    starts = next_aligned[gold.offsets[gold.samples]]
+    samples = np.searchsorted(system.offsets, starts, side="right") - 1
+    samples[-1] = len(system)
+
+    return np.maximum.accumulate(np.minimum(samples, len(system))).astype(np.int64)
+
+
+def project_to_gold(system: Treebank, gold: Treebank) -> Tuple[Treebank, Treebank]:
+    """
+    Re-segments a parse into the trees of the gold standard, e.g. for tools like
+    MaltEval which require parse and gold standard to agree on sentence
+    boundaries. Gold blocks whose ids continue the previous block are merged into
+    one tree. System tokens take the id of their aligned gold token and heads are
+    remapped accordingly; heads outside the gold tree become roots. Gold tokens
+    without a system token get a ``_`` placeholder attached to the root.
+
+    Args:
+        system (Treebank): parse
+        gold (Treebank): gold standard
+
+    Returns:
+        Tuple[Treebank, Treebank]: projected parse and gold standard with merged
+            trees, both with the same tokens and sentence boundaries
+    """
+    gold_ids = gold.columns["id"].astype(np.int64)
+    starts = np.flatnonzero(gold_ids == 1)
+    if len(starts) == 0 or starts[0] != 0:
+        starts = np.concatenate([[0], starts])
+    offsets = np.concatenate([starts, [len(gold_ids)]]).astype(np.int64)
+    merged_gold = Treebank(gold.columns, gold.tables, offsets)
+
+    gold_columns = {
+        "id": gold_ids,
+        "form": gold.column("form"),
+        "sentence": merged_gold.sentence_index(),
+    }
+    system_columns = {
+        "id": system.columns["id"].astype(np.int64),
+        "head": system.columns["head"].astype(np.int64),
+        "form": system.column("form"),
+    }
+    gold_to_system = align_tokens(system_columns["form"], gold_columns["form"])
+    aligned = gold_to_system >= 0
+    source = np.maximum(gold_to_system, 0)
+    system_to_gold = np.full(len(system_columns["id"]), -1, dtype=np.int64)
+    system_to_gold[gold_to_system[aligned]] = np.flatnonzero(aligned)
+
+    # remap the system heads to gold ids within the same gold tree
+    system_heads = tree_heads(system_columns["id"], system_columns["head"])[source]
+    head_position = np.where(
+        system_heads >= 0, system_to_gold[np.maximum(system_heads, 0)], -1
+    )
+    same_tree = (head_position >= 0) & (
+        gold_columns["sentence"][np.maximum(head_position, 0)]
+        == gold_columns["sentence"]
+    )
+    heads = np.where(
+        aligned & same_tree, gold_ids[np.maximum(head_position, 0)], 0
+    ).astype(np.int32)
+
+    columns = {"id": gold.columns["id"], "head": heads}
+    tables = {}
+    for name in STRING_COLUMNS:
+        # placeholders for unaligned gold tokens, using the gold form
+        fill = gold.tables[name] if name == "form" else np.array(["_"])
+        fill_codes = gold.columns[name] if name == "form" else np.zeros(1, np.int32)
+        tables[name] = np.concatenate([system.tables[name], fill])
+        placeholder = len(system.tables[name]) + np.broadcast_to(
+            fill_codes, gold_ids.shape
+        )
+        columns[name] = np.where(
+            aligned, system.columns[name][source], placeholder
+        ).astype(np.int32)
+
+    return Treebank(columns, tables, offsets), merged_gold
+
+
+def project_files(
+    system_path: Union[str, Path],
+    gold_path: Union[str, Path],
+    target: Union[str, Path],
+    name: str,
+) -> Tuple[Path, Path]:
+    """
+    Writes the projection of a parse file onto the gold standard file, see
+    ``project_to_gold``
+
+    Args:
+        system_path (Union[str, Path]): parsed CoNLL file
+        gold_path (Union[str, Path]): gold standard CoNLL file
+        target (Union[str, Path]): directory of the projected files
+        name (str): name of the parse, e.g. the parser
+
+    Returns:
+        Tuple[Path, Path]: paths of the projected parse ``{name}_eval.conll`` and
+            gold standard ``gold_eval.conll``
+    """
+    target = Path(target)
+    target.mkdir(parents=True, exist_ok=True)
+    system, gold = project_to_gold(
+        Treebank.from_conll(system_path), Treebank.from_conll(gold_path)
+    )
+    system_target = target.joinpath(f"{name}_eval.conll")
+    gold_target = target.joinpath("gold_eval.conll")
+    system.to_conll(system_target)
+    gold.to_conll(gold_target)
+
+    return system_target, gold_target
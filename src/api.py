@@ -0,0 +1,285 @@
+"""
+Programmatic parsing API. Parsers are created once per process and kept warm:
+the Stanza pipeline stays loaded and the Stanford parsers run on the persistent
+CoreNLP server, so that single sentences parse without the startup cost of the
+batch pipeline. MaltParser has no server mode, so every MALT request still starts
+a JVM, only its Stanza preprocessing stays loaded.
+"""
+
+import copy
+import hashlib
+import json
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from box import Box
+from typing import *
+from src.utils import read_config
+from src.conll import format_sentence
+from src.treebank import CONLLU_COLUMNS, INT_COLUMNS
+from src.parse.parse import PARSERS
+from src.parse.base import BaseParse, _corenlp_to_conllu
+
+# output formats of ``parse``
+FORMATS = ["conllu", "tree"]
+
+# warm parser instances and their locks by parser name and config hash, a parser
+# instance is not thread-safe, but different parsers may parse concurrently
+_INSTANCES = {}
+_LOCKS = {}
+_INSTANCES_LOCK = threading.Lock()
+# evicts parse cache entries off the request path
+_EVICTION = ThreadPoolExecutor(max_workers=1)
+
+
+def _config_hash(config: Box) -> str:
+    """Hashes the config values, so that equal configs share warm parsers"""
+    values = json.dumps(config.to_dict(), sort_keys=True, default=str)
+
+    return hashlib.sha256(values.encode("utf-8")).hexdigest()
+
+
+def _instance(config: Box, parser: str) -> Tuple[BaseParse, threading.Lock]:
+    """
+    Returns the warm instance of a parser together with its lock, see
+    ``get_parser``
+    """
+    assert parser in PARSERS, f"Invalid parser name. Choose one of {list(PARSERS)}"
+    key = (parser, _config_hash(config))
+    with _INSTANCES_LOCK:
+        if key not in _INSTANCES:
+            api_config = copy.deepcopy(config)
+            api_config.corenlp.backend = "server"
+            _INSTANCES[key] = PARSERS[parser](api_config)
+            _LOCKS[key] = threading.Lock()
+
+        return _INSTANCES[key], _LOCKS[key]
+
+
+def get_parser(config: Box, parser: str) -> BaseParse:
+    """
+    Returns the warm instance of a parser, created on first use and shared by all
+    configs with the same values. The Stanford parsers always use the CoreNLP
+    ``server`` backend.
+
+    Args:
+        config (Box): main config
+        parser (str): parser name, one of ``PARSERS``
+
+    Returns:
+        BaseParse: parser instance
+    """
+    return _instance(config, parser)[0]
+
+
+def conllu_to_tree(conllu: str) -> List[List[Dict[str, Union[str, int]]]]:
+    """
+    Converts CoNLL-U text into a structured tree, i.e. a list of sentences with
+    a dictionary of the CoNLL-U columns per token
+
+    Args:
+        conllu (str): CoNLL-U text, sentences separated by blank lines
+
+    Returns:
+        List[List[Dict[str, Union[str, int]]]]: tokens of every sentence
+    """
+    sentences = []
+    for block in conllu.split("\n\n"):
+        rows = [
+            line.split("\t")
+            for line in block.split("\n")
+            if line.strip() != "" and not line.startswith("#")
+        ]
+        if len(rows) == 0:
+            continue
+        sentences.append(
+            [
+                {
+                    name: int(value) if name in INT_COLUMNS else value
+                    for name, value in zip(CONLLU_COLUMNS, row)
+                }
+                for row in rows
+            ]
+        )
+
+    return sentences
+
+
+def _to_conllu(instance: BaseParse, output: str) -> str:
+    """
+    Converts the CoNLL output of a parser for a single document to CoNLL-U
+    """
+    if instance.props is None:
+        # MaltParser already writes the CoNLL-U column layout
+        return output
+
+    sentences = [
+        [_corenlp_to_conllu(line.split("\t")) for line in block.split("\n")]
+        for block in output.strip("\n").split("\n\n")
+        if block.strip() != ""
+    ]
+
+    return "".join([format_sentence(s) for s in sentences])
+
+
+def parse(
+    sentences: Union[str, List[str]],
+    parser: str = "nn",
+    config: Box = None,
+    output: str = "conllu",
+) -> List[Union[str, List[List[Dict[str, Union[str, int]]]]]]:
+    """
+    Parses raw sentences with a warm parser. Every input string is parsed as a
+    document of its own, so it may come back as several sentences.
+
+    Example:
+        >>> parse(["The old car broke down."], parser="malt", output="tree")
+
+    Args:
+        sentences (Union[str, List[str]]): raw text of one or more sentences
+        parser (str): parser name, one of ``PARSERS``
+        config (Box): main config, ``config.yml`` if not passed
+        output (str): ``conllu`` for CoNLL-U text or ``tree`` for the structure
+            returned by ``conllu_to_tree``
+
+    Returns:
+        List[Union[str, List[List[Dict[str, Union[str, int]]]]]]: parse of every
+            input string, in input order
+    """
+    assert output in FORMATS, f"Invalid output format. Choose one of {FORMATS}"
+    if isinstance(sentences, str):
+        sentences = [sentences]
+    assert all([s.strip() != "" for s in sentences]), "Cannot parse empty sentences"
+    if config is None:
+        config = _default_config()
+
+    instance, lock = _instance(config, parser)
+    with lock:
+        outputs = instance._cached_parse(list(sentences), evict=False)
+    if instance.config.cache.enabled:
+        _EVICTION.submit(instance.cache.evict)
+    conllu = [_to_conllu(instance, o) for o in outputs]
+    if output == "tree":
+        return [conllu_to_tree(c) for c in conllu]
+
+    return conllu
+
+
+@lru_cache(maxsize=None)
+def _default_config() -> Box:
+    """Reads ``config.yml`` once"""
+    return read_config("config.yml")
+
+
+def warm_up(config: Box, parsers: List[str]) -> None:
+    """
+    Loads the models of the given parsers by parsing a short sentence with each
+
+    Args:
+        config (Box): main config
+        parsers (List[str]): parser names, subset of ``PARSERS``
+
+    Returns:
+        None
+    """
+    for parser in parsers:
+        logging.info(f"Warming up {parser.upper()} parser")
+        parse(["This is a sentence."], parser, config)
+
+    return None
+
+
+class ParseBatcher(object):
+    """
+    Collects the sentences of concurrent callers into shared model invocations.
+    A batch is parsed once it holds ``service.max_batch_size`` sentences or the
+    first request waited ``service.max_wait_ms`` milliseconds, whichever is first.
+    The sentences of different parsers are parsed concurrently.
+    """
+
+    def __init__(self, config: Box):
+        self.config = config
+        self.max_batch_size = config.service.max_batch_size
+        self.max_wait = config.service.max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=len(PARSERS))
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def submit(self, sentences: List[str], parser: str) -> Future:
+        """
+        Queues sentences for parsing
+
+        Args:
+            sentences (List[str]): raw sentences
+            parser (str): parser name, one of ``PARSERS``
+
+        Returns:
+            Future: resolves to the CoNLL-U output of every sentence
+        """
+        future = Future()
+        self._queue.put((parser, sentences, future))
+
+        return future
+
+    def parse(self, sentences: List[str], parser: str) -> List[str]:
+        """Blocking variant of ``submit``"""
+        return self.submit(sentences, parser).result()
+
+    def _loop(self) -> None:
+        while True:
+            requests = [self._queue.get()]
+            n_sentences = len(requests[0][1])
+            deadline = time.monotonic() + self.max_wait
+            while n_sentences < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                requests.append(request)
+                n_sentences += len(request[1])
+            self._run_batch(requests)
+
+    def _run_batch(self, requests: List[Tuple[str, List[str], Future]]) -> None:
+        """
+        Parses the sentences of all requests with one invocation per parser, each
+        on a thread of its own, so that a slow parser does not hold up the others
+        """
+        for parser in sorted({r[0] for r in requests}):
+            self._pool.submit(
+                self._run_group, parser, [r for r in requests if r[0] == parser]
+            )
+
+        return None
+
+    def _run_group(
+        self, parser: str, group: List[Tuple[str, List[str], Future]]
+    ) -> None:
+        """
+        Parses the sentences of the requests for one parser and hands every caller
+        its share of the outputs
+        """
+        sentences = [s for _, request_sentences, _ in group for s in request_sentences]
+        logging.debug(
+            f"Parsing batch of {len(sentences)} sentences from {len(group)} "
+            f"requests with {parser.upper()}"
+        )
+        try:
+            outputs = parse(sentences, parser, self.config)
+        except Exception as e:
+            for _, _, future in group:
+                future.set_exception(e)
+            return None
+
+        offset = 0
+        for _, request_sentences, future in group:
+            future.set_result(outputs[offset : offset + len(request_sentences)])
+            offset += len(request_sentences)
+
+        return None
@@ -0,0 +1,235 @@
+"""
+Benchmark harness measuring parser throughput, latency, memory and accuracy on
+replicated corpora of increasing size
+"""
+
+import copy
+import logging
+import numpy as np
+import pandas as pd
+from box import Box
+from pathlib import Path
+from typing import *
+from src.utils import Timer, stage
+from src.conll import convert_file, count_tokens
+from src.treebank import Treebank, load_treebank
+from src.eval.score import read_conll_columns, score_parse, treebank_columns
+from src.parse.parse import PARSERS
+from src.parse.base import BaseParse, _corenlp_to_conllu
+
+# latency percentiles reported per parser and corpus size
+PERCENTILES = [50, 90, 99]
+
+
+def replicate_corpus(
+    documents: List[str], sentence_counts: List[int], size: int
+) -> List[int]:
+    """
+    Cycles through the documents until the corpus has at least ``size`` sentences
+
+    Args:
+        documents (List[str]): raw document texts
+        sentence_counts (List[int]): number of gold sentences of every document
+        size (int): minimum number of sentences of the corpus
+
+    Returns:
+        List[int]: document numbers making up the corpus, in order
+    """
+    corpus = []
+    n_sentences = 0
+    while n_sentences < size:
+        idx = len(corpus) % len(documents)
+        corpus.append(idx)
+        n_sentences += sentence_counts[idx]
+
+    return corpus
+
+
+def keeps_model_loaded(config: Box, instance: BaseParse) -> bool:
+    """
+    Checks if a parser keeps its model loaded between calls, which only the
+    CoreNLP parsers on the ``server`` backend do. All other parsers start a JVM
+    and load their model on every call.
+    """
+    return instance.props is not None and config.corenlp.backend == "server"
+
+
+def load_parser(
+    config: Box, parser: str, documents: List[str]
+) -> Tuple[BaseParse, float]:
+    """
+    Creates a parser and parses a single document with it, which starts the
+    JVM (or the CoreNLP server) and loads the model
+
+    Args:
+        config (Box): main config, with the parse cache disabled
+        parser (str): parser name, key of ``PARSERS``
+        documents (List[str]): raw document texts
+
+    Returns:
+        Tuple[BaseParse, float]: parser and wall time of the first parse
+    """
+    instance = PARSERS[parser](config)
+    with stage(f"benchmark_{parser}_load") as metrics:
+        instance._sharded_parse(documents[:1])
+
+    return instance, metrics["wall_time"]
+
+
+def benchmark_parser(
+    config: Box,
+    instance: BaseParse,
+    documents: List[str],
+    gold: Treebank,
+    size: int,
+) -> Dict:
+    """
+    Parses a replicated corpus and scores the parse against the equally
+    replicated gold standard. Parsers which keep their model loaded are called
+    with batches of ``benchmark.batch_size`` documents, all other parsers with
+    the whole corpus at once, so that JVM startup and model loading are paid once
+    per run instead of once per batch.
+
+    Args:
+        config (Box): main config, with the parse cache disabled
+        instance (BaseParse): parser created by ``load_parser``
+        documents (List[str]): raw document texts, one per gold standard sample
+        gold (Treebank): gold standard treebank with sample index
+        size (int): minimum number of sentences of the corpus
+
+    Returns:
+        Dict: throughput, latency percentiles, memory and accuracy of the run
+    """
+    parser = instance.name
+    sample_sentences = gold.samples[1:] - gold.samples[:-1]
+    corpus = replicate_corpus(documents, list(sample_sentences), size)
+    logging.info(
+        f"Benchmarking {parser.upper()} parser on {len(corpus)} documents "
+        f"(>= {size} sentences)"
+    )
+
+    batch_size = len(corpus)
+    if keeps_model_loaded(config, instance):
+        batch_size = config.benchmark.batch_size
+    latencies = []
+    outputs = []
+    with stage(f"benchmark_{parser}_{size}") as metrics:
+        for b in range(0, len(corpus), batch_size):
+            batch = [documents[idx] for idx in corpus[b : b + batch_size]]
+            timer = Timer(verbose=False)
+            timer.start()
+            outputs += instance._sharded_parse(batch)
+            latencies.append(timer.stop())
+        metrics["tokens"], metrics["sentences"] = count_tokens("".join(outputs))
+
+    result = {
+        "parser": parser,
+        "size": size,
+        "documents": len(corpus),
+        "batches": len(latencies),
+        "sentences": metrics["sentences"],
+        "tokens": metrics["tokens"],
+        "wall_time": metrics["wall_time"],
+        "sentences_per_s": metrics["sentences_per_s"],
+        "tokens_per_s": metrics["tokens_per_s"],
+    }
+    for p, latency in zip(PERCENTILES, np.percentile(latencies, PERCENTILES)):
+        result[f"latency_p{p}"] = round(float(latency), 4)
+    result["peak_rss_mb"] = metrics["peak_rss_mb"]
+    result["peak_child_rss_mb"] = metrics["peak_child_rss_mb"]
+    result.update(_score_corpus(config, instance, outputs, gold, corpus))
+
+    return result
+
+
+def _score_corpus(
+    config: Box,
+    instance: BaseParse,
+    outputs: List[str],
+    gold: Treebank,
+    corpus: List[int],
+) -> Dict[str, float]:
+    """
+    Scores the parse of a replicated corpus against the replicated gold standard
+    """
+    path = Path(config.benchmark.path).joinpath(f"{instance.name}_parse.conll")
+    with open(path, "w") as f:
+        f.write("".join(outputs))
+    if instance.props is not None:
+        # CoreNLP output, see ``BaseParse._conll_to_conllu``
+        convert_file(path, path, _corenlp_to_conllu)
+
+    sentences = [
+        s for idx in corpus for s in range(gold.samples[idx], gold.samples[idx + 1])
+    ]
+    scores = score_parse(
+        read_conll_columns(path), treebank_columns(gold.subset(sentences))
+    )
+
+    return scores["overall"].iloc[0].to_dict()
+
+
+def comparison_table(results: pd.DataFrame) -> pd.DataFrame:
+    """
+    Pivots the benchmark results into one row per corpus size with a
+    ``{metric}_{parser}`` column per parser, like the tables of the eval step
+
+    Args:
+        results (pd.DataFrame): one row per parser and corpus size
+
+    Returns:
+        pd.DataFrame: throughput, latency, memory and accuracy by corpus size
+    """
+    metrics = ["load_time", "sentences_per_s", f"latency_p{PERCENTILES[0]}"]
+    metrics += ["peak_child_rss_mb"]
+    metrics += ["UAS", "LAS"]
+    table = results.pivot(index="size", columns="parser", values=metrics)
+    table.columns = [f"{metric}_{parser}" for metric, parser in table.columns]
+
+    return table.reset_index()
+
+
+def benchmark(config: Box) -> None:
+    """
+    Pipeline wrapper running all parsers of ``benchmark.parsers`` on replicated
+    corpora of every size in ``benchmark.sizes`` (in sentences). The CoreNLP
+    parsers run on ``benchmark.corenlp_backend``. The time it takes to load every
+    parser is reported as ``load_time``, separately from the runs. The results
+    are written to ``benchmark.csv`` and the comparison table by corpus size to
+    ``comparison.csv`` in ``benchmark.path``.
+    """
+    # every document of a replicated corpus would be a cache hit after the first
+    config = copy.deepcopy(config)
+    config.cache.enabled = False
+    config.corenlp.backend = config.benchmark.corenlp_backend
+
+    Path(config.benchmark.path).mkdir(parents=True, exist_ok=True)
+    gold = load_treebank(config, "gold")
+    documents = PARSERS[config.benchmark.parsers[0]](config)._read_documents()
+    assert len(documents) == len(gold.samples) - 1, (
+        f"{len(documents)} raw samples but {len(gold.samples) - 1} gold "
+        f"standard samples"
+    )
+
+    results = []
+    for parser in config.benchmark.parsers:
+        instance, load_time = load_parser(config, parser, documents)
+        for size in config.benchmark.sizes:
+            result = benchmark_parser(config, instance, documents, gold, size)
+            results.append({"parser": parser, "load_time": load_time, **result})
+    results = pd.DataFrame(results)
+
+    results_path = Path(config.benchmark.path).joinpath("benchmark.csv")
+    comparison_path = Path(config.benchmark.path).joinpath("comparison.csv")
+    logging.info(f"Writing benchmark results to {results_path}")
+    logging.info(f"Writing benchmark comparison to {comparison_path}")
+    results.to_csv(results_path, index=False)
+    comparison_table(results).to_csv(comparison_path, index=False)
+
+    return None
+
+
+if __name__ == "__main__":
+    from src.utils import read_config
+
+    benchmark(read_config("config.yml"))
@@ -0,0 +1,163 @@
+"""
+Streaming reader and writer for CoNLL/CoNLL-U files. Sentences are read lazily one
+at a time, so conversions and concatenations run in constant memory regardless of
+the corpus size.
+"""
+
+import os
+import threading
+from pathlib import Path
+from typing import *
+
+# a sentence is a list of rows, every row being the tab-separated columns of a line
+Sentence = List[List[str]]
+
+# write buffer size in bytes
+BUFFER_SIZE = 1024**2
+
+
+def read_sentences(path: Union[str, Path]) -> Iterator[Sentence]:
+    """
+    Lazily reads a CoNLL file sentence by sentence. Blank lines, including the
+    tab-only lines of the gold standard export, mark sentence boundaries. Comment
+    lines are returned as single-column rows.
+
+    Args:
+        path (Union[str, Path]): path to the CoNLL file
+
+    Returns:
+        Iterator[Sentence]: sentences in file order
+    """
+    sentence = []
+    with open(path, "r") as f:
+        for line in f:
+            if line.strip() == "":
+                if len(sentence) > 0:
+                    yield sentence
+                    sentence = []
+                continue
+            sentence.append(line.rstrip("\n").split("\t"))
+    if len(sentence) > 0:
+        yield sentence
+
+
+def count_tokens(conll: str) -> Tuple[int, int]:
+    """
+    Counts the tokens and sentences of CoNLL text, e.g. of a parser output. Blank
+    lines, including tab-only lines, mark sentence boundaries as in
+    ``read_sentences``.
+
+    Args:
+        conll (str): CoNLL text
+
+    Returns:
+        Tuple[int, int]: number of tokens and number of sentences
+    """
+    tokens, sentences = 0, 0
+    in_sentence = False
+    for line in conll.split("\n"):
+        if line.strip() == "":
+            in_sentence = False
+            continue
+        if not in_sentence:
+            sentences += 1
+            in_sentence = True
+        if not line.startswith("#"):
+            tokens += 1
+
+    return tokens, sentences
+
+
+def format_sentence(sentence: Sentence) -> str:
+    """
+    Formats a sentence as CoNLL lines followed by the separating blank line
+    """
+    return "".join(["\t".join(row) + "\n" for row in sentence]) + "\n"
+
+
+def _tmp_path(path: Union[str, Path]) -> Path:
+    """Temporary path next to ``path``, unique per process and thread"""
+    return Path(f"{path}.tmp{os.getpid()}_{threading.get_ident()}")
+
+
+def write_text(text: str, path: Union[str, Path]) -> None:
+    """
+    Writes text to a temporary path first and moves it into place, so that
+    concurrent writers and readers never see a partially written file
+
+    Args:
+        text (str): file content
+        path (Union[str, Path]): target path
+
+    Returns:
+        None
+    """
+    tmp_path = _tmp_path(path)
+    with open(tmp_path, "w", buffering=BUFFER_SIZE) as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+    return None
+
+
+def write_sentences(sentences: Iterable[Sentence], path: Union[str, Path]) -> int:
+    """
+    Writes sentences with buffered I/O. The file is written to a temporary path
+    first and moved into place, so a file can be rewritten from a reader on itself.
+
+    Args:
+        sentences (Iterable[Sentence]): sentences to write, consumed lazily
+        path (Union[str, Path]): target path
+
+    Returns:
+        int: number of sentences written
+    """
+    tmp_path = _tmp_path(path)
+    count = 0
+    with open(tmp_path, "w", buffering=BUFFER_SIZE) as f:
+        for sentence in sentences:
+            f.write(format_sentence(sentence))
+            count += 1
+    os.replace(tmp_path, path)
+
+    return count
+
+
+def convert_file(
+    source: Union[str, Path],
+    target: Union[str, Path],
+    convert_row: Callable[[List[str]], List[str]],
+) -> int:
+    """
+    Converts a CoNLL file row by row, e.g. from CoNLL to CoNLL-U
+
+    Args:
+        source (Union[str, Path]): path of the file to convert
+        target (Union[str, Path]): path of the converted file
+        convert_row (Callable[[List[str]], List[str]]): conversion of the columns of
+            a single token
+
+    Returns:
+        int: number of sentences written
+    """
+    return write_sentences(
+        ([convert_row(row) for row in sentence] for sentence in read_sentences(source)),
+        target,
+    )
+
+
+def concat_files(sources: Iterable[Union[str, Path]], target: Union[str, Path]) -> int:
+    """
+    Concatenates CoNLL files into a single file, one sentence at a time
+
+    Args:
+        sources (Iterable[Union[str, Path]]): paths of the files to concatenate
+        target (Union[str, Path]): path of the concatenated file
+
+    Returns:
+        int: number of sentences written
+    """
+    return write_sentences(
+        (sentence for source in sources for sentence in read_sentences(source)),
+        target,
+    )
@@ -1,14 +1,61 @@
 """
-Runs MaltEval program by calling its Java API
+Evaluates the parsers against the gold standard, either with the native in-process
+scorer (default) or by running MaltEval through its Java API as a cross-check
 """
 
-import subprocess
+import io
 import numpy as np
 import pandas as pd
 from box import Box
 import logging
-from src import *
+from src.utils import read_config
+from src.runner import run_command, run_commands
+from src.align import project_files
 from pathlib import Path
+from typing import *
+from src.eval.score import GROUPINGS, score_all_parsers
+from src.eval.gold_standard import load_gold_standard
+from src.eval.significance import significance
+
+
+def malteval_command(config: Box, parser: str, groupby: str) -> List[str]:
+    """
+    Builds the MaltEval command evaluating a parser against the gold standard,
+    writing the projection of the parse onto the gold standard sentences first
+
+    Args:
+        config (Box): project config
+        parser (str): parser under evaluation. Valid args: ["nn", "malt", "pcfg"]
+        groupby (str): MaltEval grouping, one of ``GROUPINGS``
+
+    Returns:
+        List[str]: executable and arguments
+    """
+    parse_files = config.parse_files.to_dict()
+    valid_args = list(parse_files.keys())
+    assert parser in valid_args, f"Invalid parser name. Choose one of {valid_args}"
+
+    # MaltEval requires parse and gold standard to agree on sentence boundaries
+    parse_path, gold_path = project_files(
+        Path(config.parse_path).joinpath(parse_files[parser]),
+        Path(config.gold_path).joinpath(config.files.gold_conll),
+        config.treebank_path,
+        parser,
+    )
+
+    return [
+        "java",
+        "-jar",
+        "malteval_dist_20141005/lib/MaltEval.jar",
+        "--Metric",
+        "self",
+        "--GroupBy",
+        groupby,
+        "-s",
+        str(parse_path),
+        "-g",
+        str(gold_path),
+    ]
 
 
 def evaluate_single_parser(config: Box, parser: str, groupby: str) -> str:
@@ -24,33 +71,15 @@ def evaluate_single_parser(config: Box, parser: str, groupby: str) -> str:
         str: MaltEval output as a string shwoing the precision, recal and f1-score by
             dependency relation type
     """
-    parse_files = config.parse_files.to_dict()
-    valid_args = list(parse_files.keys())
-    assert parser in valid_args, f"Invalid parser name. Choose one of {valid_args}"
     logging.info(f"Evaluating {parser.upper()} parser")
-
-    parse_path = Path(config.parse_path).joinpath(parse_files[parser])
-    gold_path = Path(config.gold_path).joinpath(config.files.gold_conll)
-
-    bash_command = (
-        f"java -jar malteval_dist_20141005/lib/MaltEval.jar "
-        f"--Metric self "
-        f"--GroupBy {groupby} "
-        f"-s {parse_path} "
-        f"-g {gold_path}"
+    result = run_command(
+        malteval_command(config, parser, groupby), timeout=config.runner.timeout
     )
 
-    logging.info(f"Executing: {bash_command}")
-
-    process = subprocess.Popen(bash_command.split(), stdout=subprocess.PIPE)
-    output, error = process.communicate()
-    # convert bytes object to regular string
-    output_str = output.decode("utf-8")
-
     # logging.debug(output_str)
-    logging.info(output_str)
+    logging.info(result.stdout)
 
-    return output_str
+    return result.stdout
 
 
 def malt_to_df(output: str, groupby: str = "Deprel") -> pd.DataFrame:
@@ -66,74 +95,119 @@ def malt_to_df(output: str, groupby: str = "Deprel") -> pd.DataFrame:
         pd.DataFrame: dataframe with parse performance by dependency relation type
     """
 
-    parse_eval = output.rstrip().split("\n")
+    # the first 12 lines are the MaltEval header, every further line is a row
+    rows = [r for r in output.rstrip().split("\n")[12:] if r.strip() != ""]
 
     eval_cols = ["precision", "recall", "fscore", groupby]
-    eval_df = pd.DataFrame(columns=eval_cols)
-    for deprel in parse_eval[12:]:
-        entries = deprel.split(" ")
-        entries = [e for e in entries if e != ""]
-        eval_df = eval_df.append(pd.Series(entries, index=eval_cols), ignore_index=True)
-
-        # post-processing
-    eval_df = eval_df.replace("-", np.nan)
-    eval_df = eval_df.astype(
-        {"precision": "float", "recall": "float", "fscore": "float"}
+    if len(rows) == 0:
+        # e.g. for an empty parse, which ``read_csv`` refuses to read
+        logging.warning(f"MaltEval printed no {groupby} rows")
+        return pd.DataFrame(
+            {
+                groupby: pd.Series(dtype=str),
+                "precision": pd.Series(dtype=float),
+                "recall": pd.Series(dtype=float),
+                "fscore": pd.Series(dtype=float),
+            }
+        )
+
+    eval_df = pd.read_csv(
+        io.StringIO("\n".join(rows)),
+        sep=r"\s+",
+        header=None,
+        names=eval_cols,
+        na_values="-",
+        dtype={
+            "precision": "float",
+            "recall": "float",
+            "fscore": "float",
+            groupby: str,
+        },
     )
 
     return eval_df[[groupby, "precision", "recall", "fscore"]]
 
 
-def evaluate_all_parsers(config: Box, by: str) -> None:
+def score_parsers(
+    config: Box, parsers: List[str], groupings: List[str] = GROUPINGS
+) -> Dict[str, Dict[str, pd.DataFrame]]:
     """
-    Function which
+    Scores every parser for every grouping using the backend set by ``eval_backend``
+    in the config. The ``native`` backend scores all groupings in a single pass
+    in-process on up to ``eval_workers`` workers, the ``malteval`` backend launches
+    ``MaltEval.jar`` once per parser and grouping, running up to ``eval_workers``
+    processes concurrently (within the overall ``runner.max_processes`` limit).
+
     Args:
         config (Box): project config
+        parsers (List[str]): parsers under evaluation
+        groupings (List[str]): MaltEval groupings to evaluate
 
     Returns:
+        Dict[str, Dict[str, pd.DataFrame]]: scores by parser and grouping
+    """
+    backend = config.get("eval_backend", "native")
+    assert backend in ["native", "malteval"], f"Invalid eval backend: {backend}"
+
+    if backend == "native":
+        return score_all_parsers(config, parsers, groupings)
+
+    # one MaltEval process per parser and grouping, run from a single event loop
+    jobs = [(parser, by) for parser in parsers for by in groupings]
+    results = run_commands(
+        [malteval_command(config, parser, by) for parser, by in jobs],
+        config.eval_workers,
+        timeout=config.runner.timeout,
+    )
+    scores = {parser: {} for parser in parsers}
+    for (parser, by), result in zip(jobs, results):
+        scores[parser][by] = malt_to_df(result.stdout, by)
+
+    return scores
+
 
+def evaluate_all_parsers(
+    config: Box, by: str, scores: Dict[str, Dict[str, pd.DataFrame]] = None
+) -> pd.DataFrame:
     """
-    nn_df = malt_to_df(evaluate_single_parser(config, "nn", by), by)
-    malt_df = malt_to_df(evaluate_single_parser(config, "malt", by), by)
-    pcfg_df = malt_to_df(evaluate_single_parser(config, "pcfg", by), by)
+    Function which merges the evaluation of all parsers for a given grouping into
+    a single dataframe
+    Args:
+        config (Box): project config
+        by (str): MaltEval grouping, one of ``GROUPINGS``
+        scores (Dict[str, Dict[str, pd.DataFrame]]): precomputed scores from
+            ``score_parsers`` - computed for the given grouping if not passed
 
-    eval_df = nn_df.merge(
-        right=malt_df, how="outer", on=by, validate="1:1", suffixes=["_nn", "_malt"]
-    )
-    eval_df = eval_df.merge(
-        right=pcfg_df, how="outer", on=by, validate="1:1", suffixes=["", "_pcfg"]
-    )
-    eval_df.rename(
-        {
-            "precision": "precision_pcfg",
-            "recall": "recall_pcfg",
-            "fscore": "fscore_pcfg",
-        },
+    Returns:
+        pd.DataFrame: precision, recall and fscore of each parser by group
+    """
+    if scores is None:
+        scores = score_parsers(config, list(config.eval), [by])
+
+    # one wide table with a (metric, parser) column per parser score
+    eval_df = pd.concat(
+        {parser: s[by].set_index(by) for parser, s in scores.items()},
         axis=1,
-        inplace=True,
+        join="outer",
+        verify_integrity=True,
     )
+    eval_df.columns = [f"{metric}_{parser}" for parser, metric in eval_df.columns]
+    eval_df = eval_df.rename_axis(by).reset_index()
 
     eval_df = eval_df.sort_values(by=by, ascending=True)
     eval_df = eval_df.sort_index(axis=1)
 
     # drop extremely sparse dependency relations (rows summing to 0)
-    eval_df = eval_df.loc[(eval_df.sum(axis=1) != 0), :]
+    eval_df = eval_df.loc[(eval_df.sum(axis=1, numeric_only=True) != 0), :]
 
     # add suppport column
     if by == "Deprel":
-        dfs = []
-        for i in SAMPLES:
-            df = pd.read_excel(
-                "data/gold_standard/gold_standard.xlsx", sheet_name=f"sample_{i}"
-            )
-            dfs.append(df)
-
-        gs_df = pd.concat(dfs)
+        gs_df = pd.concat(list(load_gold_standard(config).values()))
         gs_df = gs_df[["DEPREL"]].dropna().reset_index().drop("index", axis=1)
         support_df = (
             gs_df.value_counts()
             .reset_index()
-            .rename({0: "support", "DEPREL": "Deprel"}, axis=1)
+            .rename({0: "support", "count": "support", "DEPREL": "Deprel"}, axis=1)
         )
 
         eval_df = eval_df.merge(support_df, on="Deprel", validate="1:1", how="left")
@@ -146,13 +220,15 @@ def eval(config) -> None:
     Wrapper function for pipeline
     """
 
-    deprel_df = evaluate_all_parsers(config, by="Deprel")
+    scores = score_parsers(config, list(config.eval))
+
+    deprel_df = evaluate_all_parsers(config, by="Deprel", scores=scores)
 
-    rel_length_df = evaluate_all_parsers(config, by="RelationLength")
+    rel_length_df = evaluate_all_parsers(config, by="RelationLength", scores=scores)
     rel_length_df["RelationLength"] = rel_length_df["RelationLength"].astype("int")
     rel_length_df.sort_values(by="RelationLength", inplace=True)
 
-    arc_dir_df = evaluate_all_parsers(config, by="ArcDirection")
+    arc_dir_df = evaluate_all_parsers(config, by="ArcDirection", scores=scores)
 
     # write to csv
     deprel_path = Path(config.eval_path).joinpath("deprel_eval.csv")
@@ -166,6 +242,20 @@ def eval(config) -> None:
     deprel_df.to_csv(deprel_path, index=False)
     rel_length_df.to_csv(rel_length_path, index=False)
     arc_dir_df.to_csv(arc_dir_path, index=False)
+
+    # overall attachment scores are only computed by the native backend
+    overall = [
+        s["overall"].assign(parser=p) for p, s in scores.items() if "overall" in s
+    ]
+    if overall:
+        overall_path = Path(config.eval_path).joinpath("overall_eval.csv")
+        logging.info(f"Writing parser attachment scores to {overall_path}")
+        overall_df = pd.concat(overall, ignore_index=True)
+        overall_df[["parser", "UAS", "LAS", "LA"]].to_csv(overall_path, index=False)
+
+    if config.significance.enabled and len(scores) > 1:
+        significance(config, list(scores))
+
     return None
 
 
@@ -1,10 +1,16 @@
 import csv
+import hashlib
 import pandas as pd
 from box import Box
-from src import *
+from src.utils import read_config, SAMPLES
+from src.conll import concat_files
+from typing import *
 from pathlib import Path
 import logging
 
+# gold standard sheets loaded in this process, keyed by workbook path
+_GOLD_SHEETS = {}
+
 
 def gold_standard(config: Box) -> None:
     """
@@ -26,6 +32,43 @@ def gold_standard(config: Box) -> None:
     return None
 
 
+def load_gold_standard(config: Box) -> Dict[str, pd.DataFrame]:
+    """
+    Reads all sample sheets of the gold standard workbook in a single pass. The
+    sheets are cached in memory and pickled next to the workbook, and only read
+    from the workbook again if its modification time and content hash changed.
+    Args:
+        config (Box): main config
+
+    Returns:
+        Dict[str, pd.DataFrame]: sheet of every sample, keyed by ``sample_{idx}``
+    """
+    gold_path = Path(config.gold_path).joinpath(config.files.gold_excel)
+    cache_path = Path(config.gold_path).joinpath(config.files.gold_cache)
+    mtime = gold_path.stat().st_mtime_ns
+
+    if gold_path in _GOLD_SHEETS and _GOLD_SHEETS[gold_path]["mtime"] == mtime:
+        return _GOLD_SHEETS[gold_path]["sheets"]
+
+    cached = pd.read_pickle(cache_path) if cache_path.exists() else None
+    if cached is None or cached["mtime"] != mtime:
+        with open(gold_path, "rb") as f:
+            sha = hashlib.sha256(f.read()).hexdigest()
+        if cached is None or cached["sha256"] != sha:
+            logging.info(f"Reading gold standard workbook {gold_path}")
+            sheets = pd.read_excel(
+                gold_path,
+                sheet_name=[f"sample_{idx}" for idx in SAMPLES],
+                na_filter=True,
+            )
+            cached = {"sha256": sha, "sheets": sheets}
+        cached["mtime"] = mtime
+        pd.to_pickle(cached, cache_path)
+
+    _GOLD_SHEETS[gold_path] = cached
+    return cached["sheets"]
+
+
 def write_single_file_gs(config: Box) -> None:
     """
     Function which reads in Excel file and writes every sample as separate .conll
@@ -39,10 +82,10 @@ def write_single_file_gs(config: Box) -> None:
     """
     # WRITE SAMPLES AS INDIVIDUAL FILES
     logging.info("Writing individual gold standard files")
-    gold_path = Path(config.gold_path).joinpath(config.files.gold_excel)
+    sheets = load_gold_standard(config)
     for idx in SAMPLES:
         sample_name = f"sample_{idx}"
-        df = pd.read_excel(gold_path, sheet_name=sample_name, na_filter=True)
+        df = sheets[sample_name].copy()
 
         # fix - replace underscores with empty values
         df[["ID", "HEAD"]] = df[["ID", "HEAD"]].replace("_", "")
@@ -58,27 +101,21 @@ def write_single_file_gs(config: Box) -> None:
 
 
 def write_full_gs_from_single_files(config):
-    conll_all = ""
-    for idx in SAMPLES:
-        with open(Path(config.gold_path).joinpath(f"sample_{idx}.conll"), "r") as f:
-            sample = f.read()
-            conll_all += sample
-            conll_all += "\n"
-
-        # remove "tab-only" rows cause by setnence breaks in excel
-        conll_split = conll_all.split("\n")
-        split_cleaned = []
-        for s in conll_split:
-            if s == "\t\t\t\t\t\t\t\t\t":
-                split_cleaned.append("")
-            else:
-                split_cleaned.append(s)
-
-        conll_final = ("\n").join(split_cleaned)
+    """
+    Concatenates the individual gold standard files into a single file. The
+    "tab-only" rows caused by sentence breaks in the Excel file become blank lines.
+    Args:
+        config (Box): main config
+
+    Returns:
+        None, but writes the file given by ``files.gold_conll`` in the config
+    """
     write_path = Path(config.gold_path).joinpath(config.files.gold_conll)
     logging.info(f"Writing full gold standard file to {write_path}")
-    with open(write_path, "w") as f:
-        f.write(conll_final)
+    concat_files(
+        [Path(config.gold_path).joinpath(f"sample_{idx}.conll") for idx in SAMPLES],
+        write_path,
+    )
 
 
 if __name__ == "__main__":
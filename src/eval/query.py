@@ -0,0 +1,334 @@
+"""
+Indexed error analysis over the gold standard and the parser outputs. The parses
+are projected onto the gold trees (see ``project_to_gold``), so that every gold
+token has one system token per parser, and inverted indexes map every value of the
+query fields to the sorted positions of the gold tokens having it. Queries
+intersect these posting lists, e.g. all ``nsubj`` tokens which MALT gets wrong but
+NN gets right:
+
+    index = ErrorIndex.from_config(config, ["malt", "nn"])
+    tokens = index.query(deprel="nsubj", errors={"malt": "wrong", "nn": "correct"})
+    index.export(tokens, "data/errors/nsubj", parsers=["malt", "nn"])
+"""
+
+import logging
+import numpy as np
+import pandas as pd
+from box import Box
+from pathlib import Path
+from typing import *
+from src.align import project_to_gold, tree_heads
+from src.treebank import Treebank, load_treebank
+from src.utils import stage
+
+# error type of a system token, by whether its head and its label are correct
+ERROR_TYPES = ["correct", "head", "label", "both"]
+# query value matching every error type but ``correct``
+WRONG = "wrong"
+# gold token properties which can be queried, besides the errors of every parser
+FIELDS = ["deprel", "upos", "xpos", "distance", "direction"]
+# values of the ``direction`` field, by code
+DIRECTIONS = ["root", "left", "right"]
+
+
+def _postings(codes: np.ndarray) -> Dict[int, np.ndarray]:
+    """
+    Builds the inverted index of an array of non-negative integer codes, i.e. the
+    sorted positions of every distinct code, with a single stable sort instead of
+    one scan per code. Codes are narrowed to the smallest integer type first, for
+    which NumPy sorts in linear time (radix sort).
+    """
+    counts = np.bincount(codes)
+    keys = np.flatnonzero(counts)
+    order = np.argsort(
+        np.asarray(codes).astype(np.min_scalar_type(len(counts))), kind="stable"
+    )
+
+    return dict(zip(keys.tolist(), np.split(order, np.cumsum(counts[keys])[:-1])))
+
+
+def _intersect(postings: List[np.ndarray]) -> np.ndarray:
+    """
+    Intersects sorted posting lists, starting from the shortest and looking up
+    its remaining positions in the others by binary search
+    """
+    postings = sorted(postings, key=len)
+    result = postings[0]
+    for other in postings[1:]:
+        if len(result) == 0 or len(other) == 0:
+            return result[:0]
+        idx = np.minimum(np.searchsorted(other, result), len(other) - 1)
+        result = result[other[idx] == result]
+
+    return result
+
+
+class ErrorIndex(object):
+    """
+    Inverted indexes over the gold tokens and the errors of every parser
+
+    Args:
+        gold (Treebank): gold standard, with trees spanning several blocks merged
+        systems (Dict[str, Treebank]): parses projected onto ``gold`` by parser
+
+    Attributes:
+        sentence (np.ndarray): gold sentence number of every gold token
+        errors (Dict[str, np.ndarray]): ``ERROR_TYPES`` code of every gold token
+            by parser
+        index (Dict[str, Dict[Any, np.ndarray]]): sorted gold token positions by
+            field (``FIELDS`` and ``error:{parser}``) and value
+    """
+
+    def __init__(self, gold: Treebank, systems: Dict[str, Treebank]):
+        self.gold = gold
+        self.systems = systems
+        self.sentence = gold.sentence_index()
+
+        ids = gold.columns["id"].astype(np.int64)
+        heads = gold.columns["head"].astype(np.int64)
+        is_root = heads == 0
+        # integer codes of every field and the value of every code, if any
+        values = {
+            "distance": (np.where(is_root, 0, np.abs(ids - heads)), None),
+            "direction": (
+                np.where(is_root, 0, np.where(heads < ids, 1, 2)),
+                np.array(DIRECTIONS),
+            ),
+        }
+        for name in ["deprel", "upos", "xpos"]:
+            values[name] = (gold.columns[name], gold.tables[name])
+        gold_heads = tree_heads(ids, heads)
+        gold_deprels = {
+            deprel: code for code, deprel in enumerate(gold.tables["deprel"])
+        }
+
+        self.errors = {}
+        for parser, system in systems.items():
+            assert system.n_tokens == gold.n_tokens, "Parse is not projected on gold"
+            system_heads = tree_heads(
+                system.columns["id"].astype(np.int64),
+                system.columns["head"].astype(np.int64),
+            )
+            wrong_head = system_heads != gold_heads
+            # compare labels by code, translating the system codes to gold codes
+            to_gold = np.array(
+                [gold_deprels.get(d, -1) for d in system.tables["deprel"]]
+            )
+            wrong_label = to_gold[system.columns["deprel"]] != gold.columns["deprel"]
+            self.errors[parser] = (wrong_head.astype(np.int8) + 2 * wrong_label).astype(
+                np.int8
+            )
+
+        self.index = {}
+        for name in FIELDS:
+            # index the codes and decode only the distinct values
+            codes, table = values[name]
+            self.index[name] = {
+                code if table is None else table[code]: positions
+                for code, positions in _postings(codes).items()
+            }
+        for parser, errors in self.errors.items():
+            codes = _postings(errors)
+            postings = {ERROR_TYPES[code]: p for code, p in codes.items()}
+            postings[WRONG] = np.flatnonzero(errors > 0)
+            self.index[f"error:{parser}"] = postings
+
+    @classmethod
+    def from_config(cls, config: Box, parsers: List[str]) -> "ErrorIndex":
+        """
+        Builds the index from the compiled treebanks of the gold standard and the
+        given parsers, see ``load_treebank``
+
+        Args:
+            config (Box): main config
+            parsers (List[str]): keys of ``parse_files`` in the config
+
+        Returns:
+            ErrorIndex: index over all parsers
+        """
+        with stage("error_index") as metrics:
+            gold = load_treebank(config, "gold")
+            systems = {}
+            for parser in parsers:
+                systems[parser], merged_gold = project_to_gold(
+                    load_treebank(config, parser), gold
+                )
+            index = cls(merged_gold if parsers else gold, systems)
+            metrics["tokens"] = index.gold.n_tokens
+            metrics["sentences"] = len(index.gold)
+
+        return index
+
+    @property
+    def parsers(self) -> List[str]:
+        return list(self.systems)
+
+    def values(self, field: str) -> List[Any]:
+        """
+        Returns the indexed values of a field, e.g. all gold deprels
+        """
+        return list(self.index[field])
+
+    def query(
+        self, errors: Dict[str, Union[str, List[str]]] = None, **fields
+    ) -> np.ndarray:
+        """
+        Finds the gold tokens matching all given conditions. A condition holds a
+        single value or a list of values, any of which may match.
+
+        Args:
+            errors (Dict[str, Union[str, List[str]]]): error types by parser, one of
+                ``ERROR_TYPES`` or ``wrong`` for any error
+            **fields: values of the gold tokens by field, see ``FIELDS``, e.g.
+                ``deprel="nsubj"`` or ``distance=[1, 2]``
+
+        Returns:
+            np.ndarray: sorted positions of the matching gold tokens
+        """
+        conditions = dict(fields)
+        for parser, error in (errors or {}).items():
+            assert parser in self.systems, f"Parser {parser} is not indexed"
+            conditions[f"error:{parser}"] = error
+
+        postings = []
+        for field, values in conditions.items():
+            assert field in self.index, f"Invalid field {field}. Use one of {FIELDS}"
+            if not isinstance(values, (list, tuple, set)):
+                values = [values]
+            matches = [self.index[field].get(v, np.empty(0, np.int64)) for v in values]
+            # the postings of different values of a field are disjoint
+            postings.append(
+                matches[0] if len(matches) == 1 else np.sort(np.concatenate(matches))
+            )
+        if len(postings) == 0:
+            return np.arange(self.gold.n_tokens)
+
+        return _intersect(postings)
+
+    def sentences(self, tokens: np.ndarray) -> np.ndarray:
+        """
+        Returns the sorted gold sentence numbers of the given tokens
+        """
+        return np.unique(self.sentence[tokens])
+
+    def tokens(self, tokens: np.ndarray) -> pd.DataFrame:
+        """
+        Tabulates the given tokens with their gold and system annotation
+
+        Args:
+            tokens (np.ndarray): gold token positions, e.g. from ``query``
+
+        Returns:
+            pd.DataFrame: one row per token with the sentence, gold id, form,
+                head and deprel, and the head, deprel and error type by parser
+        """
+        table = {
+            "sentence": self.sentence[tokens],
+            "id": self.gold.columns["id"][tokens],
+            "form": self.gold.column("form")[tokens],
+            "head": self.gold.columns["head"][tokens],
+            "deprel": self.gold.column("deprel")[tokens],
+        }
+        for parser, system in self.systems.items():
+            table[f"head_{parser}"] = system.columns["head"][tokens]
+            table[f"deprel_{parser}"] = system.column("deprel")[tokens]
+            table[f"error_{parser}"] = np.array(ERROR_TYPES)[
+                self.errors[parser][tokens]
+            ]
+
+        return pd.DataFrame(table)
+
+    def summary(self, tokens: np.ndarray, by: str = "deprel") -> pd.DataFrame:
+        """
+        Counts the error types of every parser on the given tokens by the values
+        of a field
+
+        Args:
+            tokens (np.ndarray): gold token positions, e.g. from ``query``
+            by (str): field to group by, see ``FIELDS``
+
+        Returns:
+            pd.DataFrame: number of tokens (``support``) and of every error type
+                by parser (``{error}_{parser}``) per value of ``by``
+        """
+        assert by in FIELDS, f"Invalid field {by}. Use one of {FIELDS}"
+        values = list(self.index[by])
+        # group number of every token, from the postings of the grouping field
+        group = np.empty(self.gold.n_tokens, dtype=np.int64)
+        for idx, value in enumerate(values):
+            group[self.index[by][value]] = idx
+        group = group[tokens]
+
+        table = {by: values, "support": np.bincount(group, minlength=len(values))}
+        n_types = len(ERROR_TYPES)
+        for parser, errors in self.errors.items():
+            counts = np.bincount(
+                group * n_types + errors[tokens], minlength=len(values) * n_types
+            ).reshape(len(values), n_types)
+            for code, error in enumerate(ERROR_TYPES):
+                table[f"{error}_{parser}"] = counts[:, code]
+
+        table = pd.DataFrame(table)
+
+        return table.loc[table["support"] > 0].reset_index(drop=True)
+
+    def export(
+        self, tokens: np.ndarray, target: Union[str, Path], parsers: List[str] = None
+    ) -> Dict[str, Path]:
+        """
+        Writes the sentences containing the given tokens as CoNLL-U subsets of the
+        gold standard and of the parses
+
+        Args:
+            tokens (np.ndarray): gold token positions, e.g. from ``query``
+            target (Union[str, Path]): directory of the subsets
+            parsers (List[str]): parses to export, all indexed parsers if not passed
+
+        Returns:
+            Dict[str, Path]: path of the subset by parser and ``gold``
+        """
+        target = Path(target)
+        target.mkdir(parents=True, exist_ok=True)
+        sentences = self.sentences(tokens)
+        treebanks = {"gold": self.gold}
+        for parser in self.parsers if parsers is None else parsers:
+            treebanks[parser] = self.systems[parser]
+
+        paths = {}
+        for name, treebank in treebanks.items():
+            paths[name] = target.joinpath(f"{name}.conll")
+            treebank.subset(sentences).to_conll(paths[name])
+
+        return paths
+
+
+def error_analysis(config: Box) -> None:
+    """
+    Pipeline wrapper running the queries of ``errors.queries`` in the config. Every
+    query writes the matching sentences of the gold standard and all parsers as
+    CoNLL-U files, a table of the matching tokens and a summary table by deprel to
+    ``errors.path``/``{query name}``.
+
+    Returns:
+        None
+    """
+    index = ErrorIndex.from_config(config, list(config.eval))
+
+    for name, conditions in config.errors.queries.items():
+        conditions = conditions.to_dict()
+        errors = conditions.pop("errors", None)
+        with stage(f"query_{name}"):
+            tokens = index.query(errors, **conditions)
+        target = Path(config.errors.path).joinpath(name)
+        logging.info(
+            f"Query {name} matched {len(tokens)} tokens in "
+            f"{len(index.sentences(tokens))} sentences, writing to {target}"
+        )
+
+        index.export(tokens, target)
+        index.tokens(tokens).to_csv(target.joinpath("tokens.csv"), index=False)
+        index.summary(tokens, by="deprel").to_csv(
+            target.joinpath("summary.csv"), index=False
+        )
+
+    return None
@@ -0,0 +1,341 @@
+"""
+Headless rendering of parse diffs as static SVG files and an HTML report, as a
+batch alternative to the interactive MaltEval TreeViewer. Every sentence is drawn
+as a stack of panels, the gold tree on top and the parse of every parser below,
+with the arcs of each parser coloured by their error type. Sentences are rendered
+in chunks on a pool of worker processes, without a display or a JVM.
+"""
+
+import html
+import logging
+import numpy as np
+from box import Box
+from pathlib import Path
+from typing import *
+from src.eval.query import ERROR_TYPES, ErrorIndex
+from src.utils import get_executor, stage
+
+# arc colour by error type, gold arcs are drawn in the colour of ``correct``
+COLOURS = {
+    "correct": "#2f6f3e",
+    "head": "#c0392b",
+    "label": "#d68910",
+    "both": "#922b21",
+}
+GOLD_COLOUR = "#333333"
+CHAR_WIDTH = 7.5
+TOKEN_GAP = 18
+LEVEL_HEIGHT = 16
+TEXT_HEIGHT = 30
+PANEL_GAP = 12
+MARGIN = 10
+
+
+def _arc_levels(heads: List[int]) -> List[int]:
+    """
+    Computes the nesting level of every arc, i.e. one above the highest arc
+    spanning strictly inside it, so that nested arcs do not overlap
+
+    Args:
+        heads (List[int]): head position of every token, -1 for the root
+
+    Returns:
+        List[int]: level of the arc of every token, 0 for the root
+    """
+    spans = [
+        (min(dep, head), max(dep, head), dep)
+        for dep, head in enumerate(heads)
+        if head >= 0
+    ]
+    levels = [0] * len(heads)
+    for start, end, idx in sorted(spans, key=lambda s: s[1] - s[0]):
+        inner = [
+            levels[other]
+            for s, e, other in spans
+            if other != idx and start <= s and e <= end and (s, e) != (start, end)
+        ]
+        levels[idx] = 1 + max(inner, default=0)
+
+    return levels
+
+
+def _panel(
+    forms: List[str],
+    heads: List[int],
+    deprels: List[str],
+    colours: List[str],
+    title: str,
+    positions: List[float],
+    top: float,
+) -> Tuple[List[str], float]:
+    """
+    Draws a single tree as SVG elements below ``top``
+
+    Returns:
+        Tuple[List[str], float]: SVG elements and the panel height
+    """
+    levels = _arc_levels(heads)
+    height = (max(levels, default=0) + 1) * LEVEL_HEIGHT + TEXT_HEIGHT
+    baseline = top + height - TEXT_HEIGHT
+    elements = [
+        f'<text x="{MARGIN}" y="{top + 12}" class="title">{html.escape(title)}</text>'
+    ]
+    for idx, (head, deprel, colour) in enumerate(zip(heads, deprels, colours)):
+        x = positions[idx]
+        label = html.escape(deprel)
+        if head < 0:
+            elements.append(
+                f'<line x1="{x}" y1="{top + 16}" x2="{x}" y2="{baseline}" '
+                f'stroke="{colour}" marker-end="url(#arrow)"/>'
+                f'<text x="{x + 3}" y="{top + 26}" fill="{colour}">{label}</text>'
+            )
+            continue
+        x_head = positions[head]
+        apex = baseline - levels[idx] * LEVEL_HEIGHT
+        # the bezier curve peaks at three quarters of the control point height
+        y_label = baseline - levels[idx] * LEVEL_HEIGHT * 0.75 - 2
+        elements.append(
+            f'<path d="M {x_head} {baseline} C {x_head} {apex}, {x} {apex}, '
+            f'{x} {baseline}" stroke="{colour}" marker-end="url(#arrow)"/>'
+            f'<text x="{(x + x_head) / 2}" y="{y_label}" fill="{colour}" '
+            f'text-anchor="middle">{label}</text>'
+        )
+    for x, form in zip(positions, forms):
+        elements.append(
+            f'<text x="{x}" y="{baseline + 16}" text-anchor="middle" class="form">'
+            f"{html.escape(form)}</text>"
+        )
+
+    return elements, height
+
+
+def render_sentence(sentence: Dict[str, Any]) -> str:
+    """
+    Renders the gold tree of a sentence and the parses of all parsers as one SVG
+
+    Args:
+        sentence (Dict[str, Any]): ``form``, ``head`` and ``deprel`` lists of the
+            gold tokens and a ``parses`` dict with the ``head``, ``deprel`` and
+            ``error`` (``ERROR_TYPES``) lists of every parser, projected onto the
+            gold tokens. Heads are positions within the sentence, -1 for the root
+
+    Returns:
+        str: SVG document
+    """
+    forms = sentence["form"]
+    widths = [
+        max([len(forms[i]), len(sentence["deprel"][i])]) * CHAR_WIDTH + TOKEN_GAP
+        for i in range(len(forms))
+    ]
+    positions = (MARGIN + np.cumsum(widths) - np.array(widths) / 2).tolist()
+
+    elements, top = [], MARGIN
+    panels = [("gold", sentence["head"], sentence["deprel"], None)] + [
+        (parser, parse["head"], parse["deprel"], parse["error"])
+        for parser, parse in sentence["parses"].items()
+    ]
+    for title, heads, deprels, errors in panels:
+        if errors is None:
+            colours = [GOLD_COLOUR] * len(forms)
+        else:
+            colours = [COLOURS[e] for e in errors]
+            n_wrong = sum([e != "correct" for e in errors])
+            title = f"{title} ({n_wrong} of {len(errors)} tokens wrong)"
+        panel, height = _panel(forms, heads, deprels, colours, title, positions, top)
+        elements.extend(panel)
+        top += height + PANEL_GAP
+
+    width = MARGIN * 2 + sum(widths)
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:.0f}" '
+        f'height="{top:.0f}" font-family="sans-serif" font-size="11">'
+        '<defs><marker id="arrow" viewBox="0 0 10 10" refX="10" refY="5" '
+        'markerWidth="6" markerHeight="6" orient="auto-start-reverse">'
+        '<path d="M 0 0 L 10 5 L 0 10 z" fill="context-stroke"/></marker></defs>'
+        "<style>path { fill: none; } .form { font-size: 13px; } "
+        ".title { font-weight: bold; }</style>" + "".join(elements) + "</svg>"
+    )
+
+
+def _render_chunk(
+    sentences: List[Tuple[int, Dict[str, Any]]], target: Union[str, Path]
+) -> List[str]:
+    """Renders a chunk of sentences to ``sentence_{number}.svg``, as worker job"""
+    paths = []
+    for number, sentence in sentences:
+        path = Path(target).joinpath(f"sentence_{number}.svg")
+        path.write_text(render_sentence(sentence), encoding="utf-8")
+        paths.append(path.name)
+
+    return paths
+
+
+def _render_columns(index: ErrorIndex) -> Dict[str, np.ndarray]:
+    """
+    Decodes the columns needed for rendering once for all sentences. Heads are
+    stored as positions within the sentence, -1 for the root.
+    """
+    gold = index.gold
+    ids = gold.columns["id"].astype(np.int64)
+    offsets = np.repeat(gold.offsets[:-1], np.diff(gold.offsets))
+    positions = np.arange(gold.n_tokens) - offsets
+    heads = gold.columns["head"].astype(np.int64)
+    columns = {
+        "form": gold.column("form"),
+        "head": np.where(heads > 0, positions - ids + heads, -1),
+        "deprel": gold.column("deprel"),
+    }
+    for parser, system in index.systems.items():
+        # projected parses use the ids of the gold tokens
+        heads = system.columns["head"].astype(np.int64)
+        columns[f"head:{parser}"] = np.where(heads > 0, positions - ids + heads, -1)
+        columns[f"deprel:{parser}"] = system.column("deprel")
+        columns[f"error:{parser}"] = np.array(ERROR_TYPES)[index.errors[parser]]
+
+    return columns
+
+
+def _sentence_data(
+    columns: Dict[str, np.ndarray],
+    offsets: np.ndarray,
+    parsers: List[str],
+    sentences: np.ndarray,
+) -> List[Dict[str, Any]]:
+    """
+    Extracts the rendering input of the given sentences from the output of
+    ``_render_columns``, see ``render_sentence``
+    """
+    data = []
+    for number in sentences:
+        start, end = offsets[number], offsets[number + 1]
+        data.append(
+            {
+                "form": columns["form"][start:end].tolist(),
+                "head": columns["head"][start:end].tolist(),
+                "deprel": columns["deprel"][start:end].tolist(),
+                "parses": {
+                    parser: {
+                        name: columns[f"{name}:{parser}"][start:end].tolist()
+                        for name in ["head", "deprel", "error"]
+                    }
+                    for parser in parsers
+                },
+            }
+        )
+
+    return data
+
+
+def render_sentences(
+    index: ErrorIndex,
+    sentences: np.ndarray,
+    target: Union[str, Path],
+    workers: int = 1,
+    chunk_size: int = 100,
+) -> Path:
+    """
+    Renders the given sentences of an error index on a pool of worker processes
+    and writes an HTML report linking all views
+
+    Args:
+        index (ErrorIndex): index holding the gold standard and the projected parses
+        sentences (np.ndarray): gold sentence numbers, e.g. from
+            ``ErrorIndex.sentences``
+        target (Union[str, Path]): directory of the SVG files and the report
+        workers (int): worker processes
+        chunk_size (int): sentences rendered per job
+
+    Returns:
+        Path: path of the HTML report ``index.html``
+    """
+    target = Path(target)
+    target.mkdir(parents=True, exist_ok=True)
+    sentences = np.asarray(sentences, dtype=np.int64)
+
+    with stage("render") as metrics:
+        columns = _render_columns(index)
+        with get_executor(workers, "process") as pool:
+            futures = [
+                pool.submit(
+                    _render_chunk,
+                    list(
+                        zip(
+                            sentences[i : i + chunk_size].tolist(),
+                            _sentence_data(
+                                columns,
+                                index.gold.offsets,
+                                index.parsers,
+                                sentences[i : i + chunk_size],
+                            ),
+                        )
+                    ),
+                    target,
+                )
+                for i in range(0, len(sentences), chunk_size)
+            ]
+        files = [name for future in futures for name in future.result()]
+        metrics["sentences"] = len(files)
+
+    # number of wrong tokens by sentence and parser for the report
+    wrong = {
+        parser: np.bincount(
+            index.sentence, weights=errors > 0, minlength=len(index.gold)
+        ).astype(int)
+        for parser, errors in index.errors.items()
+    }
+    rows = []
+    for number, name in zip(sentences.tolist(), files):
+        counts = "".join([f"<td>{wrong[p][number]}</td>" for p in index.parsers])
+        rows.append(
+            f'<tr><td><a href="#s{number}">{number}</a></td>{counts}</tr>'
+            f'<tr id="s{number}"><td colspan="{len(index.parsers) + 1}">'
+            f'<img src="{name}" loading="lazy" alt="sentence {number}"/></td></tr>'
+        )
+    header = "".join([f"<th>{p} errors</th>" for p in index.parsers])
+    legend = ", ".join(
+        [f'<span style="color:{c}">{e}</span>' for e, c in COLOURS.items()]
+    )
+    report = target.joinpath("index.html")
+    report.write_text(
+        "<!DOCTYPE html><html><head><meta charset='utf-8'>"
+        "<title>Parse diffs</title></head><body>"
+        f"<h1>Parse diffs of {len(files)} sentences</h1>"
+        f"<p>Arc colours by error type: {legend}</p>"
+        f"<table><tr><th>sentence</th>{header}</tr>{''.join(rows)}</table>"
+        "</body></html>",
+        encoding="utf-8",
+    )
+    logging.info(f"Rendered {len(files)} sentences, report written to {report}")
+
+    return report
+
+
+def render(config: Box) -> None:
+    """
+    Pipeline wrapper rendering the gold standard and the parses of all parsers of
+    ``eval`` for every sentence (or only sentences with errors, see
+    ``render.only_errors``) to ``render.path``
+
+    Returns:
+        None
+    """
+    index = ErrorIndex.from_config(config, list(config.eval))
+    sentences = np.arange(len(index.gold))
+    if config.render.only_errors and index.parsers:
+        sentences = index.sentences(
+            np.unique(
+                np.concatenate(
+                    [index.query(errors={p: "wrong"}) for p in index.parsers]
+                )
+            )
+        )
+
+    render_sentences(
+        index,
+        sentences,
+        config.render.path,
+        workers=config.render.workers,
+        chunk_size=config.render.chunk_size,
+    )
+
+    return None
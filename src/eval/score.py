@@ -0,0 +1,666 @@
+"""
+Native in-process scorer reproducing the MaltEval ``--Metric self --GroupBy`` output
+without launching a JVM. Scores are computed from per-sentence sufficient statistics,
+which can be kept between runs so that only changed sentences are rescored.
+"""
+
+import numpy as np
+import pandas as pd
+from box import Box
+import logging
+from pathlib import Path
+from typing import *
+from src.treebank import Treebank
+from src.align import align_parse, align_tokens
+from src.utils import get_executor, stage
+
+GROUPINGS = ["Deprel", "RelationLength", "ArcDirection"]
+
+# MaltEval prints its scores using the ``0.000`` pattern
+DECIMALS = 3
+
+
+def read_conll_columns(path: Union[str, Path]) -> Dict[str, np.ndarray]:
+    """
+    Reads a CoNLL/CoNLL-U file into columnar arrays. Comment lines, multiword
+    tokens and empty nodes are skipped, blank (or tab-only) lines mark sentence
+    boundaries.
+
+    Args:
+        path (Union[str, Path]): path to the CoNLL file
+
+    Returns:
+        Dict[str, np.ndarray]: arrays ``id``, ``head``, ``deprel``, ``form`` and
+            ``sentence`` (sentence index of each token), all by token position
+    """
+    return treebank_columns(Treebank.from_conll(path))
+
+
+def treebank_columns(treebank: Treebank) -> Dict[str, np.ndarray]:
+    """
+    Extracts the columns needed for scoring from a treebank, see
+    ``read_conll_columns``
+    """
+    return {
+        "id": treebank.column("id").astype(np.int64),
+        "head": treebank.column("head").astype(np.int64),
+        "deprel": treebank.column("deprel").astype(object),
+        "form": treebank.column("form").astype(object),
+        "sentence": treebank.sentence_index(),
+    }
+
+
+def group_keys(columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Derives the MaltEval grouping value of every token
+
+    - ``Deprel``: dependency relation label
+    - ``RelationLength``: distance between token and head (0 for the root)
+    - ``ArcDirection``: ``left`` if the head precedes the token, ``right`` if it
+      follows it and ``root`` for the root
+
+    Args:
+        columns (Dict[str, np.ndarray]): output of ``read_conll_columns``
+
+    Returns:
+        Dict[str, np.ndarray]: string keys per grouping, aligned by token position
+    """
+    ids, heads = columns["id"], columns["head"]
+    is_root = heads == 0
+    length = np.where(is_root, 0, np.abs(ids - heads))
+    direction = np.where(is_root, "root", np.where(heads < ids, "left", "right"))
+
+    return {
+        "Deprel": columns["deprel"],
+        "RelationLength": length.astype(str).astype(object),
+        "ArcDirection": direction.astype(object),
+    }
+
+
+def sentence_stats(
+    system: Dict[str, np.ndarray],
+    gold: Dict[str, np.ndarray],
+    groupings: List[str] = GROUPINGS,
+    sentences: np.ndarray = None,
+    alignment: Dict[str, np.ndarray] = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Computes the sufficient statistics of every gold sentence, i.e. everything the
+    scores can be aggregated from. Parse and gold standard are aligned by token
+    first, so they may differ in tokens and sentence boundaries.
+
+    Args:
+        system (Dict[str, np.ndarray]): parsed columns from ``read_conll_columns``
+        gold (Dict[str, np.ndarray]): gold columns from ``read_conll_columns``
+        groupings (List[str]): groupings to evaluate, subset of ``GROUPINGS``
+        sentences (np.ndarray): gold sentence numbers to compute the statistics for,
+            all sentences if not passed
+        alignment (Dict[str, np.ndarray]): output of ``align_parse``, computed if
+            not passed
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]: gold, system and correct (``hits``)
+            counts by sentence, grouping (``by``) and group value (``label``), and
+            the number of tokens, correct heads, correct labels and correct
+            heads and labels by sentence
+    """
+    if alignment is None:
+        alignment = align_parse(system, gold)
+    gold_mask, system_mask = slice(None), slice(None)
+    if sentences is not None:
+        gold_mask = np.isin(gold["sentence"], sentences)
+        system_mask = np.isin(alignment["system_sentence"], sentences)
+    gold_sentence = gold["sentence"][gold_mask]
+    system_sentence = alignment["system_sentence"][system_mask]
+    gold_to_system = alignment["gold_to_system"]
+    aligned = gold_to_system >= 0
+    sys_keys, gold_keys = group_keys(system), group_keys(gold)
+
+    groups = []
+    for by in groupings:
+        g, s = gold_keys[by], sys_keys[by]
+        hits = aligned & (g == s[np.maximum(gold_to_system, 0)])
+        tokens = pd.concat(
+            [
+                pd.DataFrame(
+                    {
+                        "sentence": gold_sentence,
+                        "label": g[gold_mask],
+                        "gold": 1,
+                        "system": 0,
+                        "hits": hits[gold_mask].astype(int),
+                    }
+                ),
+                pd.DataFrame(
+                    {
+                        "sentence": system_sentence,
+                        "label": s[system_mask],
+                        "gold": 0,
+                        "system": 1,
+                        "hits": 0,
+                    }
+                ),
+            ]
+        )
+        counts = tokens.groupby(["sentence", "label"], as_index=False).sum()
+        groups.append(counts.assign(by=by))
+    groups = pd.concat(groups, ignore_index=True)[
+        ["sentence", "by", "label", "gold", "system", "hits"]
+    ]
+
+    head_correct = alignment["head_correct"][gold_mask]
+    label_correct = alignment["label_correct"][gold_mask]
+    attachment = (
+        pd.DataFrame(
+            {
+                "sentence": gold_sentence,
+                "tokens": 1,
+                "head": head_correct.astype(int),
+                "label": label_correct.astype(int),
+                "both": (head_correct & label_correct).astype(int),
+            }
+        )
+        .groupby("sentence", as_index=False)
+        .sum()
+    )
+
+    return groups, attachment
+
+
+def _grouped_scores(counts: pd.DataFrame, groupby: str) -> pd.DataFrame:
+    """
+    Computes precision, recall and f-score per group value from the summed gold,
+    system and correct counts, where a token counts as correct if its system value
+    equals its gold value (MaltEval ``--Metric self``)
+    """
+    gold_counts = counts["gold"].to_numpy()
+    sys_counts = counts["system"].to_numpy()
+    hits = counts["hits"].to_numpy()
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(sys_counts > 0, hits / sys_counts, np.nan)
+        recall = np.where(gold_counts > 0, hits / gold_counts, np.nan)
+        fscore = np.where(
+            precision + recall > 0,
+            2 * precision * recall / (precision + recall),
+            np.where(np.isnan(precision + recall), np.nan, 0.0),
+        )
+
+    return pd.DataFrame(
+        {
+            groupby: counts["label"].astype(str).to_numpy(),
+            "precision": precision.round(DECIMALS),
+            "recall": recall.round(DECIMALS),
+            "fscore": fscore.round(DECIMALS),
+        }
+    )
+
+
+def stats_totals(
+    groups: pd.DataFrame, attachment: pd.DataFrame
+) -> Tuple[pd.DataFrame, pd.Series]:
+    """
+    Sums the sufficient statistics of ``sentence_stats`` over all sentences
+
+    Args:
+        groups (pd.DataFrame): grouped counts by sentence
+        attachment (pd.DataFrame): attachment counts by sentence
+
+    Returns:
+        Tuple[pd.DataFrame, pd.Series]: gold, system and correct counts by
+            grouping and group value, and the attachment counts
+    """
+    totals = groups.groupby(["by", "label"], as_index=False)[
+        ["gold", "system", "hits"]
+    ].sum()
+
+    return totals, attachment[["tokens", "head", "label", "both"]].sum()
+
+
+def scores_from_totals(
+    totals: pd.DataFrame, attachment: pd.Series, groupings: List[str] = GROUPINGS
+) -> Dict[str, pd.DataFrame]:
+    """
+    Computes the scores from the summed statistics of ``stats_totals``
+
+    Args:
+        totals (pd.DataFrame): grouped counts
+        attachment (pd.Series): attachment counts
+        groupings (List[str]): groupings to evaluate, subset of ``GROUPINGS``
+
+    Returns:
+        Dict[str, pd.DataFrame]: one dataframe per grouping with the same layout
+            as ``malt_to_df``, plus an ``overall`` entry with UAS, LAS and LA
+    """
+    scores = {
+        by: _grouped_scores(totals.loc[totals["by"] == by], by) for by in groupings
+    }
+
+    n_tokens = attachment["tokens"]
+    scores["overall"] = pd.DataFrame(
+        {
+            "UAS": [attachment["head"] / n_tokens],
+            "LAS": [attachment["both"] / n_tokens],
+            "LA": [attachment["label"] / n_tokens],
+        }
+    ).round(DECIMALS)
+
+    return scores
+
+
+def scores_from_stats(
+    groups: pd.DataFrame, attachment: pd.DataFrame, groupings: List[str] = GROUPINGS
+) -> Dict[str, pd.DataFrame]:
+    """
+    Aggregates the sufficient statistics of ``sentence_stats`` into scores
+
+    Args:
+        groups (pd.DataFrame): grouped counts by sentence
+        attachment (pd.DataFrame): attachment counts by sentence
+        groupings (List[str]): groupings to evaluate, subset of ``GROUPINGS``
+
+    Returns:
+        Dict[str, pd.DataFrame]: one dataframe per grouping with the same layout
+            as ``malt_to_df``, plus an ``overall`` entry with UAS, LAS and LA
+    """
+    return scores_from_totals(*stats_totals(groups, attachment), groupings)
+
+
+def _update_totals(
+    totals: pd.DataFrame,
+    attachment: pd.Series,
+    removed: Tuple[pd.DataFrame, pd.DataFrame],
+    added: Tuple[pd.DataFrame, pd.DataFrame],
+) -> Tuple[pd.DataFrame, pd.Series]:
+    """
+    Subtracts the statistics of removed sentences from the totals of
+    ``stats_totals`` and adds those of added sentences
+    """
+    columns = ["gold", "system", "hits"]
+    removed_totals, removed_attachment = stats_totals(*removed)
+    added_totals, added_attachment = stats_totals(*added)
+    removed_totals[columns] *= -1
+    totals = (
+        pd.concat([totals, removed_totals, added_totals])
+        .groupby(["by", "label"], as_index=False)[columns]
+        .sum()
+    )
+    # group values no longer found in any sentence
+    totals = totals.loc[(totals["gold"] > 0) | (totals["system"] > 0)]
+
+    return totals, attachment - removed_attachment + added_attachment
+
+
+def score_parse(
+    system: Dict[str, np.ndarray],
+    gold: Dict[str, np.ndarray],
+    groupings: List[str] = GROUPINGS,
+) -> Dict[str, pd.DataFrame]:
+    """
+    Scores a single parse against the gold standard for all requested groupings
+
+    Args:
+        system (Dict[str, np.ndarray]): parsed columns from ``read_conll_columns``
+        gold (Dict[str, np.ndarray]): gold columns from ``read_conll_columns``
+        groupings (List[str]): groupings to evaluate, subset of ``GROUPINGS``
+
+    Returns:
+        Dict[str, pd.DataFrame]: one dataframe per grouping with the same layout
+            as ``malt_to_df``, plus an ``overall`` entry with UAS, LAS and LA
+    """
+    groups, attachment = sentence_stats(system, gold, groupings)
+
+    return scores_from_stats(groups, attachment, groupings)
+
+
+def sentence_offsets(columns: Dict[str, np.ndarray]) -> np.ndarray:
+    """
+    Returns the start offset of every sentence in the token arrays of
+    ``read_conll_columns``, followed by the number of tokens
+    """
+    sentence = columns["sentence"]
+    n_sentences = int(sentence[-1]) + 1 if len(sentence) > 0 else 0
+
+    return np.searchsorted(sentence, np.arange(n_sentences + 1))
+
+
+def sentence_hashes(columns: Dict[str, np.ndarray]) -> np.ndarray:
+    """
+    Hashes the content (ID, HEAD, DEPREL and FORM of every token) of every
+    sentence. Tokens are hashed together with their position in the sentence in
+    one vectorized pass, the hash of a sentence is the sum of its token hashes.
+
+    Args:
+        columns (Dict[str, np.ndarray]): output of ``read_conll_columns``
+
+    Returns:
+        np.ndarray: ``uint64`` hash per sentence
+    """
+    offsets = sentence_offsets(columns)
+    lengths = np.diff(offsets)
+    position = np.arange(offsets[-1]) - np.repeat(offsets[:-1], lengths)
+    tokens = pd.util.hash_pandas_object(
+        pd.DataFrame(
+            {
+                "position": position,
+                "id": columns["id"],
+                "head": columns["head"],
+                "deprel": columns["deprel"],
+                "form": columns["form"],
+            }
+        ),
+        index=False,
+    ).to_numpy()
+    hashes = np.zeros(len(lengths), dtype=np.uint64)
+    non_empty = lengths > 0
+    if non_empty.any():
+        hashes[non_empty] = np.add.reduceat(tokens, offsets[:-1][non_empty])
+
+    return hashes
+
+
+def match_sentences(old_hashes: np.ndarray, new_hashes: np.ndarray) -> np.ndarray:
+    """
+    Matches the sentences of two versions of a treebank by their hashes (see
+    ``sentence_hashes``), aligning the hash sequences like token streams. Only
+    sentences whose neighbours are matched to the neighbours of their match are
+    kept, so that a matched sentence has the same context in both versions.
+
+    Args:
+        old_hashes (np.ndarray): hash per sentence of the old version
+        new_hashes (np.ndarray): hash per sentence of the new version
+
+    Returns:
+        np.ndarray: new sentence matched to every old sentence, -1 if it changed
+    """
+    if len(old_hashes) == 0 or len(new_hashes) == 0:
+        return np.full(len(old_hashes), -1, dtype=np.int64)
+    old_to_new = align_tokens(new_hashes, old_hashes)
+    matched = old_to_new >= 0
+    matched[matched] = new_hashes[old_to_new[matched]] == old_hashes[matched]
+    old_to_new = np.where(matched, old_to_new, -1)
+
+    # the first and last sentences have to stay first and last
+    before = np.concatenate([[-1], old_to_new[:-1]])
+    after = np.concatenate([old_to_new[1:], [len(new_hashes)]])
+    in_context = (before == old_to_new - 1) & (after == old_to_new + 1)
+
+    return np.where(matched & in_context, old_to_new, -1)
+
+
+def _concat_ranges(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """
+    Concatenates the integer ranges ``[start, end)`` without a Python loop
+    """
+    lengths = ends - starts
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+
+    return np.arange(offsets[-1]) - np.repeat(offsets[:-1] - starts, lengths)
+
+
+def _map_positions(
+    positions: np.ndarray,
+    old_offsets: np.ndarray,
+    new_offsets: np.ndarray,
+    old_to_new: np.ndarray,
+) -> np.ndarray:
+    """
+    Maps token positions of matched sentences (or the end of the stream) from
+    the old to the new version of a treebank, see ``match_sentences``
+    """
+    if len(old_to_new) == 0:
+        return np.full(len(positions), new_offsets[-1], dtype=np.int64)
+    sentence = np.searchsorted(old_offsets, positions, side="right") - 1
+    at_end = positions >= old_offsets[-1]
+    sentence = np.minimum(sentence, len(old_to_new) - 1)
+    mapped = new_offsets[np.maximum(old_to_new[sentence], 0)] + (
+        positions - old_offsets[sentence]
+    )
+
+    return np.where(at_end, new_offsets[-1], mapped)
+
+
+def _reusable_sentences(
+    store: Dict, gold_to_new: np.ndarray, system_to_new: np.ndarray
+) -> np.ndarray:
+    """
+    Determines the stored gold sentences whose statistics are still valid: the
+    sentence is unchanged, as are the system sentences its system tokens come from
+    and their neighbours. Gold sentences which share a tree or a system sentence
+    are only reused together.
+
+    Args:
+        store (Dict): stored statistics, see ``score_parse_incremental``
+        gold_to_new (np.ndarray): ``match_sentences`` of the gold sentences
+        system_to_new (np.ndarray): ``match_sentences`` of the system sentences
+
+    Returns:
+        np.ndarray: mask of the reusable gold sentences of the store
+    """
+    bounds, system_offsets = store["bounds"], store["system_offsets"]
+    n_system = len(system_offsets) - 1
+    # system sentences holding the first and the last system token of every gold
+    # sentence, empty segments count as the sentence they would start
+    first = np.searchsorted(system_offsets, bounds[:-1], side="right") - 1
+    last = np.searchsorted(system_offsets, bounds[1:] - 1, side="right") - 1
+    last = np.where(bounds[1:] > bounds[:-1], last, first)
+    # changed system sentences up to and including every sentence
+    changed = np.concatenate([[0], np.cumsum(system_to_new < 0)])
+    lo, hi = np.clip(first - 1, 0, n_system), np.clip(last + 2, 0, n_system)
+    reusable = (gold_to_new >= 0) & (changed[hi] - changed[lo] == 0)
+
+    # a gold sentence continuing the tree of the previous one, or sharing a system
+    # tree with it, forms a unit with it
+    tree_starts = np.append(
+        system_offsets[:-1][store["system_tree_start"]], system_offsets[-1]
+    )
+    linked = ~store["gold_tree_start"][1:] | ~np.isin(bounds[1:-1], tree_starts)
+    unit = np.concatenate([[0], np.cumsum(~linked)])
+    invalid_units = np.unique(unit[~reusable])
+
+    return reusable & ~np.isin(unit, invalid_units)
+
+
+def score_parse_incremental(
+    system: Dict[str, np.ndarray],
+    gold: Dict[str, np.ndarray],
+    store_path: Union[str, Path],
+    groupings: List[str] = GROUPINGS,
+) -> Dict[str, pd.DataFrame]:
+    """
+    Scores a single parse like ``score_parse``, but only aligns and rescores the
+    gold sentences which changed since the statistics were last stored, together
+    with the system sentences their tokens come from. Changes are found by
+    matching the sentence hashes of system and gold standard with the stored
+    ones, before aligning anything. The statistics of all other sentences are
+    taken from the store.
+
+    Args:
+        system (Dict[str, np.ndarray]): parsed columns from ``read_conll_columns``
+        gold (Dict[str, np.ndarray]): gold columns from ``read_conll_columns``
+        store_path (Union[str, Path]): pickle file holding the statistics
+        groupings (List[str]): groupings to evaluate, subset of ``GROUPINGS``
+
+    Returns:
+        Dict[str, pd.DataFrame]: scores as returned by ``score_parse``
+    """
+    store_path = Path(store_path)
+    gold_hashes, system_hashes = sentence_hashes(gold), sentence_hashes(system)
+    gold_offsets, system_offsets = sentence_offsets(gold), sentence_offsets(system)
+    n_gold = len(gold_hashes)
+
+    store = None
+    if store_path.exists():
+        store = pd.read_pickle(store_path)
+        # stores of older versions kept per-sentence hashes of the alignment
+        if "gold_hashes" not in store or not set(groupings) <= set(store["groupings"]):
+            store = None
+
+    if store is None:
+        reused = np.zeros(n_gold, dtype=bool)
+        bounds = np.zeros(n_gold + 1, dtype=np.int64)
+        groups = attachment = removed = None
+    else:
+        gold_to_new = match_sentences(store["gold_hashes"], gold_hashes)
+        system_to_new = match_sentences(store["system_hashes"], system_hashes)
+        reusable = _reusable_sentences(store, gold_to_new, system_to_new)
+        reused = np.zeros(n_gold, dtype=bool)
+        reused[gold_to_new[reusable]] = True
+
+        # system token bounds of the reused gold sentences in the new parse
+        bounds = np.zeros(n_gold + 1, dtype=np.int64)
+        old_bounds = store["bounds"]
+        bounds[gold_to_new[reusable]] = _map_positions(
+            old_bounds[:-1][reusable],
+            store["system_offsets"],
+            system_offsets,
+            system_to_new,
+        )
+        ends = _map_positions(
+            old_bounds[1:][reusable],
+            store["system_offsets"],
+            system_offsets,
+            system_to_new,
+        )
+
+        # stored statistics of the reused sentences, renumbered, and of the
+        # sentences to rescore
+        renumber = np.where(reusable, gold_to_new, -1)
+        keep = [
+            renumber[stats["sentence"].to_numpy()] >= 0
+            for stats in [store["groups"], store["attachment"]]
+        ]
+        groups, attachment = [
+            stats.loc[k].assign(sentence=renumber[stats["sentence"].to_numpy()[k]])
+            for stats, k in zip([store["groups"], store["attachment"]], keep)
+        ]
+        removed = [
+            stats.loc[~k]
+            for stats, k in zip([store["groups"], store["attachment"]], keep)
+        ]
+
+    # runs of changed gold sentences and the system tokens between the reused ones
+    changed = np.flatnonzero(~reused)
+    if len(changed) > 0:
+        breaks = np.flatnonzero(np.diff(changed) > 1)
+        run_starts = changed[np.concatenate([[0], breaks + 1])]
+        run_ends = changed[np.concatenate([breaks, [len(changed) - 1]])] + 1
+        system_starts = np.zeros(len(run_starts), dtype=np.int64)
+        system_ends = np.full(len(run_starts), system_offsets[-1], dtype=np.int64)
+        if store is not None:
+            end_of = np.zeros(n_gold, dtype=np.int64)
+            end_of[gold_to_new[reusable]] = ends
+            system_starts = np.where(
+                run_starts > 0, end_of[np.maximum(run_starts - 1, 0)], 0
+            )
+            system_ends = np.where(
+                run_ends < n_gold,
+                bounds[np.minimum(run_ends, n_gold - 1)],
+                system_offsets[-1],
+            )
+
+        gold_index = _concat_ranges(gold_offsets[run_starts], gold_offsets[run_ends])
+        system_index = _concat_ranges(system_starts, system_ends)
+        system_lengths = system_ends - system_starts
+        sub_system, sub_gold = system, gold
+        if len(changed) < n_gold:
+            sub_system = {k: v[system_index] for k, v in system.items()}
+            sub_gold = {k: v[gold_index] for k, v in gold.items()}
+
+        alignment = align_parse(sub_system, sub_gold)
+        # system tokens stay with the gold sentences of their run
+        run = np.repeat(np.arange(len(run_starts)), system_lengths)
+        alignment["system_sentence"] = np.maximum(
+            alignment["system_sentence"], run_starts[run]
+        )
+        added = sentence_stats(sub_system, sub_gold, groupings, alignment=alignment)
+        groups = pd.concat([groups, added[0]], ignore_index=True)
+        attachment = pd.concat([attachment, added[1]], ignore_index=True)
+
+        # system token bounds of the changed gold sentences
+        sub_starts = np.concatenate([[0], np.cumsum(system_lengths)])
+        run_of = np.repeat(np.arange(len(run_starts)), run_ends - run_starts)
+        position = np.searchsorted(alignment["system_sentence"], changed)
+        bounds[changed] = system_starts[run_of] + position - sub_starts[run_of]
+    bounds[n_gold] = system_offsets[-1]
+    logging.info(f"Rescored {len(changed)} of {n_gold} sentences")
+
+    # the totals are updated by the changed sentences only
+    if store is None:
+        totals = stats_totals(groups, attachment)
+    elif len(changed) > 0:
+        totals = _update_totals(*store["totals"], removed, added)
+    else:
+        totals = store["totals"]
+
+    if store is None or len(changed) > 0:
+        store_path.parent.mkdir(parents=True, exist_ok=True)
+        pd.to_pickle(
+            {
+                "groupings": groupings,
+                "gold_hashes": gold_hashes,
+                "system_hashes": system_hashes,
+                "system_offsets": system_offsets,
+                "gold_tree_start": gold["id"][gold_offsets[:-1]] == 1,
+                "system_tree_start": system["id"][system_offsets[:-1]] == 1,
+                "bounds": bounds,
+                "groups": groups,
+                "attachment": attachment,
+                "totals": totals,
+            },
+            store_path,
+        )
+
+    return scores_from_totals(*totals, groupings)
+
+
+def score_all_parsers(
+    config: Box, parsers: List[str], groupings: List[str] = GROUPINGS
+) -> Dict[str, Dict[str, pd.DataFrame]]:
+    """
+    Scores all parsers against the gold standard, reading the gold standard once.
+    Parsers are scored concurrently on up to ``eval_workers`` workers. With
+    ``eval_incremental`` set in the config, the per-sentence statistics are kept in
+    ``eval_stats_path`` and only changed sentences are rescored.
+
+    Args:
+        config (Box): project config
+        parsers (List[str]): parsers under evaluation, keys of ``config.parse_files``
+        groupings (List[str]): groupings to evaluate, subset of ``GROUPINGS``
+
+    Returns:
+        Dict[str, Dict[str, pd.DataFrame]]: scores by parser and grouping
+    """
+    parse_files = config.parse_files.to_dict()
+    for parser in parsers:
+        assert (
+            parser in parse_files
+        ), f"Invalid parser name. Choose one of {list(parse_files)}"
+    gold = read_conll_columns(Path(config.gold_path).joinpath(config.files.gold_conll))
+
+    # one job per parser, gathered in the order of ``parsers``
+    with get_executor(config.eval_workers, config.eval_pool) as pool:
+        futures = [
+            pool.submit(_score_parser_job, config, parser, gold, groupings)
+            for parser in parsers
+        ]
+
+    return {parser: future.result() for parser, future in zip(parsers, futures)}
+
+
+def _score_parser_job(
+    config: Box, parser: str, gold: Dict[str, np.ndarray], groupings: List[str]
+) -> Dict[str, pd.DataFrame]:
+    """Scores a single parser for all groupings, as job for the worker pool"""
+    logging.info(f"Scoring {parser.upper()} parser")
+    with stage(f"scoring_{parser}") as metrics:
+        system = read_conll_columns(
+            Path(config.parse_path).joinpath(config.parse_files[parser])
+        )
+        metrics["tokens"] = len(system["id"])
+        metrics["sentences"] = len(np.unique(system["sentence"]))
+        if config.eval_incremental:
+            store_path = Path(config.eval_stats_path).joinpath(f"{parser}.pkl")
+            return score_parse_incremental(system, gold, store_path, groupings)
+
+        return score_parse(system, gold, groupings)
@@ -0,0 +1,388 @@
+"""
+Paired significance tests between parsers. Both tests resample the per-sentence
+sufficient statistics of the native scorer (see ``sentence_stats``), so that a
+resampled score is a matrix product of resampling weights and statistics instead
+of a rescoring of the parses:
+
+- paired bootstrap: sentences are drawn with replacement, giving confidence
+  intervals of every score and of the score differences
+- approximate randomization: the parses of both parsers are swapped per sentence
+  with probability 0.5, giving p-values under the null hypothesis that both
+  parsers perform the same
+"""
+
+import itertools
+import logging
+import numpy as np
+import pandas as pd
+from box import Box
+from pathlib import Path
+from typing import *
+from src.eval.score import read_conll_columns, sentence_stats
+from src.utils import stage
+
+# scores computed from the attachment statistics, as (numerator, denominator)
+ATTACHMENT_SCORES = {"UAS": ("head", "tokens"), "LAS": ("both", "tokens")}
+
+# upper bound of samples times sentences held in one index matrix (~32MB)
+MAX_BATCH_ELEMENTS = 2**22
+
+
+class SentenceStats(object):
+    """
+    Per-sentence statistics of a parse as dense matrices, with one row per gold
+    sentence
+
+    Args:
+        attachment (np.ndarray): number of tokens, correct heads and correct heads
+            and labels per sentence, shape (sentences, 3)
+        gold (np.ndarray): gold tokens per sentence and deprel
+        system (np.ndarray): system tokens per sentence and deprel
+        hits (np.ndarray): correctly labelled tokens per sentence and deprel
+    """
+
+    columns = ["tokens", "head", "both"]
+
+    def __init__(
+        self,
+        attachment: np.ndarray,
+        gold: np.ndarray,
+        system: np.ndarray,
+        hits: np.ndarray,
+    ):
+        self.attachment = attachment
+        self.gold = gold
+        self.system = system
+        self.hits = hits
+
+    @classmethod
+    def from_frames(
+        cls,
+        groups: pd.DataFrame,
+        attachment: pd.DataFrame,
+        n_sentences: int,
+        labels: List[str],
+    ) -> "SentenceStats":
+        """
+        Builds the matrices from the statistics returned by ``sentence_stats``
+
+        Args:
+            groups (pd.DataFrame): grouped counts by sentence
+            attachment (pd.DataFrame): attachment counts by sentence
+            n_sentences (int): number of gold sentences
+            labels (List[str]): deprels, i.e. the matrix columns
+
+        Returns:
+            SentenceStats: statistics of the parse
+        """
+        sentences = np.arange(n_sentences)
+        deprel = groups.loc[groups["by"] == "Deprel"]
+        counts = {
+            name: deprel.pivot_table(
+                index="sentence", columns="label", values=name, aggfunc="sum"
+            )
+            .reindex(index=sentences, columns=labels)
+            .fillna(0)
+            .to_numpy(dtype=np.float64)
+            for name in ["gold", "system", "hits"]
+        }
+        attachment = (
+            attachment.groupby("sentence")[cls.columns]
+            .sum()
+            .reindex(sentences)
+            .fillna(0)
+            .to_numpy(dtype=np.float64)
+        )
+
+        return cls(attachment, counts["gold"], counts["system"], counts["hits"])
+
+    def matrix(self) -> np.ndarray:
+        """All statistics side by side, shape (sentences, 3 + 3 * deprels)"""
+        return np.hstack([self.attachment, self.gold, self.system, self.hits])
+
+
+def scores_from_totals(totals: np.ndarray, n_labels: int) -> np.ndarray:
+    """
+    Computes UAS, LAS and the F1 of every deprel from summed statistics
+
+    Args:
+        totals (np.ndarray): statistics in the layout of ``SentenceStats.matrix``
+            summed over (resampled) sentences, shape (..., 3 + 3 * deprels)
+        n_labels (int): number of deprels
+
+    Returns:
+        np.ndarray: UAS, LAS and F1 per deprel, shape (..., 2 + deprels). Scores
+            without any gold or system tokens are NaN.
+    """
+    columns = SentenceStats.columns
+    start = len(columns)
+    gold = totals[..., start : start + n_labels]
+    system = totals[..., start + n_labels : start + 2 * n_labels]
+    hits = totals[..., start + 2 * n_labels :]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        attachment = [
+            totals[..., columns.index(numerator)] / totals[..., columns.index(total)]
+            for numerator, total in ATTACHMENT_SCORES.values()
+        ]
+        # harmonic mean of precision (hits / system) and recall (hits / gold)
+        f1 = 2 * hits / (gold + system)
+
+    return np.concatenate([np.stack(attachment, axis=-1), f1], axis=-1)
+
+
+def bootstrap_weights(
+    rng: np.random.Generator, n_samples: int, n_sentences: int
+) -> np.ndarray:
+    """
+    Draws bootstrap samples of sentences as an index matrix and counts how often
+    every sentence was drawn, so that resampled totals are ``weights @ stats``
+
+    Args:
+        rng (np.random.Generator): random number generator
+        n_samples (int): bootstrap samples
+        n_sentences (int): sentences per sample
+
+    Returns:
+        np.ndarray: draws per sample and sentence, shape (samples, sentences)
+    """
+    idx = rng.integers(0, n_sentences, size=(n_samples, n_sentences))
+    # offset every row so that a single bincount counts all samples at once
+    idx += np.arange(n_samples)[:, None] * n_sentences
+
+    return (
+        np.bincount(idx.ravel(), minlength=n_samples * n_sentences)
+        .reshape(n_samples, n_sentences)
+        .astype(np.float64)
+    )
+
+
+def paired_test(
+    stats_a: np.ndarray,
+    stats_b: np.ndarray,
+    n_labels: int,
+    n_samples: int = 10000,
+    batch_size: int = 1000,
+    confidence: float = 0.95,
+    seed: int = 0,
+) -> Dict[str, np.ndarray]:
+    """
+    Runs the paired bootstrap and approximate randomization tests between two
+    parses of the same gold sentences. Samples are drawn in batches of
+    ``batch_size``, fewer on large corpora, to bound the memory of the index
+    matrices by ``MAX_BATCH_ELEMENTS``.
+
+    Args:
+        stats_a (np.ndarray): ``SentenceStats.matrix`` of the first parse
+        stats_b (np.ndarray): ``SentenceStats.matrix`` of the second parse
+        n_labels (int): number of deprels
+        n_samples (int): bootstrap samples and randomization rounds
+        batch_size (int): samples drawn at once
+        confidence (float): level of the confidence intervals
+        seed (int): seed of the random number generator
+
+    Returns:
+        Dict[str, np.ndarray]: arrays with one entry per score (UAS, LAS, F1 per
+            deprel)
+
+            - ``score_a``, ``score_b``, ``delta``: scores on the full corpus and
+              their difference (b - a)
+            - ``{name}_low``, ``{name}_high``: bootstrap confidence interval of
+              ``score_a``, ``score_b`` and ``delta``
+            - ``p_bootstrap``: two-sided p-value of the paired bootstrap
+            - ``p_randomization``: two-sided p-value of approximate randomization
+    """
+    rng = np.random.default_rng(seed)
+    n_sentences = stats_a.shape[0]
+    total_a, total_b = stats_a.sum(axis=0), stats_b.sum(axis=0)
+    observed_a = scores_from_totals(total_a, n_labels)
+    observed_b = scores_from_totals(total_b, n_labels)
+    observed = observed_b - observed_a
+    swap_diff = stats_b - stats_a
+    batch_size = max(1, min(batch_size, MAX_BATCH_ELEMENTS // max(n_sentences, 1)))
+
+    samples = {"score_a": [], "score_b": [], "delta": []}
+    exceed_bootstrap = np.zeros_like(observed)
+    exceed_randomization = np.zeros_like(observed)
+    for start in range(0, n_samples, batch_size):
+        size = min(batch_size, n_samples - start)
+
+        weights = bootstrap_weights(rng, size, n_sentences)
+        boot_a = scores_from_totals(weights @ stats_a, n_labels)
+        boot_b = scores_from_totals(weights @ stats_b, n_labels)
+        samples["score_a"].append(boot_a)
+        samples["score_b"].append(boot_b)
+        samples["delta"].append(boot_b - boot_a)
+        # the bootstrap distribution shifted to the null hypothesis of no difference
+        exceed_bootstrap += (
+            np.abs(boot_b - boot_a - observed) >= np.abs(observed)
+        ).sum(axis=0)
+
+        # sentences whose parses are swapped between both parsers
+        swaps = rng.integers(0, 2, size=(size, n_sentences)).astype(np.float64)
+        moved = swaps @ swap_diff
+        shuffled = scores_from_totals(total_b - moved, n_labels) - scores_from_totals(
+            total_a + moved, n_labels
+        )
+        exceed_randomization += (np.abs(shuffled) >= np.abs(observed)).sum(axis=0)
+
+    alpha = (1 - confidence) / 2
+    result = {
+        "score_a": observed_a,
+        "score_b": observed_b,
+        "delta": observed,
+        "p_bootstrap": (exceed_bootstrap + 1) / (n_samples + 1),
+        "p_randomization": (exceed_randomization + 1) / (n_samples + 1),
+    }
+    for name, values in samples.items():
+        # scores undefined on the full corpus have no interval
+        defined = ~np.isnan(result[name])
+        bounds = np.full((2, len(defined)), np.nan)
+        bounds[:, defined] = np.nanquantile(
+            np.concatenate(values)[:, defined], [alpha, 1 - alpha], axis=0
+        )
+        result[f"{name}_low"], result[f"{name}_high"] = bounds
+
+    # scores undefined on the full corpus have no test
+    undefined = np.isnan(observed)
+    for name in ["p_bootstrap", "p_randomization"]:
+        result[name][undefined] = np.nan
+
+    return result
+
+
+def parser_stats(
+    config: Box, parsers: List[str], gold: Dict[str, np.ndarray]
+) -> Tuple[Dict[str, np.ndarray], List[str]]:
+    """
+    Collects the per-sentence statistics of every parser. With the incremental
+    native scorer the statistics stored by the last evaluation are reused,
+    otherwise they are computed.
+
+    Args:
+        config (Box): project config
+        parsers (List[str]): parsers under evaluation, keys of ``config.parse_files``
+        gold (Dict[str, np.ndarray]): gold columns from ``read_conll_columns``
+
+    Returns:
+        Tuple[Dict[str, np.ndarray], List[str]]: ``SentenceStats.matrix`` by parser
+            and the deprels of the matrix columns
+    """
+    n_sentences = int(gold["sentence"][-1]) + 1 if len(gold["id"]) > 0 else 0
+    use_store = (
+        config.get("eval_backend", "native") == "native" and config.eval_incremental
+    )
+
+    frames = {}
+    for parser in parsers:
+        store_path = Path(config.eval_stats_path).joinpath(f"{parser}.pkl")
+        if use_store and store_path.exists():
+            store = pd.read_pickle(store_path)
+            frames[parser] = (store["groups"], store["attachment"])
+            continue
+        system = read_conll_columns(
+            Path(config.parse_path).joinpath(config.parse_files[parser])
+        )
+        frames[parser] = sentence_stats(system, gold, ["Deprel"])
+
+    labels = sorted(
+        set(gold["deprel"]).union(
+            *[
+                groups.loc[groups["by"] == "Deprel", "label"]
+                for groups, _ in frames.values()
+            ]
+        )
+    )
+    stats = {
+        parser: SentenceStats.from_frames(
+            groups, attachment, n_sentences, labels
+        ).matrix()
+        for parser, (groups, attachment) in frames.items()
+    }
+
+    return stats, labels
+
+
+def compare_parsers(
+    config: Box, parsers: List[str], gold: Dict[str, np.ndarray]
+) -> pd.DataFrame:
+    """
+    Runs ``paired_test`` for every pair of parsers with the settings of
+    ``config.significance``
+
+    Args:
+        config (Box): project config
+        parsers (List[str]): parsers under evaluation
+        gold (Dict[str, np.ndarray]): gold columns from ``read_conll_columns``
+
+    Returns:
+        pd.DataFrame: one row per parser pair and score (``UAS``, ``LAS`` or the
+            F1 of a deprel) with the scores, their difference, confidence
+            intervals and p-values
+    """
+    settings = config.significance
+    stats, labels = parser_stats(config, parsers, gold)
+    metrics = list(ATTACHMENT_SCORES) + ["F1"] * len(labels)
+    groups = [""] * len(ATTACHMENT_SCORES) + labels
+
+    tables = []
+    for parser_a, parser_b in itertools.combinations(parsers, 2):
+        logging.info(
+            f"Testing {parser_a.upper()} against {parser_b.upper()} "
+            f"on {settings.samples} samples"
+        )
+        result = paired_test(
+            stats[parser_a],
+            stats[parser_b],
+            len(labels),
+            n_samples=settings.samples,
+            batch_size=settings.batch_size,
+            confidence=settings.confidence,
+            seed=settings.seed,
+        )
+        tables.append(
+            pd.DataFrame(
+                {
+                    "parser_a": parser_a,
+                    "parser_b": parser_b,
+                    "metric": metrics,
+                    "Deprel": groups,
+                    **result,
+                }
+            )
+        )
+
+    table = pd.concat(tables, ignore_index=True)
+    scores = ["score_a", "score_b", "delta"]
+    table = table[
+        ["parser_a", "parser_b", "metric", "Deprel"]
+        + [f"{s}{suffix}" for s in scores for suffix in ["", "_low", "_high"]]
+        + ["p_bootstrap", "p_randomization"]
+    ]
+    # deprels which neither parser nor the gold standard use in this pair
+    table = table.dropna(subset=["score_a", "score_b"], how="all")
+
+    return table
+
+
+def significance(config: Box, parsers: List[str]) -> pd.DataFrame:
+    """
+    Tests the differences between all parsers for significance and writes the
+    results to ``significance_eval.csv`` in ``config.eval_path``
+
+    Args:
+        config (Box): project config
+        parsers (List[str]): parsers under evaluation
+
+    Returns:
+        pd.DataFrame: output of ``compare_parsers``
+    """
+    gold = read_conll_columns(Path(config.gold_path).joinpath(config.files.gold_conll))
+    with stage("significance") as metrics:
+        metrics["sentences"] = int(len(np.unique(gold["sentence"])))
+        table = compare_parsers(config, parsers, gold)
+
+    path = Path(config.eval_path).joinpath("significance_eval.csv")
+    logging.info(f"Writing parser significance tests to {path}")
+    table.round(4).to_csv(path, index=False)
+
+    return table
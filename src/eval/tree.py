@@ -21,11 +21,10 @@ def treeview(config: Box) -> None:
 
 def evaluate_all_samples(config: Box, parser: str):
     """
-    Function launches the treeviewer for all samples but sample 22.
-    Sample 22 cannot be evaluated since all parsers conduct faulty sentence
-    boundary detection, meaning that they treat the second sentence in sample 22
-    as a seperate sentence, while the index count should continue due to cross-sentence
-    dependencies.
+    Function launches the treeviewer for all samples. Since the parsers split
+    sample 22 into sentences differently from the gold standard (whose index count
+    continues across its two sentences due to cross-sentence dependencies), the
+    parse is first projected onto the sentence boundaries of the gold standard.
 
 
     Args:
@@ -35,17 +34,20 @@ def evaluate_all_samples(config: Box, parser: str):
     Returns:
         None, but launches the MaltEval TreeViewer
     """
+    # imported on use, so that importing the viewer does not load pandas and numpy
+    from src.align import project_files
+
     valid_parsers = config.parse_files.to_dict().keys()
     assert parser in valid_parsers, f"Invalid parser, select one of {valid_parser}"
 
     parse_file = Path(config.parse_path).joinpath(config.parse_files[parser])
     gs_path = Path(config.gold_path).joinpath(config.files.gold_conll)
 
-    # remove last two sentences due to sentence boundary inconsistency (does not work in MatlEval otherwise)
-    eval_file_final = _remove_last_two_sents(parse_file)
-    gs_file_final = _remove_last_two_sents(gs_path)
+    # MaltEval requires parse and gold standard to agree on sentence boundaries
+    eval_file_final, gs_file_final = project_files(
+        parse_file, gs_path, config.treebank_path, parser
+    )
 
-    # Run MaltEval on all but last sentence
     bash_command = (
         f"java -jar malteval_dist_20141005/lib/MaltEval.jar "
         f"-s {eval_file_final} "
@@ -67,6 +69,8 @@ def evaluate_single_sample(config: Box, parser: str, sample_no: int) -> None:
     Returns:
         None
     """
+    from src.align import project_to_gold
+    from src.treebank import load_treebank
 
     valid_parsers = config.parse_files.to_dict().keys()
     assert parser in valid_parsers, f"Invdalid parser, select one of {valid_parser}"
@@ -75,14 +79,18 @@ def evaluate_single_sample(config: Box, parser: str, sample_no: int) -> None:
         sample_no in SAMPLES
     ), f"Invalid sample number selected. Valid numbers; {SAMPLES}"
 
-    sample_path = Path(config.parse_path).joinpath(config.parse_files[parser]).parent
-    if parser in ["nn", "pcfg"]:
-        filename = f"sample_{sample_no}.txt.conll"
-    else:
-        filename = f"sample_{sample_no}.conll"
-    sample_path = sample_path.joinpath(filename)
-
-    gs_path = Path(config.gold_path).joinpath(f"sample_{sample_no}.conll")
+    # slice the sample out of the compiled treebanks instead of re-reading the files
+    idx = SAMPLES.index(sample_no)
+    sample_path = Path(config.treebank_path).joinpath(
+        f"{parser}_sample_{sample_no}.conll"
+    )
+    gs_path = Path(config.treebank_path).joinpath(f"gold_sample_{sample_no}.conll")
+    sample, gold_sample = project_to_gold(
+        load_treebank(config, parser).sample(idx),
+        load_treebank(config, "gold").sample(idx),
+    )
+    sample.to_conll(sample_path)
+    gold_sample.to_conll(gs_path)
 
     bash_command = (
         f"java -jar malteval_dist_20141005/lib/MaltEval.jar "
@@ -95,27 +103,6 @@ def evaluate_single_sample(config: Box, parser: str, sample_no: int) -> None:
     return None
 
 
-def _remove_last_two_sents(filepath: Union[str, Path]) -> None:
-
-    with open(filepath, "r") as f:
-        parsed = f.read()
-
-    split_parsed = parsed.split("\n\n")
-    parsed_removed = split_parsed[:11]
-    parsed_removed = "\n\n".join(parsed_removed)
-
-    # save as new up file in directory
-    updated_file = filepath.parts[-1].split(".")
-    updated_file[0] += "_eval"
-    updated_file = ".".join(updated_file)
-    write_path = filepath.parent.joinpath(updated_file)
-
-    with open(write_path, "w") as f:
-        f.write(parsed_removed)
-
-    return write_path
-
-
 if __name__ == "__main__":
     config = read_config("config.yml")
 
@@ -1,7 +1,7 @@
 from typing import *
 from pathlib import Path
 import click
-from src import *
+from src.utils import read_config, run_pipeline
 import logging
 from box import Box
 import yaml
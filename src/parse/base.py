@@ -1,20 +1,178 @@
 from abc import abstractmethod
-import stanza
 from src.utils import *
 from pathlib import Path
-from stanza.utils.conll import CoNLL
+from src.parse.server import (
+    get_server,
+    stop_servers,
+    read_props,
+    join_documents,
+    split_documents,
+)
+from src.parse.cache import ParseCache
+from src.runner import run_command
+from src.conll import (
+    read_sentences,
+    format_sentence,
+    convert_file,
+    count_tokens,
+    write_text,
+    Sentence,
+)
+from functools import lru_cache
 import os
+import re
+import tempfile
 import logging
 
 
+@lru_cache(maxsize=None)
+def get_stanza_pipeline(tokenize_batch_size: int, pos_batch_size: int):
+    """
+    Returns the shared Stanza tokenize/POS pipeline, which is only created (and its
+    models loaded) on first use
+
+    Args:
+        tokenize_batch_size (int): tokenizer batch size
+        pos_batch_size (int): POS tagger batch size
+
+    Returns:
+        stanza.Pipeline: cached pipeline
+    """
+    # imported here since stanza (and torch) take seconds to import
+    import stanza
+
+    logging.info("Loading Stanza tokenize/POS pipeline")
+    with stage("model_load"):
+        return stanza.Pipeline(
+            lang="en",
+            processors="tokenize,pos",
+            tokenize_batch_size=tokenize_batch_size,
+            pos_batch_size=pos_batch_size,
+        )
+
+
+# whitespace after sentence-final punctuation (and a closing quote or bracket)
+# followed by the start of a new sentence, a cheap approximation of the parsers'
+# own sentence splitting
+SENTENCE_END = re.compile(r"(?:(?<=[.!?])|(?<=[.!?][\"')\]]))\s+(?=[\"'(\[]?[A-Z0-9])")
+
+
+def sentence_spans(document: str) -> List[Tuple[int, int]]:
+    """
+    Finds the start and end character of every sentence of a document, see
+    ``SENTENCE_END``
+    """
+    matches = list(SENTENCE_END.finditer(document))
+    starts = [0] + [m.end() for m in matches]
+    ends = [m.start() for m in matches] + [len(document)]
+
+    return list(zip(starts, ends))
+
+
+def split_sentences(document: str) -> List[str]:
+    """
+    Splits a document into sentences at sentence-final punctuation, see
+    ``SENTENCE_END``
+    """
+    sentences = [document[start:end].strip() for start, end in sentence_spans(document)]
+
+    return [s for s in sentences if s != ""]
+
+
+def sentence_length(sentence: str) -> int:
+    """
+    Approximates the number of tokens of a sentence by its words and punctuation
+    """
+    return len(re.findall(r"\w+|[^\w\s]", sentence))
+
+
+def shard_documents(
+    documents: List[str], shard_tokens: int
+) -> List[List[Tuple[int, str]]]:
+    """
+    Cuts documents into shards of about ``shard_tokens`` tokens at sentence
+    boundaries, so that long documents are spread over several shards and short
+    ones share a shard
+
+    Args:
+        documents (List[str]): document texts
+        shard_tokens (int): token budget of a shard, a single longer sentence
+            makes a shard of its own
+
+    Returns:
+        List[List[Tuple[int, str]]]: pieces of every shard, i.e. the number of the
+            document and the text of its consecutive sentences in the shard
+    """
+    shards, shard, size = [], [], 0
+    for number, document in enumerate(documents):
+        start = end = None
+        for span_start, span_end in sentence_spans(document):
+            length = sentence_length(document[span_start:span_end])
+            if size > 0 and size + length > shard_tokens:
+                if start is not None:
+                    shard.append((number, document[start:end]))
+                    start = None
+                shards.append(shard)
+                shard, size = [], 0
+            if start is None:
+                start = span_start
+            end = span_end
+            size += length
+        shard.append((number, document[start:end]))
+    if len(shard) > 0:
+        shards.append(shard)
+
+    return shards
+
+
+def stanza_identifiers() -> List[str]:
+    """
+    Identifies the Stanza version and the English tokenize/POS models (by name,
+    size and modification time) without importing stanza, so that the parse cache
+    of the MALT parser is invalidated when the preprocessing changes
+
+    Returns:
+        List[str]: identifiers of the Stanza version and model files
+    """
+    from importlib.metadata import version, PackageNotFoundError
+
+    try:
+        identifiers = [f"stanza=={version('stanza')}"]
+    except PackageNotFoundError:
+        identifiers = ["stanza"]
+
+    resources = Path(
+        os.environ.get("STANZA_RESOURCES_DIR", Path.home().joinpath("stanza_resources"))
+    )
+    models = [resources.joinpath("resources.json")] + sorted(
+        resources.glob("en/*/*.pt")
+    )
+    for path in models:
+        if path.exists():
+            stat = path.stat()
+            identifiers.append(
+                f"{path.relative_to(resources)}:{stat.st_size}:{stat.st_mtime_ns}"
+            )
+
+    return identifiers
+
+
 class BaseParse(object):
     """
     Base class defining the structure of all parsers used in this project
     """
 
-    def __init__(self, config: Box):
+    # parser name as used for the keys of ``parse_files`` in the config
+    name = None
+    # CoreNLP properties file of the parser, if any
+    props = None
+
+    def __init__(self, config: Box, shard: int = None):
         self.config = config
         self.timer = Timer()
+        # number of the shard parsed by this instance, see ``_sharded_parse``
+        self.shard = shard
+        self._cache = None
 
     @abstractmethod
     def run(self):
@@ -28,41 +186,181 @@ class BaseParse(object):
     def _post_process(self) -> None:
         pass
 
-    def _fix_sentence_split(self, conllu_path: Union[Path, str]) -> None:
+    @abstractmethod
+    def _parse_documents(self, documents: List[str]) -> List[str]:
+        """
+        Parses a list of documents, returning the CoNLL output of every document
         """
-        Quickfix to avoid splitting last quotation mark. Since the NN parser assigns a new index to the sentence
-        spanning the quote, we assign the preceding sentence ending as the head.
+        pass
+
+    def _dependencies(self) -> List[str]:
+        """
+        Identifies inputs of the parse besides the model and properties file,
+        which invalidate the parse cache when they change
+        """
+        return []
+
+    @property
+    def cache(self) -> ParseCache:
+        """Parse cache of the parser, created on first use"""
+        if self._cache is None:
+            self._cache = ParseCache(
+                self.config, self.name, self.props, self._dependencies()
+            )
+
+        return self._cache
+
+    def _cached_parse(self, documents: List[str], evict: bool = True) -> List[str]:
+        """
+        Parses the documents, reusing cached outputs for documents which were parsed
+        with the same parser, model and properties before. Only cache misses are
+        passed to ``_parse_documents``.
 
-        Note that this post-processing is required to evaluate the file using MaltParse
         Args:
-            conllu_path (str): path to full parsed samples in conll-u format
+            documents (List[str]): document texts
+            evict (bool): evict least recently used entries after storing the new
+                outputs, latency-sensitive callers evict in the background instead
 
         Returns:
-            None
+            List[str]: CoNLL output of every document, in input order
+        """
+        if not self.config.cache.enabled:
+            return self._parse_documents(documents)
+
+        with stage("cache"):
+            outputs = [self.cache.get(d) for d in documents]
+        missing = [i for i, output in enumerate(outputs) if output is None]
+        logging.info(
+            f"Parse cache: {len(documents) - len(missing)} hits, {len(missing)} misses"
+        )
+
+        if len(missing) > 0:
+            parsed = self._parse_documents([documents[i] for i in missing])
+            for i, output in zip(missing, parsed):
+                self.cache.put(documents[i], output)
+                outputs[i] = output
+            if evict:
+                self.cache.evict()
+
+        return outputs
+
+    def _sharded_parse(self, documents: List[str]) -> List[str]:
         """
-        logging.info(f"Fixing apostrophe parse error in file: {conllu_path}")
+        Cuts the documents into shards of about ``sharding.shard_tokens`` tokens at
+        sentence boundaries (see ``shard_documents``) and parses the shards on up
+        to ``sharding.workers`` processes, each running its own instance of the
+        parser. The outputs of the pieces of every document are re-assembled in
+        input order.
 
-        with open(conllu_path, "r") as f:
-            conll = f.read()
-        # temporarily split string
-        conll_split = conll.split("\n")
+        Args:
+            documents (List[str]): document texts
 
-        # take last element and split
-        last_elem = conll_split[-1].split("\t")
-        last_elem[0] = "11"
-        last_elem[6] = "10"
-        last_elem[7] = "punct"
-        last_elem = "\t".join(last_elem)
+        Returns:
+            List[str]: CoNLL output of every document, in input order
+        """
+        workers = self.config.sharding.workers
+        if workers <= 1:
+            return self._cached_parse(documents)
+        shards = shard_documents(documents, self.config.sharding.shard_tokens)
+        if len(shards) <= 1:
+            return self._cached_parse(documents)
+
+        logging.info(
+            f"Parsing {len(documents)} documents in {len(shards)} shards "
+            f"on {workers} processes"
+        )
+        if self.props is not None and self.config.corenlp.backend == "server":
+            # started once here, the shards reuse it without owning it
+            get_server(self.config)
+        with get_executor(workers, "process") as pool:
+            futures = [
+                pool.submit(
+                    _parse_shard,
+                    type(self),
+                    self.config,
+                    idx,
+                    [text for _, text in shard],
+                )
+                for idx, shard in enumerate(shards)
+            ]
+
+        # outputs of the pieces of every document, joined once at the end
+        pieces = [[] for _ in documents]
+        for shard, future in zip(shards, futures):
+            shard_outputs, metrics = future.result()
+            for (number, _), output in zip(shard, shard_outputs):
+                pieces[number].append(output)
+            record_metrics(metrics)
+
+        return ["".join(p) for p in pieces]
+
+    def _read_documents(self) -> List[str]:
+        """
+        Reads the raw samples, which are separated by blank lines in the raw file
+        """
+        with open(
+            Path(self.config.data_path).joinpath(self.config.files.raw_samples), "r"
+        ) as f:
+            raw = f.read()
 
-        # remove space
-        conll_split.pop(-2)
-        conll_split[-1] = last_elem
-        conll_fixed = "\n".join(conll_split)
+        return [d.strip() for d in raw.split("\n\n") if d.strip() != ""]
 
-        with open(conllu_path, "w") as f:
-            f.write(conll_fixed)
+    def _parse_with_corenlp(self, documents: List[str]) -> List[str]:
+        """
+        Parses documents with CoreNLP using the properties of the parser. With the
+        ``server`` backend the documents are sent to the shared CoreNLP server in
+        batches of ``corenlp.batch_size``, otherwise a single CoreNLP pipeline is
+        run on all documents joined into one input file.
 
-        return None
+        Args:
+            documents (List[str]): document texts
+
+        Returns:
+            List[str]: CoNLL output of every document, in input order
+        """
+        if len(documents) == 0:
+            return []
+
+        if self.config.corenlp.backend == "server":
+            properties = read_props(self.props)
+            properties["outputFormat"] = "conll"
+            return get_server(self.config).annotate_documents(documents, properties)
+
+        # batch files of their own per call, since shards, pipeline steps and API
+        # calls may parse concurrently
+        with tempfile.TemporaryDirectory(prefix=f"{self.name}_batch_") as tmp_dir:
+            batch_input = Path(tmp_dir).joinpath("batch.txt")
+            with open(batch_input, "w") as f:
+                f.write(join_documents(documents))
+
+            command = [
+                "java",
+                "-cp",
+                "*",
+                "edu.stanford.nlp.pipeline.StanfordCoreNLP",
+                "-props",
+                str(Path(self.props).resolve()),
+                "-file",
+                str(batch_input.resolve()),
+                "-outputDirectory",
+                str(Path(tmp_dir).resolve()),
+            ]
+            # JVM startup, model loading and parsing all happen in the one process
+            with stage("jvm"):
+                run_command(
+                    command,
+                    cwd=self.config.corenlp.path,
+                    timeout=self.config.runner.timeout,
+                )
+
+            batch_output = Path(tmp_dir).joinpath(f"{batch_input.name}.conll")
+            with open(batch_output, "r") as f:
+                outputs = split_documents(f.read())
+        assert len(outputs) == len(
+            documents
+        ), f"CoreNLP returned {len(outputs)} documents, expected {len(documents)}"
+
+        return outputs
 
     def _conll_to_conllu(self, conll_path: str) -> None:
         """
@@ -84,46 +382,67 @@ class BaseParse(object):
 
 
         """
-        # with open(Path(self.config.data_path).joinpath(self.config.files.raw_samples), "r") as f:
-        #     sentence = f.read()
-        with open(conll_path, "r") as f:
-            conll = f.read().split("\n")
+        # write to file
+        target_file = Path(conll_path).name
+        # Note that the file extension still needs to be .conll for malteval to recognize the files from the directory
+        target_path = Path(conll_path).parents[1].joinpath(f"conllu/{target_file}")
+        with stage("conversion") as metrics:
+            metrics["sentences"] = convert_file(
+                conll_path, target_path, _corenlp_to_conllu
+            )
 
-        # conll_split
-        cs = [token.split("\t") for token in conll]
 
-        conllu_str = ""
+def _corenlp_to_conllu(w: List[str]) -> List[str]:
+    """
+    Converts the columns of a single token from the CoreNLP CoNLL output to CoNLL-U
+    """
+    # replace "ROOT" with "root" (for consistency with other format)
+    if w[6] == "ROOT":
+        w[6] = "root"
 
-        for w in cs:
-            # handle extra newlines (to ensure sentence boundaries are transferred)
-            if len(w) == 1:
-                conllu_str += "\n"
-                continue
+    return [w[0], w[1], w[2], "_", w[3], "_", w[5], w[6], w[4], "_"]
 
-            # replace "ROOT" with "root" (for consistency with other format)
-            if w[6] == "ROOT":
-                w[6] = "root"
 
-            conllu_line = (
-                f"{w[0]}\t{w[1]}\t{w[2]}\t_\t{w[3]}\t_\t{w[5]}\t{w[6]}\t{w[4]}\t_\n"
-            )
-            conllu_str += conllu_line
+def _document_sentences(parser: BaseParse, output: str) -> List[Sentence]:
+    """
+    Splits the output of a parser for a single document into CoNLL-U sentences
+    """
+    sentences = [
+        [line.split("\t") for line in block.split("\n") if line.strip() != ""]
+        for block in output.strip("\n").split("\n\n")
+        if block.strip() != ""
+    ]
+    if parser.props is not None:
+        # CoreNLP CoNLL output, MaltParser already writes CoNLL-U
+        sentences = [[_corenlp_to_conllu(row) for row in s] for s in sentences]
 
-        # strip trailing whitespace
-        conllu_str = conllu_str.rstrip()
+    return sentences
 
-        # write to file
-        target_file = Path(conll_path).name
-        # Note that the file extension still needs to be .conll for malteval to recognize the files from the directory
-        target_path = Path(conll_path).parents[1].joinpath(f"conllu/{target_file}")
-        with open(target_path, "w") as f:
-            f.write(conllu_str)
+
+def _parse_shard(
+    parser_cls: type, config: Box, shard: int, documents: List[str]
+) -> Tuple[List[str], List[Dict]]:
+    """
+    Parses a single shard in a worker process, see ``BaseParse._sharded_parse``.
+    Returns the outputs together with the metrics recorded in the worker.
+    """
+    try:
+        outputs = parser_cls(config, shard)._cached_parse(documents)
+    finally:
+        stop_servers()
+
+    return outputs, collect_metrics()
 
 
 class Malt(BaseParse):
-    def __init__(self, config):
-        super().__init__(config)
-        self.preprocess()
+    name = "malt"
+
+    def __init__(self, config, shard=None):
+        super().__init__(config, shard)
+
+    def _dependencies(self) -> List[str]:
+        # the documents are tokenized and POS-tagged by Stanza before parsing
+        return stanza_identifiers()
 
     def run(self):
         """
@@ -131,63 +450,164 @@ class Malt(BaseParse):
         """
         logging.info("Running MALT system")
         start = self.timer.start()
-        self.preprocess()
         self.parse()
-        self.postprocess()
 
         logging.info(f"Total system Runtime: {self.timer.stop()}")
 
     def parse(self):
+        """
+        Parses the raw samples, taking unchanged samples from the parse cache, and
+        writes the parse (already in CoNLL-U) to ``parse_files.malt``
+        """
         logging.info(f"Parsing...")
-        time = Timer()
-        start = time.start()
-        os.chdir("maltparser-1.9.2")
-
-        bash_command = """
-        for i in 1 2 5 7 10 17 19 20 21 22
-        do
-            java -Xmx1024m -jar maltparser-1.9.2.jar -if conllx -c engmalt.linear-1.7.mco -i ../data/raw/sample_${i}.conll -o ../data/parses/malt/sample_${i}.conll -m parse -a nivreeager -l libsvm
-        done
-        """
-        subprocess.check_output(bash_command, shell=True)
-        logging.info(f"Parse time: {time.stop()}")
-        os.chdir("../")
-
-    def preprocess(self) -> None:
-        stanford_preprocessing = stanza.Pipeline(lang="en", processors="tokenize,pos")
-
-        for i in SAMPLES:
-            with open(
-                Path(self.config.data_path).joinpath(f"sample_{i}.txt"), "r"
-            ) as f:
-                sample = f.read()
-                doc = stanford_preprocessing(sample)
-            conll_text = CoNLL.doc2conll_text(doc)
-            # strip trailing whitespace/newlines
-            conll_text = conll_text.rstrip()
-
-            with open(
-                Path(self.config.data_path).joinpath(f"sample_{i}.conll"), "w"
-            ) as f:
-                f.write(conll_text)
-
-        return None
-
-    def postprocess(self) -> None:
-        # concatenate MALT samples
-        all_samples = ""
-        for i in SAMPLES:
-            with open(f"data/parses/malt/sample_{i}.conll", "r") as f:
-                sample = f.read()
-            all_samples += sample
-
-        with open(f"data/parses/malt/selected_samples.conll", "w") as f:
-            f.write(all_samples)
+
+        with stage("parse") as metrics:
+            outputs = self._sharded_parse(self._read_documents())
+            metrics["tokens"], metrics["sentences"] = count_tokens("".join(outputs))
+        write_text(
+            "".join(outputs),
+            Path(self.config.parse_path).joinpath(self.config.parse_files.malt),
+        )
+
+        logging.info(f"Parse time: {metrics['wall_time']}")
+
+    def _parse_documents(self, documents: List[str]) -> List[str]:
+        """
+        Parses all documents in a single MaltParser run, so that the JVM starts and
+        the model loads once. The preprocessed documents are concatenated into one
+        CoNLL stream and the parsed output is split back per document afterwards.
+        """
+        if len(documents) == 0:
+            return []
+
+        conll_docs = self.preprocess(documents)
+        # batch files of their own per call, since shards, pipeline steps and API
+        # calls may parse concurrently
+        with tempfile.TemporaryDirectory(prefix="malt_batch_") as tmp_dir:
+            batch_input = Path(tmp_dir).joinpath("input.conll")
+            batch_output = Path(tmp_dir).joinpath("output.conll")
+            sentence_counts = self._write_batch_input(conll_docs, batch_input)
+
+            # absolute paths, since MaltParser runs inside its own directory
+            command = [
+                "java",
+                "-Xmx1024m",
+                "-jar",
+                "maltparser-1.9.2.jar",
+                "-if",
+                "conllx",
+                "-c",
+                "engmalt.linear-1.7.mco",
+                "-i",
+                str(batch_input.resolve()),
+                "-o",
+                str(batch_output.resolve()),
+                "-m",
+                "parse",
+                "-a",
+                "nivreeager",
+                "-l",
+                "libsvm",
+            ]
+            # JVM startup, model loading and parsing all happen in the one process
+            with stage("jvm"):
+                run_command(
+                    command, cwd="maltparser-1.9.2", timeout=self.config.runner.timeout
+                )
+
+            return self._split_batch_output(batch_output, sentence_counts)
+
+    def _write_batch_input(
+        self, conll_docs: List[str], batch_path: Union[Path, str]
+    ) -> List[int]:
+        """
+        Concatenates the preprocessed documents into a single CoNLL file
+
+        Args:
+            conll_docs (List[str]): preprocessed documents in CoNLL format
+            batch_path (str): path of the concatenated input file
+
+        Returns:
+            List[int]: number of sentences of every document
+        """
+        sentence_counts = []
+        with open(batch_path, "w") as batch:
+            for conll in conll_docs:
+                sentences = [s for s in conll.split("\n\n") if s.strip() != ""]
+                sentence_counts.append(len(sentences))
+                for sentence in sentences:
+                    batch.write(sentence.strip("\n") + "\n\n")
+
+        return sentence_counts
+
+    def _split_batch_output(
+        self, batch_path: Union[Path, str], sentence_counts: List[int]
+    ) -> List[str]:
+        """
+        Splits the parsed batch back into the single documents
+
+        Args:
+            batch_path (str): path of the parsed batch file
+            sentence_counts (List[int]): number of sentences of every document, as
+                returned by ``_write_batch_input``
+
+        Returns:
+            List[str]: CoNLL output of every document, every sentence followed by a
+                blank line
+        """
+        sentences = [format_sentence(s) for s in read_sentences(batch_path)]
+        assert len(sentences) == sum(sentence_counts), (
+            f"MaltParser returned {len(sentences)} sentences, "
+            f"expected {sum(sentence_counts)}"
+        )
+
+        outputs = []
+        offset = 0
+        for count in sentence_counts:
+            outputs.append("".join(sentences[offset : offset + count]))
+            offset += count
+
+        return outputs
+
+    def preprocess(self, documents: List[str]) -> List[str]:
+        """
+        Tokenizes and POS-tags documents with the shared Stanza pipeline, passing
+        ``stanza.doc_batch_size`` documents at a time through Stanza's bulk API
+
+        Args:
+            documents (List[str]): raw document texts
+
+        Returns:
+            List[str]: preprocessed documents in CoNLL format
+        """
+        import stanza
+        from stanza.utils.conll import CoNLL
+
+        stanford_preprocessing = get_stanza_pipeline(
+            self.config.stanza.tokenize_batch_size, self.config.stanza.pos_batch_size
+        )
+
+        batch_size = self.config.stanza.doc_batch_size
+        docs = []
+        with stage("preprocess") as metrics:
+            for b in range(0, len(documents), batch_size):
+                in_docs = [
+                    stanza.Document([], text=t) for t in documents[b : b + batch_size]
+                ]
+                docs += stanford_preprocessing.bulk_process(in_docs)
+            metrics["sentences"] = sum([len(doc.sentences) for doc in docs])
+            metrics["tokens"] = sum([doc.num_tokens for doc in docs])
+
+        # strip trailing whitespace/newlines
+        return [CoNLL.doc2conll_text(doc).rstrip() for doc in docs]
 
 
 class PCFG(BaseParse):
-    def __int__(self, config):
-        super().__init__(config)
+    name = "pcfg"
+    props = "pcfg-parse.props"
+
+    def __init__(self, config, shard=None):
+        super().__init__(config, shard)
 
     def run(self):
         logging.info("Running PCFG system")
@@ -198,28 +618,30 @@ class PCFG(BaseParse):
         logging.info(f"Total system Runtime: {self.timer.stop()}")
 
     def parse(self):
+        with stage("parse") as metrics:
+            outputs = self._sharded_parse(self._read_documents())
+            metrics["tokens"], metrics["sentences"] = count_tokens("".join(outputs))
+        write_text(
+            "".join(outputs), "data/parses/pcfg/conll/selected_samples.txt.conll"
+        )
 
-        os.chdir("stanford-corenlp-4.3.2")
-        time = Timer()
-        start = time.start()
+        logging.info(f"Parse time: {metrics['wall_time']}")
 
-        bash_command = """
-        java -cp "*" edu.stanford.nlp.pipeline.StanfordCoreNLP -props ../pcfg-parse.props -file ../data/raw/selected_samples.txt
-        """
-        subprocess.check_output(bash_command, shell=True)
-        logging.info(f"Parse time: {time.stop()}")
-        os.chdir("../")
+    def _parse_documents(self, documents: List[str]) -> List[str]:
+        return self._parse_with_corenlp(documents)
 
     def postprocess(self, conll_path) -> None:
+        # sentence boundaries which differ from the gold standard (e.g. the closing
+        # quote of sample 22) are handled by the token alignment in ``src.align``
         self._conll_to_conllu(conll_path)
-        super()._fix_sentence_split(
-            "data/parses/pcfg/conllu/selected_samples.txt.conll"
-        )
 
 
 class StanfordNN(BaseParse):
-    def __init__(self, config):
-        super().__init__(config)
+    name = "nn"
+    props = "nn-parse.props"
+
+    def __init__(self, config, shard=None):
+        super().__init__(config, shard)
 
     def run(self):
         logging.info("Running Stanford NN system")
@@ -229,21 +651,20 @@ class StanfordNN(BaseParse):
         logging.info(f"Total system Runtime: {self.timer.stop()}")
 
     def parse(self):
-        os.chdir("stanford-corenlp-4.3.2")
-        time = Timer()
-        start = time.start()
-        bash_command = """
-        java -cp "*" edu.stanford.nlp.pipeline.StanfordCoreNLP -props ../nn-parse.props -file ../data/raw/selected_samples.txt
-        """
-        subprocess.check_output(bash_command, shell=True)
-        logging.info(f"Parse time: {time.stop()}")
+        with stage("parse") as metrics:
+            outputs = self._sharded_parse(self._read_documents())
+            metrics["tokens"], metrics["sentences"] = count_tokens("".join(outputs))
+        write_text("".join(outputs), "data/parses/nn/conll/selected_samples.txt.conll")
 
-        os.chdir("../")
+        logging.info(f"Parse time: {metrics['wall_time']}")
 
-    def postprocess(self, conll_path: str) -> None:
+    def _parse_documents(self, documents: List[str]) -> List[str]:
+        return self._parse_with_corenlp(documents)
 
+    def postprocess(self, conll_path: str) -> None:
+        # sentence boundaries which differ from the gold standard (e.g. the closing
+        # quote of sample 22) are handled by the token alignment in ``src.align``
         self._conll_to_conllu(conll_path)
-        super()._fix_sentence_split("data/parses/nn/conllu/selected_samples.txt.conll")
 
 
 if __name__ == "__main__":
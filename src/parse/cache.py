@@ -0,0 +1,164 @@
+"""
+Content-addressed on-disk cache of parser outputs, so that re-runs only parse
+documents whose text, parser, model or properties changed
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from pathlib import Path
+from box import Box
+from typing import *
+
+
+class ParseCache(object):
+    """
+    Stores the CoNLL output of a parser per document under the hash of the document
+    text and the parser fingerprint (parser name, properties file content, model
+    file and the identifiers of further inputs such as preprocessing models). The
+    least recently used entries are evicted once the cache exceeds
+    ``cache.max_size_mb``. The cache size is scanned once and then kept as a
+    running total, so that storing an entry does not scan the cache.
+    """
+
+    def __init__(
+        self,
+        config: Box,
+        parser: str,
+        props: Union[str, Path] = None,
+        dependencies: List[str] = None,
+    ):
+        self.path = Path(config.cache.path).joinpath(parser)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_size = config.cache.max_size_mb * 1024**2
+        self.fingerprint = self._fingerprint(
+            parser, props, config.cache.models.get(parser), dependencies or []
+        )
+        self.hits = 0
+        self.misses = 0
+        # running total of the entry sizes, scanned on first use
+        self._size = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _fingerprint(
+        parser: str,
+        props: Union[str, Path, None],
+        model: Union[str, Path, None],
+        dependencies: List[str],
+    ) -> str:
+        """
+        Hashes everything besides the document text which determines the parse. The
+        properties are hashed by content, the (large) model file by name, size and
+        modification time.
+        """
+        sha = hashlib.sha256(parser.encode("utf-8"))
+        if props is not None:
+            with open(props, "rb") as f:
+                sha.update(f.read())
+        if model is not None:
+            sha.update(str(model).encode("utf-8"))
+            if Path(model).exists():
+                stat = Path(model).stat()
+                sha.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+        for dependency in dependencies:
+            sha.update(dependency.encode("utf-8"))
+
+        return sha.hexdigest()
+
+    def _entry(self, text: str) -> Path:
+        key = hashlib.sha256((self.fingerprint + text).encode("utf-8")).hexdigest()
+        return self.path.joinpath(key[:2], f"{key}.conll")
+
+    def get(self, text: str) -> Optional[str]:
+        """
+        Looks up the cached parse of a document
+
+        Args:
+            text (str): document text
+
+        Returns:
+            Optional[str]: cached CoNLL output, None if the document was not parsed
+                with the current parser configuration before
+        """
+        entry = self._entry(text)
+        if not entry.exists():
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        # touch entry to mark it as recently used for eviction
+        os.utime(entry)
+        with open(entry, "r") as f:
+            return f.read()
+
+    def put(self, text: str, output: str) -> None:
+        """
+        Stores the parse of a document
+
+        Args:
+            text (str): document text
+            output (str): CoNLL output of the parser for the document
+
+        Returns:
+            None
+        """
+        entry = self._entry(text)
+        entry.parent.mkdir(exist_ok=True)
+        # write to temporary file first so that concurrent readers never see partial entries
+        tmp_path = entry.with_suffix(f".tmp{os.getpid()}_{threading.get_ident()}")
+        with open(tmp_path, "w") as f:
+            f.write(output)
+        size = tmp_path.stat().st_size
+        os.replace(tmp_path, entry)
+        with self._lock:
+            if self._size is not None:
+                self._size += size
+
+        return None
+
+    def _scan(self) -> List[Tuple[Path, os.stat_result]]:
+        """Lists all entries with their file status"""
+        entries = []
+        for path in self.path.glob("*/*.conll"):
+            # entries may be evicted concurrently by the workers of a sharded parse
+            try:
+                entries.append((path, path.stat()))
+            except FileNotFoundError:
+                continue
+
+        return entries
+
+    def size(self) -> int:
+        """
+        Returns the total size of the entries in bytes, scanning the cache only on
+        the first call
+        """
+        with self._lock:
+            if self._size is None:
+                self._size = sum([stat.st_size for _, stat in self._scan()])
+
+            return self._size
+
+    def evict(self) -> None:
+        """
+        Removes the least recently used entries until the cache fits ``max_size``.
+        The cache is only scanned if the running total exceeds ``max_size``.
+        """
+        if self.size() <= self.max_size:
+            return None
+
+        # other processes may have stored or evicted entries in the meantime
+        entries = self._scan()
+        total_size = sum([stat.st_size for _, stat in entries])
+        for path, stat in sorted(entries, key=lambda e: e[1].st_mtime):
+            if total_size <= self.max_size:
+                break
+            path.unlink(missing_ok=True)
+            total_size -= stat.st_size
+        with self._lock:
+            self._size = total_size
+        logging.info(f"Evicted parse cache entries, new size: {total_size} bytes")
+
+        return None
@@ -0,0 +1,380 @@
+"""
+Ensemble parser combining the parses of the other parsers by weighted arc voting.
+Every member votes for the head and label of every token with a weight per
+(parser, deprel) taken from the deprel evaluation table, and the votes are decoded
+into a well-formed tree with a maximum spanning tree (Chu-Liu/Edmonds) decoder.
+"""
+
+import logging
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from src.utils import *
+from src.align import project_to_gold
+from src.conll import format_sentence
+from src.eval.score import read_conll_columns, score_parse
+from src.treebank import Treebank
+from src.parse.base import BaseParse, Malt, PCFG, StanfordNN, _document_sentences
+
+# parsers which can be ensemble members, by name
+MEMBERS = {cls.name: cls for cls in [Malt, PCFG, StanfordNN]}
+# added to the arcs of the first member, so that it wins ties
+TIE_BREAK = 1e-6
+
+
+def deprel_weights(
+    table: Union[str, Path, pd.DataFrame],
+    parsers: List[str],
+    metric: str = "precision",
+    min_weight: float = 0.05,
+) -> Dict[str, Dict[str, float]]:
+    """
+    Derives the vote weight of every parser and deprel from the deprel evaluation
+    table written by ``src.eval``, i.e. how often an arc the parser labels with the
+    deprel is correct. Deprels the parser never predicted get its mean weight.
+
+    Args:
+        table (Union[str, Path, pd.DataFrame]): ``deprel_eval.csv`` or its content
+        parsers (List[str]): parsers to derive weights for
+        metric (str): column of the table, ``precision``, ``recall`` or ``fscore``
+        min_weight (float): lower bound of every weight, so that no parser is
+            ignored entirely for a deprel
+
+    Returns:
+        Dict[str, Dict[str, float]]: weight by parser and deprel, with the default
+            weight of every parser under ``None``
+    """
+    if not isinstance(table, pd.DataFrame):
+        table = pd.read_csv(table)
+
+    weights = {}
+    for parser in parsers:
+        column = f"{metric}_{parser}"
+        assert column in table, f"No {metric} of {parser} in the deprel table"
+        values = table.set_index("Deprel")[column].dropna()
+        default = values.mean() if len(values) > 0 else 1.0
+        weights[parser] = {
+            deprel: max(value, min_weight) for deprel, value in values.items()
+        }
+        weights[parser][None] = max(default, min_weight)
+
+    return weights
+
+
+def _find_cycle(heads: np.ndarray) -> Optional[np.ndarray]:
+    """
+    Returns the nodes of a cycle in a head assignment, or None if there is none
+    """
+    state = np.zeros(len(heads), dtype=np.int8)  # 0 new, 1 on current path, 2 done
+    state[0] = 2
+    for start in range(1, len(heads)):
+        path = []
+        node = start
+        while state[node] == 0:
+            state[node] = 1
+            path.append(node)
+            node = heads[node]
+        if state[node] == 1:
+            return np.array(path[path.index(node) :])
+        state[path] = 2
+
+    return None
+
+
+def chu_liu_edmonds(scores: np.ndarray) -> np.ndarray:
+    """
+    Decodes the maximum spanning tree of a sentence with the Chu-Liu/Edmonds
+    algorithm. Every node takes its best head, cycles are contracted into a single
+    node with the arc scores adjusted accordingly and the contracted graph is
+    decoded recursively.
+
+    Args:
+        scores (np.ndarray): score of every arc as ``scores[dependent, head]`` for
+            the nodes 0 (root) to n, ``-inf`` for impossible arcs
+
+    Returns:
+        np.ndarray: head of every node, -1 for the root node
+    """
+    heads = scores.argmax(axis=1)
+    heads[0] = 0
+    cycle = _find_cycle(heads)
+    heads[0] = -1
+    if cycle is None:
+        return heads
+
+    in_cycle = np.zeros(len(scores), dtype=bool)
+    in_cycle[cycle] = True
+    rest = np.flatnonzero(~in_cycle)
+    c = len(rest)
+
+    # the cycle becomes node ``c`` of the contracted graph
+    contracted = np.full((c + 1, c + 1), -np.inf)
+    contracted[:c, :c] = scores[np.ix_(rest, rest)]
+    # entering the cycle at a node replaces the cycle arc of that node
+    enter = scores[np.ix_(cycle, rest)] - scores[cycle, heads[cycle]][:, None]
+    enter_dep = enter.argmax(axis=0)
+    contracted[c, :c] = enter[enter_dep, np.arange(c)]
+    leave = scores[np.ix_(rest, cycle)]
+    leave_head = leave.argmax(axis=1)
+    contracted[:c, c] = leave[np.arange(c), leave_head]
+    contracted[0, :] = -np.inf
+
+    sub_heads = chu_liu_edmonds(contracted)
+    result = heads.copy()
+    outer = sub_heads[1:c]
+    result[rest[1:]] = np.where(
+        outer == c, cycle[leave_head[1:]], rest[np.minimum(outer, c - 1)]
+    )
+    entry = sub_heads[c]
+    result[cycle[enter_dep[entry]]] = rest[entry]
+
+    return result
+
+
+def decode_batch(scores: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """
+    Decodes a batch of sentences into trees with a single root. All sentences
+    take their best heads at once; only sentences where this does not give a
+    tree with a single root (i.e. where the voters disagree) are decoded with
+    ``chu_liu_edmonds``.
+
+    Args:
+        scores (np.ndarray): arc scores of shape (sentences, n + 1, n + 1) as
+            ``scores[sentence, dependent, head]``, padded with ``-inf``
+        lengths (np.ndarray): number of tokens of every sentence
+
+    Returns:
+        np.ndarray: head of every node of every sentence, 0 for the root node and
+            padding
+    """
+    n_nodes = scores.shape[1]
+    heads = scores.argmax(axis=2)
+    nodes = np.arange(n_nodes)
+    heads[:, 0] = 0
+    heads[nodes[None, :] > lengths[:, None]] = 0
+
+    # pointer doubling: after k rounds every node points 2^k steps up its path,
+    # so all nodes reach the root within log2(n) rounds unless they are on a cycle
+    ancestors = heads
+    for _ in range(int(np.ceil(np.log2(max(n_nodes, 2)))) + 1):
+        ancestors = np.take_along_axis(ancestors, ancestors, axis=1)
+    n_roots = ((heads == 0) & (nodes[None, :] > 0) & (nodes <= lengths[:, None])).sum(
+        axis=1
+    )
+    invalid = np.flatnonzero((ancestors != 0).any(axis=1) | (n_roots != 1))
+
+    for b in invalid:
+        n = lengths[b] + 1
+        sentence = scores[b, :n, :n].copy()
+        # a single root: every further root arc costs more than all votes together
+        finite = np.isfinite(sentence)
+        sentence[1:, 0] -= np.abs(sentence[finite]).sum() + 1
+        heads[b, :n] = chu_liu_edmonds(sentence)
+        heads[b, 0] = 0
+
+    return heads
+
+
+def combine(
+    members: Dict[str, Treebank],
+    weights: Dict[str, Dict[str, float]],
+    batch_size: int = 256,
+) -> Treebank:
+    """
+    Combines the parses of the members by weighted arc voting. The tokens and
+    sentences of the first member are kept, the other parses are projected onto
+    them. Sentences are decoded in batches of similar length to limit padding.
+
+    Args:
+        members (Dict[str, Treebank]): parse of every member, the first being the
+            reference tokenization
+        weights (Dict[str, Dict[str, float]]): output of ``deprel_weights``
+        batch_size (int): sentences decoded at once
+
+    Returns:
+        Treebank: ensemble parse with the tokens of the first member
+    """
+    names = list(members)
+    reference = members[names[0]]
+    votes = {names[0]: reference}
+    for name in names[1:]:
+        votes[name], _ = project_to_gold(members[name], reference)
+
+    # deprels of all members, and the deprel code and vote weight of every token
+    labels = np.array(
+        sorted(set().union(*[v.tables["deprel"] for v in votes.values()]))
+    )
+    ids = reference.columns["id"].astype(np.int64)
+    positions = np.arange(reference.n_tokens) - np.repeat(
+        reference.offsets[:-1], np.diff(reference.offsets)
+    )
+    arcs = {}
+    for rank, (name, parse) in enumerate(votes.items()):
+        deprels = parse.column("deprel")
+        table = weights.get(name, {None: 1.0})
+        weight = np.array([table.get(d, table[None]) for d in parse.tables["deprel"]])
+        heads = parse.columns["head"].astype(np.int64)
+        arcs[name] = {
+            # head as node within the sentence, 0 for the root
+            "head": np.where(heads > 0, positions - ids + heads + 1, 0),
+            "label": np.searchsorted(labels, deprels),
+            # placeholders of tokens missing from the projected parse do not vote
+            "weight": np.where(deprels == "_", 0.0, weight[parse.columns["deprel"]])
+            + (TIE_BREAK if rank == 0 else 0.0),
+        }
+
+    lengths = np.diff(reference.offsets)
+    order = np.argsort(lengths, kind="stable")
+    heads = np.zeros(reference.n_tokens, dtype=np.int64)
+    deprels = np.zeros(reference.n_tokens, dtype=np.int64)
+    for start in range(0, len(order), batch_size):
+        batch = order[start : start + batch_size]
+        batch_lengths = lengths[batch]
+        n_nodes = int(batch_lengths.max(initial=0)) + 1
+        # tokens of the batch, their sentence within the batch and their node
+        tokens = np.concatenate(
+            [np.arange(reference.offsets[s], reference.offsets[s + 1]) for s in batch]
+        ).astype(np.int64)
+        row = np.repeat(np.arange(len(batch)), batch_lengths)
+        node = positions[tokens] + 1
+
+        scores = np.full((len(batch), n_nodes, n_nodes), -np.inf)
+        # arcs to the root and to other tokens of the sentence, no self loops
+        valid = np.arange(n_nodes)[None, :] <= batch_lengths[row][:, None]
+        scores[row, node, :] = np.where(valid, 0.0, -np.inf)
+        scores[row, node, node] = -np.inf
+        for name, arc in arcs.items():
+            np.add.at(scores, (row, node, arc["head"][tokens]), arc["weight"][tokens])
+
+        batch_heads = decode_batch(scores, batch_lengths)[row, node]
+        heads[tokens] = batch_heads
+
+        # label of the decoded arc by its voters, falling back to all votes
+        label_votes = np.zeros((len(tokens), len(labels)))
+        for name, arc in arcs.items():
+            agrees = arc["head"][tokens] == batch_heads
+            weight = arc["weight"][tokens] * np.where(agrees, 1.0, TIE_BREAK)
+            np.add.at(
+                label_votes, (np.arange(len(tokens)), arc["label"][tokens]), weight
+            )
+        deprels[tokens] = label_votes.argmax(axis=1)
+
+    columns = dict(reference.columns)
+    columns["head"] = np.where(heads > 0, ids - positions - 1 + heads, 0).astype(
+        np.int32
+    )
+    columns["deprel"] = deprels.astype(np.int32)
+    tables = dict(reference.tables)
+    tables["deprel"] = labels
+
+    return Treebank(columns, tables, reference.offsets)
+
+
+class Ensemble(BaseParse):
+    """
+    Combines the parses of the parsers of ``ensemble.parsers`` by weighted arc
+    voting, see ``combine``. The pipeline step combines the existing parse files,
+    ``_parse_documents`` parses the documents with every member first.
+    """
+
+    name = "ensemble"
+
+    def __init__(self, config: Box, shard: int = None):
+        super().__init__(config, shard)
+        self.parsers = list(config.ensemble.parsers)
+        self._members = {}
+
+    def run(self):
+        logging.info("Running ensemble of " + ", ".join(self.parsers))
+        self.timer.start()
+        self.parse()
+        logging.info(f"Total system Runtime: {self.timer.stop()}")
+
+    def weights(self) -> Dict[str, Dict[str, float]]:
+        """
+        Vote weights from ``ensemble.weights``, equal weights if it does not exist
+        (yet)
+        """
+        path = Path(self.config.ensemble.weights)
+        if not path.exists():
+            logging.warning(f"No deprel table at {path}, using equal vote weights")
+            return {p: {None: 1.0} for p in self.parsers}
+
+        return deprel_weights(
+            path,
+            self.parsers,
+            self.config.ensemble.metric,
+            self.config.ensemble.min_weight,
+        )
+
+    def parse(self):
+        with stage("parse") as metrics:
+            members = {
+                p: Treebank.from_conll(
+                    Path(self.config.parse_path).joinpath(self.config.parse_files[p])
+                )
+                for p in self.parsers
+            }
+            ensemble = combine(members, self.weights(), self.config.ensemble.batch_size)
+            metrics["tokens"], metrics["sentences"] = ensemble.n_tokens, len(ensemble)
+
+        target = Path(self.config.parse_path).joinpath(
+            self.config.parse_files[self.name]
+        )
+        target.parent.mkdir(parents=True, exist_ok=True)
+        ensemble.to_conll(target)
+        logging.info(f"Parse time: {metrics['wall_time']}")
+
+    def _cached_parse(self, documents: List[str], evict: bool = True) -> List[str]:
+        # the members cache their outputs, while the vote weights may change
+        return self._parse_documents(documents)
+
+    def _parse_documents(self, documents: List[str]) -> List[str]:
+        outputs = {}
+        for parser in self.parsers:
+            if parser not in self._members:
+                self._members[parser] = MEMBERS[parser](self.config, self.shard)
+            member = self._members[parser]
+            outputs[parser] = [
+                _document_sentences(member, o) for o in member._cached_parse(documents)
+            ]
+
+        members = {
+            p: Treebank.from_sentences([s for doc in docs for s in doc])
+            for p, docs in outputs.items()
+        }
+        ensemble = combine(members, self.weights(), self.config.ensemble.batch_size)
+
+        # split the ensemble parse into documents like the reference member
+        bounds = np.cumsum([0] + [len(doc) for doc in outputs[self.parsers[0]]])
+        return [
+            "".join([format_sentence(ensemble.sentence(i)) for i in range(start, end)])
+            for start, end in zip(bounds[:-1], bounds[1:])
+        ]
+
+
+def evaluate_ensemble(config: Box) -> pd.DataFrame:
+    """
+    Scores the ensemble and its members against the gold standard and writes the
+    attachment scores to ``ensemble_eval.csv`` in ``config.eval_path``. The
+    ensemble is scored here rather than by ``src.eval``, whose deprel table it
+    takes its weights from.
+
+    Returns:
+        pd.DataFrame: UAS, LAS and LA by parser
+    """
+    gold = read_conll_columns(Path(config.gold_path).joinpath(config.files.gold_conll))
+    scores = []
+    for parser in list(config.ensemble.parsers) + [Ensemble.name]:
+        system = read_conll_columns(
+            Path(config.parse_path).joinpath(config.parse_files[parser])
+        )
+        overall = score_parse(system, gold, ["Deprel"])["overall"]
+        scores.append(overall.assign(parser=parser))
+    scores = pd.concat(scores, ignore_index=True)[["parser", "UAS", "LAS", "LA"]]
+
+    path = Path(config.eval_path).joinpath("ensemble_eval.csv")
+    logging.info(f"Writing ensemble attachment scores to {path}")
+    scores.to_csv(path, index=False)
+
+    return scores
@@ -1,9 +1,15 @@
 """
 File containing pipeline wrappers for parses
 """
+
 from src.parse.base import Malt, StanfordNN, PCFG
+from src.parse.ensemble import Ensemble, evaluate_ensemble
+from src.parse.routing import Router, routing_report
 from src.utils import *
 
+# parser classes by name, as used for the keys of ``parse_files`` in the config
+PARSERS = {cls.name: cls for cls in [Malt, PCFG, StanfordNN, Ensemble, Router]}
+
 
 def parse_nn(config):
     nn = StanfordNN(config)
@@ -18,3 +24,15 @@ def parse_pcfg(config):
 def parse_malt(config):
     malt = Malt(config)
     malt.run()
+
+
+def parse_ensemble(config):
+    ensemble = Ensemble(config)
+    ensemble.run()
+    evaluate_ensemble(config)
+
+
+def parse_routed(config):
+    router = Router(config)
+    router.run()
+    routing_report(config)
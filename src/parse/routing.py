@@ -0,0 +1,338 @@
+"""
+Routing of sentences between parsers by their length and predicted parse time.
+The PCFG parser (CKY) takes cubic time in the sentence length, while the
+transition-based MALT and NN parsers take linear time, so long sentences are sent
+to a linear-time fallback parser.
+"""
+
+import glob
+import json
+import logging
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from src.utils import *
+from src.align import project_to_gold
+from src.conll import count_tokens, format_sentence, write_text
+from src.eval.score import score_parse, treebank_columns
+from src.treebank import Treebank
+from src.parse.base import (
+    BaseParse,
+    Malt,
+    PCFG,
+    StanfordNN,
+    _document_sentences,
+    sentence_length,
+    split_sentences,
+)
+
+# parsers which sentences can be routed to, by name
+TARGETS = {cls.name: cls for cls in [Malt, PCFG, StanfordNN]}
+
+
+def measured_throughput(config: Box, parser: str) -> Optional[float]:
+    """
+    Returns the parse throughput (tokens per second) of a parser from the most
+    recent pipeline run which recorded it, see ``export_metrics``
+
+    Args:
+        config (Box): main config
+        parser (str): parser name
+
+    Returns:
+        Optional[float]: tokens per second, None if no run parsed with the parser
+    """
+    runs = sorted(glob.glob(str(Path(config.metrics.path).joinpath("run_*.*"))))
+    for path in reversed(runs):
+        if path.endswith(".json"):
+            with open(path, "r") as f:
+                records = pd.DataFrame(json.load(f)["stages"])
+        else:
+            records = pd.read_csv(path)
+        if "tokens_per_s" not in records:
+            continue
+        if "failed" in records:
+            # CSV files hold the flag as text
+            records = records.loc[records["failed"].astype(str).str.lower() != "true"]
+        parse = records.loc[
+            (records["step"] == f"src.parse_{parser}")
+            & (records["stage"] == "parse")
+            & (records["tokens_per_s"] > 0)
+        ]
+        if len(parse) > 0:
+            return float(parse["tokens_per_s"].iloc[-1])
+
+    return None
+
+
+class CostModel(object):
+    """
+    Predicts the parse time of a sentence as ``scale * length ** complexity`` per
+    parser, where the scale is fitted to the measured throughput
+
+    Args:
+        complexity (Dict[str, float]): exponent of the sentence length by parser
+        scale (Dict[str, float]): seconds per unit of ``length ** complexity``
+    """
+
+    def __init__(self, complexity: Dict[str, float], scale: Dict[str, float]):
+        self.complexity = complexity
+        self.scale = scale
+
+    @classmethod
+    def fit(
+        cls,
+        complexity: Dict[str, float],
+        throughput: Dict[str, float],
+        lengths: np.ndarray,
+    ) -> "CostModel":
+        """
+        Fits the scale of every parser such that parsing sentences of the given
+        lengths takes as long as at the measured throughput
+
+        Args:
+            complexity (Dict[str, float]): exponent of the sentence length by parser
+            throughput (Dict[str, float]): tokens per second by parser
+            lengths (np.ndarray): sentence lengths of the corpus the throughput was
+                measured on
+
+        Returns:
+            CostModel: fitted model
+        """
+        lengths = np.asarray(lengths, dtype=np.float64)
+        scale = {
+            parser: lengths.sum()
+            / (throughput[parser] * (lengths ** complexity[parser]).sum())
+            for parser in complexity
+        }
+
+        return cls(complexity, scale)
+
+    @classmethod
+    def from_config(cls, config: Box, lengths: np.ndarray) -> "CostModel":
+        """
+        Fits the model to the throughput measured by the last pipeline runs,
+        falling back to ``routing.throughput`` for parsers without measurement
+        """
+        complexity = config.routing.complexity.to_dict()
+        throughput = {}
+        for parser in complexity:
+            measured = measured_throughput(config, parser)
+            throughput[parser] = (
+                measured if measured is not None else config.routing.throughput[parser]
+            )
+
+        return cls.fit(complexity, throughput, lengths)
+
+    def predict(self, parser: str, lengths: np.ndarray) -> np.ndarray:
+        """
+        Predicts the parse time in seconds of sentences of the given lengths
+        """
+        lengths = np.asarray(lengths, dtype=np.float64)
+
+        return self.scale[parser] * lengths ** self.complexity[parser]
+
+
+def route(
+    lengths: np.ndarray,
+    primary: str,
+    fallback: str,
+    mode: str = "length",
+    max_length: int = 40,
+    max_cost: float = None,
+    model: CostModel = None,
+) -> np.ndarray:
+    """
+    Decides which parser every sentence is sent to
+
+    Args:
+        lengths (np.ndarray): sentence lengths in tokens
+        primary (str): preferred parser
+        fallback (str): parser of sentences exceeding the limit of ``primary``
+        mode (str): ``length`` to send sentences longer than ``max_length`` to the
+            fallback, ``cost`` to send sentences whose predicted parse time with
+            the primary parser exceeds ``max_cost`` seconds to the fallback
+        max_length (int): length limit of the ``length`` mode
+        max_cost (float): time limit of the ``cost`` mode
+        model (CostModel): cost model of the ``cost`` mode
+
+    Returns:
+        np.ndarray: parser of every sentence
+    """
+    assert mode in ["length", "cost"], f"Invalid routing mode: {mode}"
+    lengths = np.asarray(lengths)
+    if mode == "length":
+        exceeds = lengths > max_length
+    else:
+        assert model is not None, "The cost mode requires a cost model"
+        exceeds = model.predict(primary, lengths) > max_cost
+
+    return np.where(exceeds, fallback, primary).astype(object)
+
+
+class Router(BaseParse):
+    """
+    Splits the documents into sentences and parses every sentence with the
+    parser chosen by ``route`` from the settings of ``routing`` in the config.
+    The parse of every document is assembled from its sentences in order.
+    """
+
+    name = "routed"
+
+    def __init__(self, config: Box, shard: int = None):
+        super().__init__(config, shard)
+        self.settings = config.routing
+        self._targets = {}
+        self._model = None
+
+    def run(self):
+        logging.info(
+            f"Running {self.settings.primary.upper()} parser with "
+            f"{self.settings.fallback.upper()} fallback"
+        )
+        self.timer.start()
+        self.parse()
+        logging.info(f"Total system Runtime: {self.timer.stop()}")
+
+    def parse(self):
+        with stage("parse") as metrics:
+            outputs = self._parse_documents(self._read_documents())
+            metrics["tokens"], metrics["sentences"] = count_tokens("".join(outputs))
+
+        target = Path(self.config.parse_path).joinpath(
+            self.config.parse_files[self.name]
+        )
+        target.parent.mkdir(parents=True, exist_ok=True)
+        write_text("".join(outputs), target)
+        logging.info(f"Parse time: {metrics['wall_time']}")
+
+    def cost_model(self) -> CostModel:
+        """
+        Cost model fitted to the sentence lengths of the gold standard, on which
+        the throughput of the pipeline runs is measured
+        """
+        if self._model is None:
+            gold = Treebank.from_conll(
+                Path(self.config.gold_path).joinpath(self.config.files.gold_conll)
+            )
+            self._model = CostModel.from_config(self.config, np.diff(gold.offsets))
+
+        return self._model
+
+    def _target(self, parser: str) -> BaseParse:
+        if parser not in self._targets:
+            self._targets[parser] = TARGETS[parser](self.config, self.shard)
+
+        return self._targets[parser]
+
+    def _cached_parse(self, documents: List[str], evict: bool = True) -> List[str]:
+        # the parsers the sentences are routed to cache their outputs
+        return self._parse_documents(documents)
+
+    def _parse_documents(self, documents: List[str]) -> List[str]:
+        sentences = [split_sentences(d) for d in documents]
+        flat = [s for doc in sentences for s in doc]
+        lengths = np.array([sentence_length(s) for s in flat], dtype=np.int64)
+        model = self.cost_model() if self.settings.mode == "cost" else None
+        targets = route(
+            lengths,
+            self.settings.primary,
+            self.settings.fallback,
+            self.settings.mode,
+            self.settings.max_length,
+            self.settings.max_cost,
+            model,
+        )
+
+        # every parser parses all sentences routed to it as one batch
+        outputs = [None] * len(flat)
+        for parser in np.unique(targets):
+            idx = np.flatnonzero(targets == parser)
+            logging.info(f"Routing {len(idx)} of {len(flat)} sentences to {parser}")
+            instance = self._target(parser)
+            parsed = instance._sharded_parse([flat[i] for i in idx])
+            for i, output in zip(idx, parsed):
+                outputs[i] = "".join(
+                    [format_sentence(s) for s in _document_sentences(instance, output)]
+                )
+
+        bounds = np.cumsum([0] + [len(doc) for doc in sentences])
+        return [
+            "".join(outputs[start:end]) for start, end in zip(bounds[:-1], bounds[1:])
+        ]
+
+
+def routing_report(config: Box) -> pd.DataFrame:
+    """
+    Reports the accuracy/latency trade-off of routing by sentence length without
+    re-parsing: for every threshold of ``routing.report_thresholds``, the parse of
+    every gold sentence is taken from the full parse of the primary parser, or of
+    the fallback parser if the sentence is longer than the threshold. Writes the
+    attachment scores and predicted parse time by threshold to
+    ``routing_eval.csv``, and the f-scores by ``RelationLength`` to
+    ``routing_relation_length.csv`` in ``config.eval_path``.
+
+    Args:
+        config (Box): main config
+
+    Returns:
+        pd.DataFrame: attachment scores and predicted parse time by threshold
+    """
+    primary, fallback = config.routing.primary, config.routing.fallback
+    gold = Treebank.from_conll(Path(config.gold_path).joinpath(config.files.gold_conll))
+    parses = {}
+    for parser in [primary, fallback]:
+        parse = Treebank.from_conll(
+            Path(config.parse_path).joinpath(config.parse_files[parser])
+        )
+        parses[parser], merged_gold = project_to_gold(parse, gold)
+    gold_columns = treebank_columns(merged_gold)
+    columns = {p: treebank_columns(parse) for p, parse in parses.items()}
+
+    lengths = np.diff(merged_gold.offsets)
+    model = CostModel.from_config(config, lengths)
+    # from all sentences on the fallback parser to all sentences on the primary one
+    thresholds = [0] + sorted(config.routing.report_thresholds) + [int(lengths.max())]
+
+    summary, by_length = [], {}
+    for threshold in thresholds:
+        targets = route(lengths, primary, fallback, max_length=threshold)
+        # tokens of sentences sent to the fallback parser
+        fallback_tokens = np.repeat(targets == fallback, lengths)
+        system = dict(gold_columns)
+        for name in ["head", "deprel"]:
+            system[name] = np.where(
+                fallback_tokens, columns[fallback][name], columns[primary][name]
+            )
+        scores = score_parse(system, gold_columns, ["RelationLength"])
+
+        time_s = sum(
+            [model.predict(p, lengths[targets == p]).sum() for p in [primary, fallback]]
+        )
+        summary.append(
+            {
+                "max_length": threshold,
+                f"share_{primary}": float((targets == primary).mean()),
+                "predicted_time_s": time_s,
+                "UAS": scores["overall"]["UAS"].iloc[0],
+                "LAS": scores["overall"]["LAS"].iloc[0],
+            }
+        )
+        by_length[threshold] = scores["RelationLength"].set_index("RelationLength")[
+            "fscore"
+        ]
+
+    summary = pd.DataFrame(summary)
+    relation_length = pd.DataFrame(
+        {f"fscore_max_length_{t}": f for t, f in by_length.items()}
+    )
+    relation_length.index = relation_length.index.astype(int)
+    relation_length = relation_length.sort_index().rename_axis("RelationLength")
+
+    summary_path = Path(config.eval_path).joinpath("routing_eval.csv")
+    length_path = Path(config.eval_path).joinpath("routing_relation_length.csv")
+    logging.info(f"Writing routing trade-off to {summary_path} and {length_path}")
+    summary.to_csv(summary_path, index=False)
+    relation_length.reset_index().to_csv(length_path, index=False)
+
+    return summary
@@ -0,0 +1,352 @@
+"""
+Client for a persistent local Stanford CoreNLP server, shared by the PCFG and NN
+parsers so that JVM startup and model loading are paid once rather than per run
+"""
+
+import atexit
+import http.client
+import json
+import logging
+import os
+import subprocess
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlencode
+from box import Box
+from typing import *
+from src.utils import stage
+
+# properties which only make sense for the command line pipeline
+CLI_ONLY_PROPS = ["file", "outputDirectory"]
+
+# server instances shared across parsers, keyed by (host, port)
+_SERVERS = {}
+
+# single-token paragraph inserted between documents of a batch. CoreNLP splits
+# sentences on blank lines, so it always comes back as a sentence of its own
+DOCUMENT_SEPARATOR = "DOCUMENTSEPARATOR"
+
+
+def join_documents(documents: List[str]) -> str:
+    """
+    Joins documents into a single CoreNLP input, separated by ``DOCUMENT_SEPARATOR``
+
+    Args:
+        documents (List[str]): raw document texts
+
+    Returns:
+        str: text which can be annotated in one go
+    """
+    return f"\n\n{DOCUMENT_SEPARATOR}\n\n".join([d.strip() for d in documents])
+
+
+def split_documents(conll: str) -> List[str]:
+    """
+    Splits the CoNLL output of a text created by ``join_documents`` back into the
+    output of the single documents
+
+    Args:
+        conll (str): CoNLL output of the joined documents
+
+    Returns:
+        List[str]: CoNLL output per document, every sentence followed by a blank line
+    """
+    # sentences per document, joined once at the end
+    documents = [[]]
+    for sentence in conll.split("\n\n"):
+        sentence = sentence.strip("\n")
+        if sentence == "":
+            continue
+        cols = sentence.split("\t")
+        if "\n" not in sentence and len(cols) > 1 and cols[1] == DOCUMENT_SEPARATOR:
+            documents.append([])
+            continue
+        documents[-1].append(sentence + "\n\n")
+
+    return ["".join(sentences) for sentences in documents]
+
+
+def read_props(path: Union[str, Path]) -> Dict[str, str]:
+    """
+    Reads a CoreNLP ``.props`` file into a dictionary which can be sent to the
+    server as request properties. Input/output location keys are dropped.
+
+    Args:
+        path (Union[str, Path]): path to the properties file
+
+    Returns:
+        Dict[str, str]: properties by key
+    """
+    props = {}
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if line == "" or line.startswith(("#", "!", "<!--")):
+                continue
+            key, _, value = line.partition("=")
+            props[key.strip()] = value.strip()
+
+    for key in CLI_ONLY_PROPS:
+        props.pop(key, None)
+
+    return props
+
+
+class CoreNLPServer(object):
+    """
+    Long-lived CoreNLP server process with one keep-alive HTTP connection per
+    thread, so that parsers may share the server concurrently. An already running
+    server on the configured host and port is reused, a dead server is restarted
+    up to ``max_restarts`` times.
+    """
+
+    def __init__(self, config: Box):
+        self.path = Path(config.corenlp.path)
+        self.host = config.corenlp.host
+        self.port = config.corenlp.port
+        self.memory = config.corenlp.memory
+        self.timeout = config.corenlp.timeout
+        self.startup_timeout = config.corenlp.startup_timeout
+        self.batch_size = config.corenlp.batch_size
+        self.max_restarts = config.corenlp.max_restarts
+        self.keep_alive = config.corenlp.keep_alive
+        self.restarts = 0
+        self._process = None
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.RLock()
+
+    def _request(self, method: str, path: str, body: bytes = None) -> Tuple[int, str]:
+        """
+        Sends a request over the connection of the calling thread, reconnecting on
+        the next request if the connection broke
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # leave some slack on top of the server-side annotation timeout
+            connection = http.client.HTTPConnection(
+                self.host, self.port, timeout=self.timeout / 1000 + 10
+            )
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        try:
+            connection.request(method, path, body=body)
+            response = connection.getresponse()
+            return response.status, response.read().decode("utf-8")
+        except (http.client.HTTPException, OSError):
+            connection.close()
+            self._local.connection = None
+            with self._lock:
+                self._connections.remove(connection)
+            raise
+
+    def is_alive(self) -> bool:
+        """Health check against the server's ``/live`` endpoint"""
+        try:
+            status, _ = self._request("GET", "/live")
+        except (http.client.HTTPException, OSError):
+            return False
+        return status == 200
+
+    def start(self) -> None:
+        """
+        Starts the server unless one is already listening, and blocks until it
+        passes the health check
+        """
+        if self.is_alive():
+            logging.info(f"Reusing CoreNLP server at {self.host}:{self.port}")
+            return None
+
+        logging.info(f"Starting CoreNLP server at {self.host}:{self.port}")
+        command = [
+            "java",
+            f"-mx{self.memory}",
+            "-cp",
+            "*",
+            "edu.stanford.nlp.pipeline.StanfordCoreNLPServer",
+            "-port",
+            str(self.port),
+            "-timeout",
+            str(self.timeout),
+        ]
+        with stage("jvm_startup"):
+            self._wait_until_live(command)
+
+        return None
+
+    def _wait_until_live(self, command: List[str]) -> None:
+        """
+        Spawns the server process and polls the health check until it passes
+        """
+        self._process = subprocess.Popen(
+            command,
+            cwd=self.path,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+        deadline = time.monotonic() + self.startup_timeout
+        while not self.is_alive():
+            if self._process is not None and self._process.poll() is not None:
+                # the port may be taken by a server started concurrently by another
+                # pipeline step, so keep waiting for it to become live
+                logging.warning(
+                    f"CoreNLP server exited with code {self._process.returncode}"
+                )
+                self._process = None
+            if time.monotonic() > deadline:
+                self.stop()
+                raise RuntimeError(
+                    f"CoreNLP server not live after {self.startup_timeout} seconds"
+                )
+            time.sleep(0.5)
+
+        return None
+
+    def stop(self) -> None:
+        """Closes the connections and terminates the server if it was started here"""
+        with self._lock:
+            # closed connections reconnect on their next request
+            for connection in self._connections:
+                connection.close()
+        if self._process is not None and self._process.poll() is None:
+            logging.info(f"Stopping CoreNLP server at {self.host}:{self.port}")
+            self._process.terminate()
+            self._process.wait()
+        self._process = None
+
+        return None
+
+    def restart(self, seen: int = None) -> None:
+        """
+        Restarts the server, giving up after ``max_restarts`` restarts. Passing
+        the number of restarts seen before a failed request skips the restart if
+        another thread restarted the server in the meantime.
+        """
+        with self._lock:
+            if seen is not None and seen != self.restarts:
+                return None
+            if self.restarts >= self.max_restarts:
+                raise RuntimeError(
+                    f"CoreNLP server failed after {self.restarts} restarts, giving up"
+                )
+            self.restarts += 1
+            logging.warning(
+                f"Restarting CoreNLP server ({self.restarts}/{self.max_restarts})"
+            )
+            self.stop()
+            self.start()
+
+        return None
+
+    def annotate(self, text: str, properties: Dict[str, str]) -> str:
+        """
+        Annotates a single document, restarting the server if it is not live
+
+        Args:
+            text (str): raw document text
+            properties (Dict[str, str]): CoreNLP request properties
+
+        Returns:
+            str: annotated document in the requested ``outputFormat``
+        """
+        path = "/?" + urlencode({"properties": json.dumps(properties)})
+        seen = self.restarts
+        if not self.is_alive():
+            self.restart(seen)
+        while True:
+            seen = self.restarts
+            try:
+                status, output = self._request("POST", path, text.encode("utf-8"))
+            except (http.client.HTTPException, OSError) as e:
+                logging.warning(f"CoreNLP request failed: {e}")
+                self.restart(seen)
+                continue
+            if status != 200:
+                raise RuntimeError(f"CoreNLP server error {status}: {output}")
+            return output
+
+    def annotate_documents(
+        self, documents: List[str], properties: Dict[str, str]
+    ) -> List[str]:
+        """
+        Annotates documents in batches of ``batch_size``, joining the documents of
+        a batch with ``join_documents`` and splitting the output per document again
+
+        Args:
+            documents (List[str]): raw document texts
+            properties (Dict[str, str]): CoreNLP request properties, the output
+                format has to be ``conll``
+
+        Returns:
+            List[str]: CoNLL output of every document, in input order
+        """
+        outputs = []
+        for i in range(0, len(documents), self.batch_size):
+            batch = documents[i : i + self.batch_size]
+            logging.info(
+                f"Annotating documents {i + 1}-{i + len(batch)} of {len(documents)}"
+            )
+            output = split_documents(self.annotate(join_documents(batch), properties))
+            assert len(output) == len(
+                batch
+            ), f"CoreNLP returned {len(output)} documents, expected {len(batch)}"
+            outputs += output
+
+        return outputs
+
+
+def get_server(config: Box) -> CoreNLPServer:
+    """
+    Returns the shared server for the configured host and port, starting it on
+    first use. Servers started here are stopped on exit unless ``keep_alive`` is
+    set, pipeline steps and shards stop them when they end, see ``stop_servers``.
+
+    Args:
+        config (Box): main config
+
+    Returns:
+        CoreNLPServer: running server
+    """
+    key = (config.corenlp.host, config.corenlp.port)
+    if key not in _SERVERS:
+        server = CoreNLPServer(config)
+        server.start()
+        if not config.corenlp.keep_alive:
+            atexit.register(server.stop)
+        _SERVERS[key] = server
+
+    return _SERVERS[key]
+
+
+def stop_servers() -> None:
+    """
+    Stops the servers which were started in this process, unless ``keep_alive`` is
+    set, and forgets all shared servers. Exit handlers do not run in the worker
+    processes of pipeline steps and shards, which call this when they end instead.
+
+    Returns:
+        None
+    """
+    while len(_SERVERS) > 0:
+        _, server = _SERVERS.popitem()
+        if not server.keep_alive:
+            server.stop()
+
+    return None
+
+
+def _forget_servers() -> None:
+    """
+    Forgets the servers of the parent in a forked worker process, which must
+    neither share their connections nor stop their server processes
+    """
+    _SERVERS.clear()
+
+    return None
+
+
+if hasattr(os, "register_at_fork"):  # not available on Windows
+    os.register_at_fork(after_in_child=_forget_servers)
@@ -0,0 +1,210 @@
+"""
+Asyncio-based runner for the external parser and evaluator processes. Processes
+are started without a shell and without changing the working directory of the
+Python process, so several of them can run concurrently from one driver. All
+callers of a Python process share one limit on the number of processes running at
+once, see ``set_max_processes``.
+"""
+
+import asyncio
+import contextlib
+import logging
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import *
+
+# processes running at once across all callers, until ``set_max_processes`` is called
+DEFAULT_MAX_PROCESSES = 4
+# seconds between attempts to acquire a slot of the process limit
+LIMIT_POLL_INTERVAL = 0.05
+
+_LIMITER = threading.BoundedSemaphore(DEFAULT_MAX_PROCESSES)
+
+
+def set_max_processes(max_processes: int) -> None:
+    """
+    Sets the number of external processes running at once across all callers of
+    this Python process, e.g. the API, the parser batches and the evaluation
+
+    Args:
+        max_processes (int): maximum number of concurrent processes
+
+    Returns:
+        None
+    """
+    global _LIMITER
+    assert max_processes >= 1, "At least one process has to be allowed"
+    _LIMITER = threading.BoundedSemaphore(max_processes)
+
+    return None
+
+
+class ProcessResult(NamedTuple):
+    command: List[str]
+    returncode: int
+    stdout: str
+    stderr: str
+    elapsed: float
+
+
+async def _read_stream(
+    stream: asyncio.StreamReader, name: str, lines: List[str]
+) -> None:
+    """
+    Collects a stream line by line while the process runs, logging every line
+    """
+    while True:
+        line = await stream.readline()
+        if not line:
+            break
+        line = line.decode("utf-8", errors="replace")
+        lines.append(line)
+        logging.debug(f"[{name}] {line.rstrip()}")
+
+
+@contextlib.asynccontextmanager
+async def _no_limit():
+    """
+    Stands in for the semaphore of callers without a limit of their own, since
+    ``contextlib.nullcontext`` only supports ``async with`` from Python 3.10
+    """
+    yield
+
+
+async def run_process(
+    command: List[str],
+    cwd: Union[str, Path] = None,
+    timeout: float = None,
+    semaphore: asyncio.Semaphore = None,
+    check: bool = True,
+) -> ProcessResult:
+    """
+    Runs a single external process, capturing stdout and stderr as they are
+    written. The process is killed if it exceeds the timeout or if the calling
+    task is cancelled.
+
+    Args:
+        command (List[str]): executable and arguments
+        cwd (Union[str, Path]): working directory of the process
+        timeout (float): seconds after which the process is killed, no limit if None
+        semaphore (asyncio.Semaphore): limits the number of concurrent processes
+            of the caller, on top of the limit shared by all callers
+        check (bool): raise ``subprocess.CalledProcessError`` on a non-zero exit code
+
+    Returns:
+        ProcessResult: exit code, captured output and wall time of the process
+    """
+    async with semaphore or _no_limit():
+        # the shared limit is held by threads with event loops of their own, so it
+        # is polled instead of blocking the event loop
+        limiter = _LIMITER
+        while not limiter.acquire(blocking=False):
+            await asyncio.sleep(LIMIT_POLL_INTERVAL)
+        try:
+            name = Path(command[0]).name
+            logging.info(f"Executing: {' '.join(command)}")
+            start = time.perf_counter()
+            process = await asyncio.create_subprocess_exec(
+                *command,
+                cwd=cwd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            stdout, stderr = [], []
+            try:
+                await asyncio.wait_for(
+                    asyncio.gather(
+                        _read_stream(process.stdout, name, stdout),
+                        _read_stream(process.stderr, name, stderr),
+                        process.wait(),
+                    ),
+                    timeout,
+                )
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                # the process may have exited just before the timeout
+                if process.returncode is None:
+                    try:
+                        process.kill()
+                    except ProcessLookupError:
+                        pass
+                await process.wait()
+                raise
+        finally:
+            limiter.release()
+
+    result = ProcessResult(
+        command,
+        process.returncode,
+        "".join(stdout),
+        "".join(stderr),
+        time.perf_counter() - start,
+    )
+    if check and result.returncode != 0:
+        raise subprocess.CalledProcessError(
+            result.returncode, command, result.stdout, result.stderr
+        )
+
+    return result
+
+
+async def run_processes(
+    commands: List[List[str]],
+    max_processes: int,
+    cwd: Union[str, Path] = None,
+    timeout: float = None,
+) -> List[ProcessResult]:
+    """
+    Runs several external processes concurrently. If one of them fails, the
+    others are cancelled (and killed).
+
+    Args:
+        commands (List[List[str]]): executable and arguments of every process
+        max_processes (int): maximum number of processes running at once
+        cwd (Union[str, Path]): working directory of the processes
+        timeout (float): seconds after which a single process is killed
+
+    Returns:
+        List[ProcessResult]: results in the order of ``commands``
+    """
+    semaphore = asyncio.Semaphore(max_processes)
+    tasks = [
+        asyncio.ensure_future(run_process(c, cwd, timeout, semaphore)) for c in commands
+    ]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+def run_command(
+    command: List[str], cwd: Union[str, Path] = None, timeout: float = None
+) -> ProcessResult:
+    """
+    Blocking wrapper around ``run_process`` for a single process
+
+    Args:
+        command (List[str]): executable and arguments
+        cwd (Union[str, Path]): working directory of the process
+        timeout (float): seconds after which the process is killed
+
+    Returns:
+        ProcessResult: exit code, captured output and wall time of the process
+    """
+    return asyncio.run(run_process(command, cwd, timeout))
+
+
+def run_commands(
+    commands: List[List[str]],
+    max_processes: int,
+    cwd: Union[str, Path] = None,
+    timeout: float = None,
+) -> List[ProcessResult]:
+    """
+    Blocking wrapper around ``run_processes``
+    """
+    return asyncio.run(run_processes(commands, max_processes, cwd, timeout))
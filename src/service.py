@@ -0,0 +1,106 @@
+"""
+Small local HTTP service on top of ``src.api``. Concurrent requests are batched
+into shared model invocations by a ``ParseBatcher``.
+
+Endpoints:
+    GET /live: health check
+    POST /parse: JSON body ``{"sentences": [...], "parser": "nn", "format": "conllu"}``,
+        returns ``{"parses": [...]}`` with one parse per sentence
+"""
+
+import json
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from box import Box
+from typing import *
+from src.utils import read_config
+from src.api import FORMATS, ParseBatcher, conllu_to_tree, warm_up
+from src.parse.parse import PARSERS
+
+
+class ParseHandler(BaseHTTPRequestHandler):
+    """
+    Request handler, the batcher and config are attached to the server
+    """
+
+    def _respond(self, status: int, body: Dict) -> None:
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self) -> None:
+        if self.path != "/live":
+            return self._respond(404, {"error": f"Unknown path {self.path}"})
+
+        return self._respond(200, {"status": "live"})
+
+    def do_POST(self) -> None:
+        if self.path != "/parse":
+            return self._respond(404, {"error": f"Unknown path {self.path}"})
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length))
+            sentences = request["sentences"]
+            if isinstance(sentences, str):
+                sentences = [sentences]
+            parser = request.get("parser", self.server.config.service.default_parser)
+            fmt = request.get("format", "conllu")
+            assert parser in PARSERS, f"Invalid parser. Choose one of {list(PARSERS)}"
+            assert fmt in FORMATS, f"Invalid format. Choose one of {FORMATS}"
+            assert all(
+                [isinstance(s, str) and s.strip() != "" for s in sentences]
+            ), "Sentences have to be non-empty strings"
+        except (ValueError, KeyError, TypeError, AssertionError) as e:
+            return self._respond(400, {"error": str(e)})
+
+        try:
+            parses = self.server.batcher.parse(sentences, parser)
+        except Exception as e:
+            logging.exception("Parse request failed")
+            return self._respond(500, {"error": str(e)})
+        if fmt == "tree":
+            parses = [conllu_to_tree(p) for p in parses]
+
+        return self._respond(200, {"parses": parses})
+
+    def log_message(self, format: str, *args) -> None:
+        logging.debug(f"{self.address_string()} {format % args}")
+
+
+def serve(config: Box) -> None:
+    """
+    Warms up the parsers of ``service.parsers`` and serves parse requests on
+    ``service.host``/``service.port`` until interrupted
+
+    Args:
+        config (Box): main config
+
+    Returns:
+        None
+    """
+    warm_up(config, config.service.parsers)
+
+    server = ThreadingHTTPServer(
+        (config.service.host, config.service.port), ParseHandler
+    )
+    server.config = config
+    server.batcher = ParseBatcher(config)
+    logging.info(
+        f"Serving parse requests on {config.service.host}:{config.service.port}"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+    return None
+
+
+if __name__ == "__main__":
+    serve(read_config("config.yml"))
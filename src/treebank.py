@@ -0,0 +1,424 @@
+"""
+Compact columnar treebank. Tokens are stored in typed NumPy arrays, string columns
+as integer codes into interned string tables, and sentences as offsets into the
+token arrays, so that millions of tokens need no per-token Python objects.
+"""
+
+import os
+import shutil
+from array import array
+import numpy as np
+from pathlib import Path
+from typing import *
+from box import Box
+from src.conll import read_sentences, write_sentences, Sentence, _tmp_path
+from src.utils import SAMPLES
+
+# CoNLL-U columns stored as codes into a string table
+STRING_COLUMNS = ["form", "lemma", "upos", "xpos", "feats", "deprel", "deps", "misc"]
+# CoNLL-U columns stored as integers
+INT_COLUMNS = ["id", "head"]
+# column order of the CoNLL-U format
+CONLLU_COLUMNS = [
+    "id",
+    "form",
+    "lemma",
+    "upos",
+    "xpos",
+    "feats",
+    "head",
+    "deprel",
+    "deps",
+    "misc",
+]
+
+
+class Treebank(object):
+    """
+    Columnar store of a parsed or gold treebank
+
+    Attributes:
+        columns (Dict[str, np.ndarray]): ``int32`` array per CoNLL-U column, holding
+            the value for ``INT_COLUMNS`` and the string table code otherwise
+        tables (Dict[str, np.ndarray]): string table of every ``STRING_COLUMNS``
+            column
+        offsets (np.ndarray): ``int64`` start offset of every sentence in the token
+            arrays, followed by the total number of tokens
+        samples (np.ndarray): optional ``int64`` index of the first sentence of
+            every sample, followed by the number of sentences
+    """
+
+    def __init__(
+        self,
+        columns: Dict[str, np.ndarray],
+        tables: Dict[str, np.ndarray],
+        offsets: np.ndarray,
+        samples: np.ndarray = None,
+    ):
+        self.columns = columns
+        self.tables = tables
+        self.offsets = offsets
+        self.samples = samples
+
+    @classmethod
+    def from_conll(cls, path: Union[str, Path]) -> "Treebank":
+        """
+        Builds a treebank from a CoNLL/CoNLL-U file, streaming it sentence by
+        sentence. Comments, multiword tokens and empty nodes are skipped.
+
+        Args:
+            path (Union[str, Path]): path to the CoNLL file
+
+        Returns:
+            Treebank: loaded treebank
+        """
+        return cls.from_sentences(read_sentences(path))
+
+    @classmethod
+    def from_sentences(cls, sentences: Iterable[Sentence]) -> "Treebank":
+        """
+        Builds a treebank from sentences as returned by ``read_sentences``, e.g. of
+        parser output held in memory, see ``from_conll``
+
+        Args:
+            sentences (Iterable[Sentence]): rows of every sentence
+
+        Returns:
+            Treebank: loaded treebank
+        """
+        ints = {c: array("i") for c in INT_COLUMNS}
+        codes = {c: array("i") for c in STRING_COLUMNS}
+        interned = {c: {} for c in STRING_COLUMNS}
+        offsets = array("q", [0])
+
+        for sentence in sentences:
+            for row in sentence:
+                if len(row) < 8 or "-" in row[0] or "." in row[0]:
+                    continue
+                # pad rows without the trailing DEPS/MISC columns
+                row = row + ["_"] * (len(CONLLU_COLUMNS) - len(row))
+                for name, value in zip(CONLLU_COLUMNS, row):
+                    if name in ints:
+                        ints[name].append(int(value))
+                    else:
+                        table = interned[name]
+                        codes[name].append(table.setdefault(value, len(table)))
+            if len(ints["id"]) > offsets[-1]:
+                offsets.append(len(ints["id"]))
+
+        columns = {c: np.frombuffer(ints[c], dtype=np.int32) for c in INT_COLUMNS}
+        columns.update(
+            {c: np.frombuffer(codes[c], dtype=np.int32) for c in STRING_COLUMNS}
+        )
+        tables = {c: np.array(list(interned[c]), dtype=str) for c in STRING_COLUMNS}
+
+        return cls(columns, tables, np.frombuffer(offsets, dtype=np.int64))
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "Treebank":
+        """
+        Loads a treebank saved with ``save``
+
+        Args:
+            path (Union[str, Path]): path to the ``.npz`` file
+
+        Returns:
+            Treebank: loaded treebank
+        """
+        with np.load(path) as data:
+            columns = {c: data[f"column_{c}"] for c in CONLLU_COLUMNS}
+            tables = {c: data[f"table_{c}"] for c in STRING_COLUMNS}
+            offsets = data["offsets"]
+
+        return cls(columns, tables, offsets)
+
+    def save(self, path: Union[str, Path]) -> None:
+        """
+        Saves the treebank as a single binary ``.npz`` file
+
+        Args:
+            path (Union[str, Path]): target path
+
+        Returns:
+            None
+        """
+        arrays = {f"column_{c}": self.columns[c] for c in CONLLU_COLUMNS}
+        arrays.update({f"table_{c}": self.tables[c] for c in STRING_COLUMNS})
+        np.savez(path, offsets=self.offsets, **arrays)
+
+        return None
+
+    @classmethod
+    def open(cls, directory: Union[str, Path]) -> "Treebank":
+        """
+        Memory-maps a treebank saved with ``save_mmap``. Nothing but the accessed
+        slices is read from disk.
+
+        Args:
+            directory (Union[str, Path]): directory of the compiled treebank
+
+        Returns:
+            Treebank: memory-mapped treebank
+        """
+        directory = Path(directory)
+
+        def load(name):
+            return np.load(directory.joinpath(f"{name}.npy"), mmap_mode="r")
+
+        columns = {c: load(f"column_{c}") for c in CONLLU_COLUMNS}
+        tables = {c: load(f"table_{c}") for c in STRING_COLUMNS}
+        samples = (
+            load("samples") if directory.joinpath("samples.npy").exists() else None
+        )
+
+        return cls(columns, tables, load("offsets"), samples)
+
+    def save_mmap(self, directory: Union[str, Path]) -> None:
+        """
+        Saves the treebank as a directory of ``.npy`` files which can be
+        memory-mapped with ``open``. The files are written to a temporary
+        directory first, which replaces the target once complete, so that readers
+        never see a partially written treebank. The sentence offsets are written
+        last and mark the treebank as complete.
+
+        Args:
+            directory (Union[str, Path]): target directory
+
+        Returns:
+            None
+        """
+        directory = Path(directory)
+        directory.parent.mkdir(parents=True, exist_ok=True)
+        tmp_directory = _tmp_path(directory)
+        tmp_directory.mkdir()
+        for c in CONLLU_COLUMNS:
+            np.save(tmp_directory.joinpath(f"column_{c}.npy"), self.columns[c])
+        for c in STRING_COLUMNS:
+            np.save(tmp_directory.joinpath(f"table_{c}.npy"), self.tables[c])
+        if self.samples is not None:
+            np.save(tmp_directory.joinpath("samples.npy"), self.samples)
+        np.save(tmp_directory.joinpath("offsets.npy"), self.offsets)
+
+        # a directory can only replace an empty one, so the old one is moved aside
+        # first; memory maps of its files stay valid after it is removed
+        old_directory = _tmp_path(f"{directory}.old")
+        if directory.exists():
+            os.replace(directory, old_directory)
+        os.replace(tmp_directory, directory)
+        shutil.rmtree(old_directory, ignore_errors=True)
+
+        return None
+
+    def index_samples(self, token_counts: List[int]) -> None:
+        """
+        Builds the sample index from the number of tokens of every sample
+
+        Args:
+            token_counts (List[int]): number of tokens per sample, in file order
+
+        Returns:
+            None, but sets ``samples``
+        """
+        token_offsets = np.concatenate([[0], np.cumsum(token_counts)])
+        samples = np.searchsorted(self.offsets, token_offsets)
+        if not np.array_equal(
+            self.offsets[np.minimum(samples, len(self))], token_offsets
+        ):
+            raise ValueError(
+                "Sample boundaries do not coincide with sentence boundaries"
+            )
+        self.samples = samples.astype(np.int64)
+
+        return None
+
+    @property
+    def n_tokens(self) -> int:
+        return int(self.offsets[-1])
+
+    def __len__(self) -> int:
+        """Number of sentences"""
+        return len(self.offsets) - 1
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        Returns a column with string columns decoded from their string table
+
+        Args:
+            name (str): lowercase CoNLL-U column name, e.g. ``deprel``
+
+        Returns:
+            np.ndarray: values of all tokens
+        """
+        if name in INT_COLUMNS:
+            return self.columns[name]
+
+        return self.tables[name][self.columns[name]]
+
+    def sentence_index(self) -> np.ndarray:
+        """
+        Returns the sentence number of every token
+        """
+        return np.repeat(np.arange(len(self)), np.diff(self.offsets))
+
+    def sentence(self, idx: int) -> Sentence:
+        """
+        Returns a single sentence as CoNLL-U rows
+
+        Args:
+            idx (int): sentence number
+
+        Returns:
+            Sentence: rows of the sentence, as returned by ``read_sentences``
+        """
+        start, end = self.offsets[idx], self.offsets[idx + 1]
+        values = []
+        for name in CONLLU_COLUMNS:
+            codes = self.columns[name][start:end]
+            if name in INT_COLUMNS:
+                values.append(codes.astype(str).tolist())
+            else:
+                values.append(self.tables[name][codes].tolist())
+
+        return [list(row) for row in zip(*values)]
+
+    def slice(self, start: int, end: int) -> "Treebank":
+        """
+        Returns sentences ``start`` to ``end`` (exclusive) as a view on the token
+        arrays, without copying or reading the remaining sentences
+
+        Args:
+            start (int): first sentence number
+            end (int): sentence number after the last sentence
+
+        Returns:
+            Treebank: treebank with the given sentences
+        """
+        first, last = self.offsets[start], self.offsets[end]
+        columns = {c: self.columns[c][first:last] for c in CONLLU_COLUMNS}
+
+        return Treebank(columns, self.tables, self.offsets[start : end + 1] - first)
+
+    def sample(self, idx: int) -> "Treebank":
+        """
+        Returns the sentences of a single sample, see ``index_samples``
+
+        Args:
+            idx (int): position of the sample, e.g. ``SAMPLES.index(sample_no)``
+
+        Returns:
+            Treebank: treebank with the sentences of the sample
+        """
+        assert self.samples is not None, "Treebank has no sample index"
+
+        return self.slice(self.samples[idx], self.samples[idx + 1])
+
+    def subset(self, sentences: Iterable[int]) -> "Treebank":
+        """
+        Creates a treebank of the given sentences, sharing the string tables
+
+        Args:
+            sentences (Iterable[int]): sentence numbers, in the desired order
+
+        Returns:
+            Treebank: treebank with only the given sentences
+        """
+        sentences = np.asarray(list(sentences), dtype=np.int64)
+        starts, ends = self.offsets[sentences], self.offsets[sentences + 1]
+        lengths = ends - starts
+        # token positions of all selected sentences, without a loop over sentences
+        token_idx = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + (
+            np.arange(lengths.sum())
+        )
+
+        columns = {c: np.asarray(self.columns[c])[token_idx] for c in CONLLU_COLUMNS}
+        offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+
+        return Treebank(columns, self.tables, offsets)
+
+    def to_conll(self, path: Union[str, Path]) -> int:
+        """
+        Writes the treebank in CoNLL-U format
+
+        Args:
+            path (Union[str, Path]): target path
+
+        Returns:
+            int: number of sentences written
+        """
+        return write_sentences((self.sentence(i) for i in range(len(self))), path)
+
+
+def is_compiled(source: Union[str, Path], target: Union[str, Path]) -> bool:
+    """
+    Checks if a compiled treebank exists and is newer than its CoNLL file
+    """
+    marker = Path(target).joinpath("offsets.npy")
+
+    return marker.exists() and marker.stat().st_mtime >= Path(source).stat().st_mtime
+
+
+def compile_treebank(
+    source: Union[str, Path], target: Union[str, Path], token_counts: List[int] = None
+) -> None:
+    """
+    Compiles a CoNLL file into a memory-mappable treebank directory
+
+    Args:
+        source (Union[str, Path]): path to the CoNLL file
+        target (Union[str, Path]): directory of the compiled treebank
+        token_counts (List[int]): number of tokens per sample to build the sample
+            index from, if any
+
+    Returns:
+        None
+    """
+    treebank = Treebank.from_conll(source)
+    if token_counts is not None:
+        treebank.index_samples(token_counts)
+    treebank.save_mmap(target)
+
+    return None
+
+
+def load_treebank(config: Box, name: str) -> Treebank:
+    """
+    Opens the compiled treebank of a parser or of the gold standard, compiling it
+    first if the CoNLL file changed. The sample index of the gold standard is
+    built from the number of tokens of the individual gold standard files, the
+    one of a parser by aligning its tokens to the gold standard, see
+    ``project_samples``.
+
+    Args:
+        config (Box): main config
+        name (str): key of ``parse_files`` in the config, or ``gold``
+
+    Returns:
+        Treebank: memory-mapped treebank
+    """
+    target = Path(config.treebank_path).joinpath(name)
+    if name == "gold":
+        source = Path(config.gold_path).joinpath(config.files.gold_conll)
+        if not is_compiled(source, target):
+            token_counts = [
+                sum([len(s) for s in read_sentences(path)])
+                for path in [
+                    Path(config.gold_path).joinpath(f"sample_{idx}.conll")
+                    for idx in SAMPLES
+                ]
+            ]
+            compile_treebank(source, target, token_counts)
+
+        return Treebank.open(target)
+
+    # the sample index of a parse depends on the gold standard as well
+    from src.align import project_samples
+
+    gold = load_treebank(config, "gold")
+    source = Path(config.parse_path).joinpath(config.parse_files[name])
+    gold_marker = Path(config.treebank_path).joinpath("gold", "offsets.npy")
+    if not is_compiled(source, target) or not is_compiled(gold_marker, target):
+        treebank = Treebank.from_conll(source)
+        treebank.samples = project_samples(treebank, gold)
+        treebank.save_mmap(target)
+
+    return Treebank.open(target)
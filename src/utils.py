@@ -1,9 +1,28 @@
 from pathlib import Path
+from concurrent.futures import (
+    Executor,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+    FIRST_COMPLETED,
+)
+from contextlib import contextmanager
+import csv
+import fnmatch
+import glob
+import json
+import threading
 import time
 import yaml
 from box import Box
 import logging
 import subprocess
+from src.runner import run_command, set_max_processes
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
 
 # global variables
 SAMPLES = [1, 2, 5, 7, 10, 17, 19, 20, 21, 22]
@@ -28,6 +47,10 @@ def read_config(path: Path) -> Box:
     with open(Path(path), "r") as f:
         config = yaml.safe_load(f)
 
+    # processes started by all callers share one limit
+    if "runner" in config:
+        set_max_processes(config["runner"]["max_processes"])
+
     # return config
     return Box(config)
 
@@ -41,20 +64,24 @@ from typing import *
 # logger = logging.getLogger(__name__)
 
 
-def run_bash(command: str) -> Tuple[str, str]:
+def run_bash(
+    command: str, cwd: Union[str, Path] = None, timeout: float = None
+) -> Tuple[str, str]:
     """
-    Wrapper function to run a Bash command from Python using the ``subprocess`` library
+    Wrapper function to run a Bash command from Python using the async process
+    runner in ``src.runner``
 
     Args:
         command (str): bash command to execute
+        cwd (Union[str, Path]): working directory of the command
+        timeout (float): seconds after which the command is killed, no limit if None
 
     Returns:
         Tuple[str, str]: output and error stream of the bash executable as a tuple
     """
-    process = subprocess.Popen(command.split(), stdout=subprocess.PIPE)
-    output, error = process.communicate()
+    result = run_command(command.split(), cwd, timeout)
 
-    return output, error
+    return result.stdout, result.stderr
 
 
 def import_object_by_name(name: str) -> ClassVar:
@@ -69,7 +96,6 @@ def import_object_by_name(name: str) -> ClassVar:
     """
     class_name = name.split(".")[-1]
     module_name = ".".join(name.split(".")[:-1])
-    print(module_name)
 
     if module_name == "":
         return getattr(sys.modules[__name__], class_name)
@@ -78,10 +104,123 @@ def import_object_by_name(name: str) -> ClassVar:
     return getattr(mod, class_name)
 
 
+def get_executor(workers: int, kind: str = "thread") -> Executor:
+    """
+    Creates a bounded worker pool
+
+    Args:
+        workers (int): maximum number of concurrent jobs
+        kind (str): ``thread`` (e.g. for jobs waiting on external processes) or
+            ``process``
+
+    Returns:
+        Executor: thread or process pool
+    """
+    assert kind in ["thread", "process"], f"Invalid pool kind: {kind}"
+    if kind == "process":
+        return ProcessPoolExecutor(max_workers=workers)
+
+    return ThreadPoolExecutor(max_workers=workers)
+
+
+def _expand_paths(patterns: List[str]) -> List[Path]:
+    """
+    Expands the glob patterns of a step's inputs or outputs to existing files
+    """
+    return [Path(p) for pattern in patterns for p in sorted(glob.glob(pattern))]
+
+
+def _is_up_to_date(step: Box) -> bool:
+    """
+    Checks if all outputs of a step exist and are newer than all of its inputs.
+    Steps without declared outputs (e.g. the interactive treeview) are never
+    up to date.
+
+    Args:
+        step (Box): entry of ``config.steps`` with ``inputs`` and ``outputs``
+
+    Returns:
+        bool: True if the step can be skipped
+    """
+    outputs = step.get("outputs", [])
+    if len(outputs) == 0 or any([not Path(o).exists() for o in outputs]):
+        return False
+
+    inputs = _expand_paths(step.get("inputs", []))
+    if len(inputs) == 0:
+        return False
+    oldest_output = min([Path(o).stat().st_mtime for o in outputs])
+    newest_input = max([p.stat().st_mtime for p in inputs])
+
+    return oldest_output >= newest_input
+
+
+def pipeline_dependencies(config: Box) -> Dict[str, Set[str]]:
+    """
+    Builds the dependency graph of the pipeline steps from the ``inputs`` and
+    ``outputs`` declared in ``config.steps``. A step depends on every other step
+    in the pipeline which produces one of its inputs (inputs may be glob patterns).
+
+    Args:
+        config (Box): main config
+
+    Returns:
+        Dict[str, Set[str]]: steps each pipeline step depends on
+    """
+    steps = config.get("steps", Box())
+    dependencies = {}
+    for name in config.pipeline:
+        inputs = steps.get(name, Box()).get("inputs", [])
+        dependencies[name] = {
+            other
+            for other in config.pipeline
+            if other != name
+            and any(
+                [
+                    fnmatch.fnmatch(Path(o).as_posix(), Path(i).as_posix())
+                    for o in steps.get(other, Box()).get("outputs", [])
+                    for i in inputs
+                ]
+            )
+        }
+
+    return dependencies
+
+
+def _run_step(name: str, config: Box) -> List[Dict]:
+    """
+    Runs a single pipeline step, module level so it can be sent to a worker process.
+    Returns the metrics recorded during the step, see ``stage``.
+    """
+    global _STEP
+    _STEP = name
+    try:
+        with stage("total"):
+            import_object_by_name(name)(config)
+    except BaseException as e:
+        # the records of the failed stages travel with the exception, also from a
+        # worker process, see ``run_pipeline``
+        e.metrics = collect_metrics()
+        raise
+    finally:
+        _STEP = None
+        # CoreNLP servers started by the step, exit handlers do not run in the
+        # worker processes of the pool
+        server = sys.modules.get("src.parse.server")
+        if server is not None:
+            server.stop_servers()
+
+    return collect_metrics()
+
+
 def run_pipeline(config: Box) -> None:
     """
     Wrapper class which reads the pipeline steps from the
-    ``pipeline.yml`` and executes them in order
+    ``pipeline.yml`` and executes them. Steps are scheduled according to the
+    dependencies declared in ``config.steps``, so that independent steps (e.g. the
+    three parsers) run concurrently on up to ``scheduler.workers`` processes. Steps
+    whose outputs are newer than their inputs are skipped if
+    ``scheduler.skip_up_to_date`` is set.
     Args:
         config (Box): main config
     Returns:
@@ -92,15 +231,83 @@ def run_pipeline(config: Box) -> None:
     for step in config.pipeline:
         logging.info(f"- {step}")
 
+    dependencies = pipeline_dependencies(config)
+    steps = config.get("steps", Box())
+    workers = config.scheduler.workers
+    skip_up_to_date = config.scheduler.skip_up_to_date
+
     num_steps = len(config.pipeline)
-    for idx, name in enumerate(config.pipeline):
-        logging.info(f"PIPELINE STEP {idx+1}/{num_steps}: {name}")
-        import_object_by_name(name)(config)
+    pending = list(config.pipeline)
+    done = set()
+    running = {}
+    metrics = []
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+
+    try:
+        while len(pending) > 0 or len(running) > 0:
+            ready = [n for n in pending if dependencies[n] <= done]
+            for name in ready:
+                pending.remove(name)
+                idx = config.pipeline.index(name)
+                if skip_up_to_date and _is_up_to_date(steps.get(name, Box())):
+                    logging.info(
+                        f"SKIPPING UP-TO-DATE STEP {idx+1}/{num_steps}: {name}"
+                    )
+                    done.add(name)
+                    continue
+
+                logging.info(f"PIPELINE STEP {idx+1}/{num_steps}: {name}")
+                if pool is None:
+                    metrics += _run_step(name, config)
+                    done.add(name)
+                else:
+                    running[pool.submit(_run_step, name, config)] = name
+
+            if len(running) == 0:
+                if len(ready) == 0 and len(pending) > 0:
+                    raise ValueError(f"Cyclic step dependencies between {pending}")
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                # re-raises exceptions of the worker process
+                metrics += future.result()
+                done.add(name)
+    except BaseException as e:
+        metrics += getattr(e, "metrics", [])
+        raise
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        # failed runs are exported as well, with the failed stages marked
+        if config.metrics.enabled and len(metrics) > 0:
+            export_metrics(config, metrics)
+
+
+def _resource_usage() -> Tuple[float, float, float]:
+    """
+    Returns the CPU time of this process and its finished child processes (e.g.
+    the parser JVMs) in seconds, and the peak RSS of this process and of its
+    largest child process in MB
+    """
+    if resource is None:
+        return time.process_time(), float("nan"), float("nan")
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu_time = usage.ru_utime + usage.ru_stime + children.ru_utime + children.ru_stime
+    # ru_maxrss is in kilobytes on Linux
+    return cpu_time, usage.ru_maxrss / 1024, children.ru_maxrss / 1024
 
 
 class Timer:
-    def __init__(self):
+    def __init__(self, verbose: bool = True):
         self._start_time = None
+        self._start_cpu = None
+        self.verbose = verbose
+        # CPU time of the last timed interval, including child processes
+        self.cpu_time = None
 
     def start(self):
         """Start a new timer"""
@@ -108,6 +315,7 @@ class Timer:
             raise ValueError(f"Timer is running. Use .stop() to stop it")
 
         self._start_time = time.perf_counter()
+        self._start_cpu = _resource_usage()[0]
 
     def stop(self) -> float:
         """Stop the timer, and report the elapsed time"""
@@ -115,6 +323,151 @@ class Timer:
             raise ValueError(f"Timer is not running. Use .start() to start it")
 
         elapsed_time = time.perf_counter() - self._start_time
+        self.cpu_time = _resource_usage()[0] - self._start_cpu
         self._start_time = None
-        print(f"Elapsed time: {elapsed_time:0.4f} seconds")
+        if self.verbose:
+            logging.info(f"Elapsed time: {elapsed_time:0.4f} seconds")
         return elapsed_time
+
+
+# metrics recorded by ``stage`` in this process, drained by ``collect_metrics``
+_METRICS = []
+_METRICS_LOCK = threading.Lock()
+# pipeline step currently running in this process, set by ``_run_step``
+_STEP = None
+
+
+@contextmanager
+def stage(name: str) -> Iterator[Dict]:
+    """
+    Records wall time, CPU time (including child processes), peak RSS and
+    throughput of a pipeline sub-stage, e.g. model loading or parsing. The
+    yielded record can be given the number of ``tokens`` and ``sentences``
+    processed, from which the throughput is computed. CPU time and peak RSS are
+    process-wide, so stages running concurrently in threads overlap. Stages which
+    raise are recorded as well, with ``failed`` set.
+
+    Example:
+        with stage("parse") as metrics:
+            outputs = parse(documents)
+            metrics["sentences"] = len(outputs)
+
+    Args:
+        name (str): name of the sub-stage
+
+    Returns:
+        Iterator[Dict]: metrics record of the stage, completed when the stage exits
+    """
+    record = {
+        "step": _STEP,
+        "stage": name,
+        "tokens": None,
+        "sentences": None,
+        "failed": False,
+    }
+    timer = Timer(verbose=False)
+    timer.start()
+    try:
+        yield record
+    except BaseException:
+        record["failed"] = True
+        raise
+    finally:
+        _finish_stage(record, timer)
+
+
+def _finish_stage(record: Dict, timer: "Timer") -> None:
+    """
+    Completes the record of a stage with its resource usage and throughput and
+    adds it to the metrics of this process, see ``stage``
+    """
+    wall_time = timer.stop()
+
+    _, peak_rss, peak_child_rss = _resource_usage()
+    record.update(
+        {
+            "wall_time": round(wall_time, 4),
+            "cpu_time": round(timer.cpu_time, 4),
+            "peak_rss_mb": round(peak_rss, 1),
+            "peak_child_rss_mb": round(peak_child_rss, 1),
+        }
+    )
+    for unit in ["tokens", "sentences"]:
+        record[f"{unit}_per_s"] = (
+            round(record[unit] / wall_time, 2)
+            if record[unit] is not None and wall_time > 0
+            else None
+        )
+
+    with _METRICS_LOCK:
+        _METRICS.append(record)
+
+    return None
+
+
+def collect_metrics() -> List[Dict]:
+    """
+    Returns and clears the metrics recorded in this process
+    """
+    global _METRICS
+    with _METRICS_LOCK:
+        metrics, _METRICS = _METRICS, []
+
+    return metrics
+
+
+def record_metrics(metrics: List[Dict]) -> None:
+    """
+    Adds metrics collected in a worker process to the metrics of this process
+
+    Args:
+        metrics (List[Dict]): records returned by ``collect_metrics`` in the worker
+
+    Returns:
+        None
+    """
+    with _METRICS_LOCK:
+        for record in metrics:
+            if record["step"] is None:
+                record["step"] = _STEP
+            _METRICS.append(record)
+
+    return None
+
+
+def export_metrics(config: Box, metrics: List[Dict]) -> Path:
+    """
+    Writes the metrics of a pipeline run to ``metrics.path``, as JSON or CSV
+    depending on ``metrics.format``, and logs a summary
+
+    Args:
+        config (Box): main config
+        metrics (List[Dict]): records of all stages of the run
+
+    Returns:
+        Path: path of the written file
+    """
+    fmt = config.metrics.format
+    assert fmt in ["json", "csv"], f"Invalid metrics format: {fmt}"
+    run = time.strftime("%Y%m%d-%H%M%S")
+    path = Path(config.metrics.path).joinpath(f"run_{run}.{fmt}")
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    if fmt == "json":
+        with open(path, "w") as f:
+            json.dump({"run": run, "stages": metrics}, f, indent=2)
+    else:
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(metrics[0].keys()))
+            writer.writeheader()
+            writer.writerows(metrics)
+
+    for record in metrics:
+        logging.info(
+            f"{record['step']} / {record['stage']}: {record['wall_time']:.2f}s wall, "
+            f"{record['cpu_time']:.2f}s CPU, {record['peak_rss_mb']:.0f} MB peak RSS"
+            + (" (failed)" if record.get("failed") else "")
+        )
+    logging.info(f"Writing run metrics to {path}")
+
+    return path
@@ -0,0 +1,62 @@
+import time
+import numpy as np
+from src.align import align_tokens, project_samples
+from src.treebank import Treebank
+
+
+def test_align_tokens_escapes():
+    system = np.array(["The", "-LRB-", "cat", "-RRB-", "sat", "."], dtype=object)
+    gold = np.array(["The", "(", "cat", ")", "sat", "."], dtype=object)
+
+    assert align_tokens(system, gold).tolist() == list(range(6))
+
+
+def test_align_tokens_gaps():
+    gold = np.array(["I", "do", "n't", "know", "it", "."], dtype=object)
+    system = np.array(["I", "don't", "know", "X", "it", "."], dtype=object)
+
+    assert align_tokens(system, gold).tolist() == [0, -1, -1, 2, 4, 5]
+
+
+def test_align_tokens_long_stream_early_mismatch():
+    rng = np.random.default_rng(0)
+    gold = rng.choice(np.array([f"w{i}" for i in range(1000)], dtype=object), 500_000)
+    # a split token near the start and an inserted token shifting the rest
+    system = np.concatenate([gold[:10], ["do", "n't"], gold[11:20], ["X"], gold[20:]])
+    system[-100] = "Y"
+
+    start = time.perf_counter()
+    gold_to_system = align_tokens(system, gold)
+    elapsed = time.perf_counter() - start
+
+    # the replaced token near the end is aligned one to one
+    expected = np.concatenate(
+        [np.arange(10), [-1], np.arange(12, 21), np.arange(22, len(system))]
+    )
+    assert gold_to_system.tolist() == expected.tolist()
+    # diffing the whole stream after the first mismatch takes minutes
+    assert elapsed < 10
+
+
+def _treebank(sentences):
+    return Treebank.from_sentences(
+        [
+            [
+                [str(i + 1), form, "_", "_", "_", "_", "0", "root"]
+                for i, form in enumerate(s)
+            ]
+            for s in sentences
+        ]
+    )
+
+
+def test_project_samples_different_tokenization():
+    gold = _treebank([["a", "b"], ["do", "n't"], ["c", "d"], ["e"]])
+    gold.index_samples([4, 3])
+    # the parse splits a sentence and tokenizes the second sample differently
+    system = _treebank([["a"], ["b"], ["don't", "c", "d"], ["e"]])
+
+    samples = project_samples(system, gold)
+
+    assert samples.tolist() == [0, 2, 4]
+    assert system.sentence(samples[1])[0][1] == "don't"
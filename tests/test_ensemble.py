@@ -0,0 +1,104 @@
+import itertools
+import numpy as np
+from src.parse.ensemble import chu_liu_edmonds, decode_batch
+
+
+def is_tree(heads: np.ndarray) -> bool:
+    """Whether every node 1 to n reaches the root node 0"""
+    for node in range(1, len(heads)):
+        seen = set()
+        while node != 0:
+            if node in seen:
+                return False
+            seen.add(node)
+            node = heads[node]
+    return True
+
+
+def tree_score(scores: np.ndarray, heads: np.ndarray) -> float:
+    nodes = np.arange(1, len(scores))
+    return scores[nodes, heads[1:]].sum()
+
+
+def brute_force(scores: np.ndarray, single_root: bool) -> np.ndarray:
+    """Best tree among all head assignments of a small sentence"""
+    n = len(scores) - 1
+    best, best_score = None, -np.inf
+    for assignment in itertools.product(range(n + 1), repeat=n):
+        heads = np.array((-1,) + assignment)
+        if (heads[1:] == np.arange(1, n + 1)).any() or not is_tree(heads):
+            continue
+        if single_root and (heads[1:] == 0).sum() != 1:
+            continue
+        score = tree_score(scores, heads)
+        if score > best_score:
+            best, best_score = heads, score
+    return best
+
+
+def random_scores(rng: np.random.Generator, n: int) -> np.ndarray:
+    scores = rng.normal(size=(n + 1, n + 1))
+    np.fill_diagonal(scores, -np.inf)
+    scores[0] = -np.inf
+    return scores
+
+
+def test_chu_liu_edmonds_matches_brute_force():
+    rng = np.random.default_rng(0)
+    for n in [1, 2, 3, 4, 5] * 20:
+        scores = random_scores(rng, n)
+
+        heads = chu_liu_edmonds(scores)
+
+        assert heads[0] == -1
+        assert is_tree(heads)
+        np.testing.assert_allclose(
+            tree_score(scores, heads),
+            tree_score(scores, brute_force(scores, single_root=False)),
+        )
+
+
+def test_decode_batch_matches_brute_force():
+    rng = np.random.default_rng(1)
+    lengths = rng.integers(1, 6, 100)
+    scores = np.full((len(lengths), 7, 7), -np.inf)
+    for b, n in enumerate(lengths):
+        scores[b, : n + 1, : n + 1] = random_scores(rng, n)
+
+    heads = decode_batch(scores, lengths)
+
+    for b, n in enumerate(lengths):
+        sentence = scores[b, : n + 1, : n + 1]
+        assert heads[b, 0] == 0
+        # padding
+        assert (heads[b, n + 1 :] == 0).all()
+        np.testing.assert_allclose(
+            tree_score(sentence, heads[b, : n + 1]),
+            tree_score(sentence, brute_force(sentence, single_root=True)),
+        )
+
+
+def test_decode_batch_gives_trees_with_single_root():
+    rng = np.random.default_rng(2)
+    lengths = rng.integers(1, 40, 200)
+    n_nodes = lengths.max() + 1
+    # votes as in ``combine``: every arc of the sentence is possible, few get
+    # votes, and the votes often form several roots or cycles
+    votes = rng.random((len(lengths), n_nodes, n_nodes)) < 0.1
+    scores = votes * rng.integers(1, 4, (len(lengths), n_nodes, n_nodes))
+    scores = scores.astype(np.float64)
+    scores[:, 1:, 0] += rng.random((len(lengths), n_nodes - 1)) < 0.3
+    nodes = np.arange(n_nodes)
+    scores[:, nodes, nodes] = -np.inf
+    scores[:, 0] = -np.inf
+    for b, n in enumerate(lengths):
+        scores[b, n + 1 :] = -np.inf
+        scores[b, :, n + 1 :] = -np.inf
+
+    heads = decode_batch(scores, lengths)
+
+    for b, n in enumerate(lengths):
+        tree = heads[b, : n + 1]
+        assert is_tree(tree)
+        assert (tree[1:] == 0).sum() == 1
+        assert np.isfinite(scores[b, np.arange(1, n + 1), tree[1:]]).all()
@@ -0,0 +1,30 @@
+import subprocess
+import sys
+from pathlib import Path
+
+
+def test_eval_step_is_exported():
+    from src import eval
+
+    assert callable(eval)
+
+
+def test_eval_step_survives_subpackage_imports():
+    import src
+    import src.eval.score
+    from src.eval.query import ErrorIndex
+
+    assert callable(src.eval)
+    assert src.eval.__module__ == "src.eval.eval"
+
+
+def test_star_import_exports_steps():
+    # a fresh interpreter, since the subpackage may already be imported here
+    code = (
+        "import src.eval.score\n"
+        "from src import *\n"
+        "assert callable(eval) and callable(render)\n"
+    )
+    subprocess.run(
+        [sys.executable, "-c", code], check=True, cwd=Path(__file__).parents[1]
+    )
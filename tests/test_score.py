@@ -0,0 +1,183 @@
+import logging
+import numpy as np
+import pandas as pd
+from src.eval.eval import malt_to_df
+from src.eval.score import read_conll_columns, score_parse, score_parse_incremental
+
+# hand-scored fixture: the parse gets 5 of 7 heads and 6 of 7 labels right
+GOLD = """1\tThe\t_\t_\tDT\t_\t2\tdet\t_\t_
+2\tcat\t_\t_\tNN\t_\t3\tnsubj\t_\t_
+3\tsat\t_\t_\tVBD\t_\t0\troot\t_\t_
+4\t.\t_\t_\t.\t_\t3\tpunct\t_\t_
+
+1\tDogs\t_\t_\tNNS\t_\t2\tnsubj\t_\t_
+2\tbark\t_\t_\tVBP\t_\t0\troot\t_\t_
+3\t.\t_\t_\t.\t_\t2\tpunct\t_\t_
+
+"""
+PARSE = """1\tThe\t_\t_\tDT\t_\t2\tdet\t_\t_
+2\tcat\t_\t_\tNN\t_\t3\tdobj\t_\t_
+3\tsat\t_\t_\tVBD\t_\t0\troot\t_\t_
+4\t.\t_\t_\t.\t_\t2\tpunct\t_\t_
+
+1\tDogs\t_\t_\tNNS\t_\t2\tnsubj\t_\t_
+2\tbark\t_\t_\tVBP\t_\t0\troot\t_\t_
+3\t.\t_\t_\t.\t_\t1\tpunct\t_\t_
+
+"""
+# the same parse with both sentences in one, so the ids of the second continue
+MERGED_PARSE = PARSE.replace(
+    "\n\n1\tDogs\t_\t_\tNNS\t_\t2", "\n5\tDogs\t_\t_\tNNS\t_\t6"
+)
+MERGED_PARSE = MERGED_PARSE.replace("2\tbark\t_\t_\tVBP", "6\tbark\t_\t_\tVBP")
+MERGED_PARSE = MERGED_PARSE.replace("3\t.\t_\t_\t.\t_\t1", "7\t.\t_\t_\t.\t_\t5")
+NAN = float("nan")
+EXPECTED = {
+    "overall": pd.DataFrame({"UAS": [0.714], "LAS": [0.571], "LA": [0.857]}),
+    "Deprel": pd.DataFrame(
+        {
+            "Deprel": ["det", "dobj", "nsubj", "punct", "root"],
+            "precision": [1.0, 0.0, 1.0, 1.0, 1.0],
+            "recall": [1.0, NAN, 0.5, 1.0, 1.0],
+            "fscore": [1.0, NAN, 0.667, 1.0, 1.0],
+        }
+    ),
+    "RelationLength": pd.DataFrame(
+        {
+            "RelationLength": ["0", "1", "2"],
+            "precision": [1.0, 1.0, 0.0],
+            "recall": [1.0, 0.6, NAN],
+            "fscore": [1.0, 0.75, NAN],
+        }
+    ),
+    "ArcDirection": pd.DataFrame(
+        {
+            "ArcDirection": ["left", "right", "root"],
+            "precision": [1.0, 1.0, 1.0],
+            "recall": [1.0, 1.0, 1.0],
+            "fscore": [1.0, 1.0, 1.0],
+        }
+    ),
+}
+# MaltEval output layout of ``--Metric self --GroupBy Deprel``: a header of 12 lines,
+# then one row per group with ``-`` for undefined scores, hand-scored for the fixture
+MALTEVAL_HEADER = """====================================================================================================
+Gold:   gold.conll
+Parsed: parse.conll
+====================================================================================================
+GroupBy-> Deprel
+Metric-> self
+====================================================================================================
+
+precision           recall              fscore              Deprel
+-------------------------------------------------------------------------
+Row                 Row                 Row                 Row
+-------------------------------------------------------------------------
+"""
+MALTEVAL_ROWS = """1                   1                   1                   det
+0                   -                   -                   dobj
+1                   0.5                 0.667               nsubj
+1                   1                   1                   punct
+1                   1                   1                   root
+"""
+
+
+def random_columns(n_sentences: int, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(3, 15, n_sentences)
+    ids = np.concatenate([np.arange(1, n + 1) for n in lengths])
+    heads = np.concatenate([rng.integers(0, n + 1, n) for n in lengths])
+    labels = np.array(["nsubj", "obj", "det", "amod", "punct"], dtype=object)
+    words = np.array([f"w{i}" for i in range(50)], dtype=object)
+
+    return {
+        "id": ids,
+        "head": heads,
+        "deprel": rng.choice(labels, len(ids)),
+        "form": rng.choice(words, len(ids)),
+        "sentence": np.repeat(np.arange(n_sentences), lengths),
+    }
+
+
+def without_sentence(columns: dict, idx: int) -> dict:
+    keep = columns["sentence"] != idx
+    out = {k: v[keep] for k, v in columns.items()}
+    out["sentence"] = np.where(
+        out["sentence"] > idx, out["sentence"] - 1, out["sentence"]
+    )
+    return out
+
+
+def assert_same_scores(expected: dict, actual: dict):
+    assert expected.keys() == actual.keys()
+    for name in expected:
+        pd.testing.assert_frame_equal(
+            expected[name].reset_index(drop=True), actual[name].reset_index(drop=True)
+        )
+
+
+def test_incremental_matches_full_score(tmp_path, caplog):
+    gold = random_columns(300)
+    system = {k: v.copy() for k, v in gold.items()}
+    rng = np.random.default_rng(1)
+    system["head"][rng.integers(0, len(system["head"]), 200)] = 0
+    store = tmp_path.joinpath("stats.pkl")
+
+    versions = [(system, gold), (system, gold)]
+    changed = {k: v.copy() for k, v in system.items()}
+    changed["head"][100] += 1
+    versions.append((changed, gold))
+    versions.append((without_sentence(changed, 150), gold))
+    relabeled = {k: v.copy() for k, v in gold.items()}
+    relabeled["deprel"][50] = "iobj"
+    versions.append((without_sentence(changed, 150), relabeled))
+    versions.append((without_sentence(system, 0), without_sentence(gold, 0)))
+
+    rescored = []
+    for system_version, gold_version in versions:
+        with caplog.at_level(logging.INFO):
+            caplog.clear()
+            scores = score_parse_incremental(system_version, gold_version, store)
+        rescored.append(int(caplog.text.split("Rescored ")[-1].split()[0]))
+        assert_same_scores(score_parse(system_version, gold_version), scores)
+
+    assert rescored[0] == 300
+    assert rescored[1] == 0
+    # changed sentences are rescored together with their neighbours only
+    assert rescored[2:] == [5, 5, 3, 14]
+
+
+def fixture_columns(tmp_path, parse: str) -> tuple:
+    tmp_path.joinpath("gold.conll").write_text(GOLD)
+    tmp_path.joinpath("parse.conll").write_text(parse)
+    return (
+        read_conll_columns(tmp_path.joinpath("parse.conll")),
+        read_conll_columns(tmp_path.joinpath("gold.conll")),
+    )
+
+
+def test_score_parse_fixture(tmp_path):
+    scores = score_parse(*fixture_columns(tmp_path, PARSE))
+
+    assert_same_scores(EXPECTED, scores)
+
+
+def test_score_parse_ignores_sentence_boundaries(tmp_path):
+    scores = score_parse(*fixture_columns(tmp_path, MERGED_PARSE))
+
+    assert_same_scores(EXPECTED, scores)
+
+
+def test_score_parse_matches_malteval(tmp_path):
+    scores = score_parse(*fixture_columns(tmp_path, PARSE))
+
+    pd.testing.assert_frame_equal(
+        malt_to_df(MALTEVAL_HEADER + MALTEVAL_ROWS, "Deprel"), scores["Deprel"]
+    )
+
+
+def test_malt_to_df_without_rows():
+    df = malt_to_df(MALTEVAL_HEADER, "Deprel")
+
+    assert len(df) == 0
+    assert list(df.columns) == ["Deprel", "precision", "recall", "fscore"]
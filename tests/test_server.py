@@ -0,0 +1,258 @@
+import inspect
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+import pytest
+from src.utils import read_config
+from src.parse.server import CoreNLPServer, join_documents, split_documents
+
+ROOT = Path(__file__).parents[1]
+
+
+def annotate_text(text: str) -> str:
+    """
+    Stub CoreNLP annotation: every paragraph is one sentence, every whitespace
+    separated word a token attached to the previous one
+    """
+    sentences = []
+    for paragraph in text.split("\n\n"):
+        words = paragraph.split()
+        sentences.append(
+            "\n".join(
+                f"{i + 1}\t{w}\t{w}\tNN\tO\t{i}\t" + ("ROOT" if i == 0 else "dep")
+                for i, w in enumerate(words)
+            )
+        )
+    return "\n\n".join(sentences) + "\n\n"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # request texts received by the stub
+    requests = []
+
+    def _respond(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._respond(200, b"live")
+
+    def do_POST(self):
+        text = self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8")
+        self.requests.append(text)
+        if "FAIL" in text:
+            return self._respond(500, b"annotation failed")
+        self._respond(200, annotate_text(text).encode("utf-8"))
+
+    def log_message(self, format, *args):
+        pass
+
+
+# stand-in for the ``java`` executable which runs the stub as CoreNLP server
+FAKE_JAVA = "\n".join(
+    [
+        f"#!{sys.executable}",
+        "import os",
+        "import sys",
+        "from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer",
+        'with open(os.path.join("pids", str(os.getpid())), "w") as f:',
+        '    f.write("")',
+        inspect.getsource(annotate_text),
+        inspect.getsource(StubHandler),
+        'port = int(sys.argv[sys.argv.index("-port") + 1])',
+        'ThreadingHTTPServer(("localhost", port), StubHandler).serve_forever()',
+    ]
+)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+def fake_corenlp(tmp_path: Path) -> dict:
+    """
+    Installs the fake ``java`` executable and returns the environment to run it with
+    """
+    bin_path = tmp_path.joinpath("bin")
+    bin_path.mkdir()
+    java = bin_path.joinpath("java")
+    java.write_text(FAKE_JAVA)
+    java.chmod(0o755)
+    tmp_path.joinpath("corenlp", "pids").mkdir(parents=True)
+
+    env = dict(os.environ)
+    env["PATH"] = f"{bin_path}{os.pathsep}{env['PATH']}"
+    env["PYTHONPATH"] = str(ROOT)
+    return env
+
+
+def is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    # reaped by nobody once its parent exited, but a zombie is not running
+    with open(f"/proc/{pid}/stat") as f:
+        return f.read().split(")")[-1].split()[0] != "Z"
+
+
+def test_pipeline_workers_stop_servers(tmp_path):
+    env = fake_corenlp(tmp_path)
+    for props in ["pcfg-parse.props", "nn-parse.props"]:
+        shutil.copy(ROOT.joinpath(props), tmp_path)
+    tmp_path.joinpath("data", "raw").mkdir(parents=True)
+    tmp_path.joinpath("data", "raw", "selected_samples.txt").write_text(
+        "\n\n".join(f"Sample {i} is here . It ends ." for i in range(20))
+    )
+    for parser in ["pcfg", "nn"]:
+        for fmt in ["conll", "conllu"]:
+            tmp_path.joinpath("data", "parses", parser, fmt).mkdir(parents=True)
+
+    code = f"""
+from src.utils import *
+config = read_config({str(ROOT.joinpath("config.yml"))!r})
+config.pipeline = ["src.parse_pcfg", "src.parse_nn"]
+config.scheduler.workers = 2
+config.scheduler.skip_up_to_date = False
+config.sharding.workers = 2
+config.sharding.shard_tokens = 20
+config.cache.enabled = False
+config.metrics.enabled = False
+config.corenlp.backend = "server"
+config.corenlp.path = "corenlp"
+config.corenlp.port = {free_port()}
+config.corenlp.batch_size = 2
+run_pipeline(config)
+"""
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=tmp_path, env=env)
+
+    pids = [int(p.name) for p in tmp_path.joinpath("corenlp", "pids").iterdir()]
+    assert len(pids) > 0
+    for pid in pids:
+        deadline = time.monotonic() + 5
+        while is_running(pid) and time.monotonic() < deadline:
+            time.sleep(0.1)
+        assert not is_running(pid), f"CoreNLP server {pid} left running"
+    output = tmp_path.joinpath("data", "parses", "nn", "conllu")
+    assert (
+        output.joinpath("selected_samples.txt.conll")
+        .read_text()
+        .count("\tSample\tSample\t")
+        == 20
+    )
+
+
+def test_split_long_document():
+    sentence = "1\tThe\tthe\tDT\tO\t2\tdet\n2\tcat\tcat\tNN\tO\t0\tROOT\n\n"
+    start = time.perf_counter()
+    documents = split_documents(sentence * 40_000)
+    elapsed = time.perf_counter() - start
+
+    assert documents == [sentence * 40_000]
+    # appending to the document string took minutes
+    assert elapsed < 5
+
+
+def server_config(port: int, **corenlp):
+    config = read_config(ROOT.joinpath("config.yml"))
+    config.corenlp.port = port
+    config.corenlp.startup_timeout = 10
+    config.corenlp.update(corenlp)
+    return config
+
+
+@pytest.fixture
+def stub_server():
+    StubHandler.requests = []
+    httpd = ThreadingHTTPServer(("localhost", 0), StubHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd.server_address[1]
+    httpd.shutdown()
+    httpd.server_close()
+
+
+DOCUMENTS = [
+    "The cat sat .\n\nIt purred .",
+    "  Dogs bark .  ",
+    "One .\n\nTwo .\n\nThree .",
+    "Last one .",
+    "Really the last .",
+]
+
+
+def test_join_split_round_trip():
+    documents = split_documents(annotate_text(join_documents(DOCUMENTS)))
+
+    assert documents == [annotate_text(d.strip()) for d in DOCUMENTS]
+    assert split_documents(annotate_text(join_documents(DOCUMENTS[:1]))) == [
+        annotate_text(DOCUMENTS[0])
+    ]
+
+
+def test_health_check(stub_server):
+    assert CoreNLPServer(server_config(stub_server)).is_alive()
+    assert not CoreNLPServer(server_config(free_port())).is_alive()
+
+
+def test_annotate_documents(stub_server):
+    server = CoreNLPServer(server_config(stub_server, batch_size=2))
+    server.start()
+
+    outputs = server.annotate_documents(DOCUMENTS, {"outputFormat": "conll"})
+
+    assert outputs == [annotate_text(d.strip()) for d in DOCUMENTS]
+    # batches of two documents, joined into one request each
+    assert len(StubHandler.requests) == 3
+    assert StubHandler.requests[0] == join_documents(DOCUMENTS[:2])
+    # the running stub is reused, not stopped
+    server.stop()
+    assert server.is_alive()
+
+
+def test_annotate_error_status(stub_server):
+    server = CoreNLPServer(server_config(stub_server))
+
+    with pytest.raises(RuntimeError, match="500"):
+        server.annotate("FAIL", {})
+
+
+def test_restart(tmp_path, monkeypatch):
+    env = fake_corenlp(tmp_path)
+    monkeypatch.setenv("PATH", env["PATH"])
+    config = server_config(
+        free_port(), path=str(tmp_path.joinpath("corenlp")), max_restarts=1
+    )
+    server = CoreNLPServer(config)
+    server.start()
+    first = server._process
+    assert server.is_alive()
+
+    first.kill()
+    first.wait()
+    assert server.annotate("The cat .", {}) == annotate_text("The cat .")
+    assert server.restarts == 1
+    assert server._process.pid != first.pid
+
+    # skipped if another thread restarted the server in the meantime
+    server.restart(seen=0)
+    assert server.restarts == 1
+
+    second = server._process
+    second.kill()
+    second.wait()
+    with pytest.raises(RuntimeError, match="giving up"):
+        server.annotate("The cat .", {})
+    server.stop()
+    assert not server.is_alive()
@@ -0,0 +1,76 @@
+import numpy as np
+from src.eval.significance import bootstrap_weights, paired_test
+
+
+def random_stats(n_sentences: int, accuracy: float, seed: int) -> np.ndarray:
+    """
+    ``SentenceStats.matrix`` of a parse with a single deprel, where every token
+    gets its head and label right with probability ``accuracy``
+    """
+    rng = np.random.default_rng(seed)
+    tokens = rng.integers(5, 25, n_sentences)
+    correct = rng.binomial(tokens, accuracy)
+    # tokens, head, both, gold, system and hits of the deprel
+    return np.stack([tokens, correct, correct, tokens, tokens, correct], axis=1).astype(
+        np.float64
+    )
+
+
+def test_bootstrap_weights():
+    weights = bootstrap_weights(np.random.default_rng(0), 50, 20)
+
+    assert weights.shape == (50, 20)
+    # every sample draws as many sentences as the corpus has
+    assert (weights.sum(axis=1) == 20).all()
+    assert not (weights == weights[0]).all()
+    np.testing.assert_array_equal(
+        weights, bootstrap_weights(np.random.default_rng(0), 50, 20)
+    )
+
+
+def test_identical_systems():
+    stats = random_stats(200, 0.8, seed=0)
+
+    result = paired_test(stats, stats.copy(), n_labels=1, n_samples=500)
+
+    np.testing.assert_array_equal(result["delta"], 0)
+    np.testing.assert_allclose(result["p_bootstrap"], 1)
+    np.testing.assert_allclose(result["p_randomization"], 1)
+
+
+def test_dominant_system():
+    stats_a = random_stats(200, 0.6, seed=0)
+    stats_b = random_stats(200, 0.9, seed=0)
+
+    result = paired_test(stats_a, stats_b, n_labels=1, n_samples=500, seed=1)
+
+    assert (result["delta"] > 0.2).all()
+    assert (result["delta_low"] > 0).all()
+    # the smallest p-value possible with 500 samples
+    np.testing.assert_allclose(result["p_bootstrap"], 1 / 501)
+    np.testing.assert_allclose(result["p_randomization"], 1 / 501)
+
+
+def test_bootstrap_agrees_with_randomization():
+    stats_a = random_stats(300, 0.80, seed=2)
+    stats_b = random_stats(300, 0.82, seed=3)
+
+    result = paired_test(stats_a, stats_b, n_labels=1, n_samples=1000)
+    again = paired_test(stats_a, stats_b, n_labels=1, n_samples=1000)
+    swapped = paired_test(stats_b, stats_a, n_labels=1, n_samples=1000)
+
+    # deterministic for a fixed seed
+    for name, values in result.items():
+        np.testing.assert_array_equal(values, again[name])
+    assert (result["delta"] > 0).all()
+    # the bootstrap interval of the difference lies on the side of the difference
+    assert (result["delta_low"] > 0).all()
+    np.testing.assert_allclose(
+        result["p_bootstrap"], result["p_randomization"], atol=0.05
+    )
+    # swapping the parsers flips the difference, not the evidence against the null
+    np.testing.assert_allclose(swapped["delta"], -result["delta"])
+    assert (swapped["delta_high"] < 0).all()
+    np.testing.assert_allclose(
+        swapped["p_bootstrap"], swapped["p_randomization"], atol=0.05
+    )